@@ -0,0 +1,63 @@
+"""
+Benchmark of the vectorized negative sampler against GRAPE's sample_negative_graph.
+
+For synthetic scale-free graphs with the sizes of SLI, STRING and Monarch (see synthetic_graphs.py),
+we time the sampling of as many negative edges as there are positive edges, with the uniform (UNS)
+and degree-aware (DANS) distributions, and report the time and the mean degree of the sampled nodes.
+
+Usage:
+
+    python benchmark_negative_sampling.py [sli string monarch]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from negative_sampling import NegativeSampler
+from synthetic_graphs import DATASET_SIZES, edges_to_csr, edges_to_grape, generate_scale_free_edges
+
+RANDOM_STATE = 42
+
+
+def benchmark_dataset(dataset):
+    number_of_nodes, number_of_edges = DATASET_SIZES[dataset]
+    sources, destinations = generate_scale_free_edges(number_of_nodes, number_of_edges, random_state=RANDOM_STATE)
+    offsets, csr_destinations = edges_to_csr(number_of_nodes, sources, destinations)
+    degrees = np.diff(offsets).astype(np.int64)
+    graph = edges_to_grape(number_of_nodes, sources, destinations, name=dataset)
+    number_of_negative_samples = len(sources)
+    rows = []
+    for use_scale_free_distribution in (False, True):
+        start = time.perf_counter()
+        sampler = NegativeSampler(offsets, csr_destinations, use_scale_free_distribution=use_scale_free_distribution)
+        negatives = sampler.sample(number_of_negative_samples, random_state=RANDOM_STATE)
+        vectorized_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        negative_graph = graph.sample_negative_graph(
+            number_of_negative_samples=number_of_negative_samples,
+            random_state=RANDOM_STATE,
+            use_scale_free_distribution=use_scale_free_distribution,
+        )
+        grape_time = time.perf_counter() - start
+        grape_negatives = negative_graph.get_directed_edge_node_ids()
+        # GRAPE node ids follow the order of nodes_df, i.e. the synthetic ids.
+        rows.append(dict(
+            dataset=dataset,
+            number_of_nodes=number_of_nodes,
+            number_of_edges=len(sources),
+            sampling="DANS" if use_scale_free_distribution else "UNS",
+            vectorized_seconds=vectorized_time,
+            grape_seconds=grape_time,
+            vectorized_mean_degree=degrees[negatives].mean(),
+            grape_mean_degree=degrees[grape_negatives].mean(),
+        ))
+    return rows
+
+
+if __name__ == "__main__":
+    datasets = sys.argv[1:] or ["sli", "string", "monarch"]
+    results = pd.DataFrame([row for dataset in datasets for row in benchmark_dataset(dataset)])
+    print(results.to_string(index=False))
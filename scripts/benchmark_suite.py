@@ -0,0 +1,245 @@
+"""
+Offline benchmark of every stage of the pipeline on synthetic graphs sized like SLI, STRING, KG-IDG and Monarch.
+
+For every dataset, a synthetic scale-free graph with the schema of the dataset (see synthetic_graphs.py)
+is written in the format of the downloaded files and taken through the stages of a grid cell:
+loading, remapping and composition (SLI|STRING) or relabeling (KG-IDG, Monarch), the prepared
+graph cache, the approximate network characteristics, the holdout, UNS/DANS negative sampling,
+embedding, edge features, training and evaluation. The wall time, CPU time and peak RSS of each
+stage (see instrumentation.py) are written to a JSON file, together with the sizes of the graphs,
+to track regressions and scaling curves from run to run.
+Each dataset runs in its own process, so that its peak RSS is not inflated by the previous ones.
+
+Usage:
+
+    python benchmark_suite.py [--datasets sli string kg_idg monarch] [--scale 0.1] [--output benchmark.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import tarfile
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from importlib.metadata import version
+
+import numpy as np
+
+from instrumentation import get_tracer
+
+DATASETS = ("sli", "string", "kg_idg", "monarch")
+RANDOM_STATE = 42
+
+
+def measure(stages, stage, function, /, *args, **kwargs):
+    """
+    Run function, append the wall time, CPU time (of all threads) and peak RSS of the stage to stages and return its result.
+    """
+    tracer = get_tracer()
+    result = tracer.measure(stage, function, *args, **kwargs)
+    event = tracer.events[-1]
+    stages.append(dict(
+        stage=stage,
+        wall_seconds=event["wall_seconds"],
+        cpu_seconds=event["cpu_seconds"],
+        peak_rss_mb=event["peak_rss_mb"],
+    ))
+    return result
+
+
+def load_sli_string(directory, dataset, scale, stages):
+    from grape import Graph
+    from graph_preparation import compose_sli_string_graph
+    from node_remapping import get_node_names_remapping
+    from synthetic_graphs import generate_sli_string_graphs
+    string_edges, info, sli_edges = generate_sli_string_graphs(scale=scale, random_state=RANDOM_STATE)
+    string_path, info_path, sli_path = (os.path.join(directory, name) for name in ("string.tsv", "info.tsv", "sldb.tsv"))
+    string_edges.to_csv(string_path, sep="\t", index=False)
+    info.to_csv(info_path, sep="\t", index=False)
+    sli_edges.to_csv(sli_path, sep="\t", index=False)
+    string_graph = measure(
+        stages, "loading", Graph.from_csv,
+        edge_path=string_path, sources_column="protein1", destinations_column="protein2",
+        directed=False, name="STRING",
+    )
+    if dataset == "string":
+        return string_graph.remove_disconnected_nodes()
+
+    def remap():
+        remapping = get_node_names_remapping(string_graph, info_path, key_column=0, value_column=1)
+        return string_graph.remap_from_node_names_map(remapping).set_all_node_types("Gene").set_all_edge_types("PPI")
+
+    remapped_string_graph = measure(stages, "remapping", remap)
+    sli_graph = Graph.from_csv(
+        edge_path=sli_path, sources_column="subject", destinations_column="object", directed=False, name="SLDB",
+    )
+    return measure(stages, "composite", compose_sli_string_graph, sli_graph, remapped_string_graph)
+
+
+def load_knowledge_graph(directory, dataset, scale, stages):
+    from grape import Graph
+    from graph_preparation import relabel_kg_idg_graph, relabel_monarch_graph
+    from monarch_ingestion import MONARCH_EDGES_NAME, MONARCH_NODES_NAME, load_monarch_graph
+    from synthetic_graphs import generate_knowledge_graph
+    nodes, edges = generate_knowledge_graph(dataset, scale=scale, random_state=RANDOM_STATE)
+    nodes_path, edges_path = os.path.join(directory, MONARCH_NODES_NAME), os.path.join(directory, MONARCH_EDGES_NAME)
+    nodes.to_csv(nodes_path, sep="\t", index=False)
+    edges.to_csv(edges_path, sep="\t", index=False)
+    if dataset == "monarch":
+        archive_path = os.path.join(directory, "monarch-kg.tar.gz")
+        with tarfile.open(archive_path, "w:gz") as archive:
+            archive.add(nodes_path, arcname=MONARCH_NODES_NAME)
+            archive.add(edges_path, arcname=MONARCH_EDGES_NAME)
+        graph = measure(stages, "loading", load_monarch_graph, archive_path)
+        return measure(stages, "relabeling", relabel_monarch_graph, graph)
+    graph = measure(
+        stages, "loading", Graph.from_csv,
+        node_path=nodes_path, nodes_column="id", node_list_node_types_column="category",
+        edge_path=edges_path, sources_column="subject", destinations_column="object",
+        edge_list_edge_types_column="predicate", directed=False, name="KG-IDG",
+    )
+    return measure(stages, "relabeling", relabel_kg_idg_graph, graph)
+
+
+def get_auroc(positive_scores, negative_scores):
+    """
+    Return the AUROC of the scores, from the ranks of the positive scores (Mann-Whitney U statistic).
+    """
+    scores = np.concatenate([positive_scores, negative_scores])
+    ranks = np.empty(len(scores))
+    ranks[np.argsort(scores, kind="stable")] = np.arange(1, len(scores) + 1)
+    positive_ranks = ranks[:len(positive_scores)].sum()
+    return (positive_ranks - len(positive_scores) * (len(positive_scores) + 1) / 2) / (
+        len(positive_scores) * len(negative_scores)
+    )
+
+
+def benchmark_dataset(dataset, scale, epochs, directory):
+    """
+    Run all the stages on the synthetic graph of the dataset and return their measurements.
+    Must run in a fresh process: the caches of the pipeline are redirected to directory before they are imported.
+    """
+    os.environ["GRAPH_CACHE_DIR"] = os.path.join(directory, "graphs")
+    os.environ["EXPERIMENTS_DIR"] = os.path.join(directory, "experiments")
+    from grape.edge_prediction import PerceptronEdgePrediction
+    from grape.embedders import FirstOrderLINEEnsmallen
+    from edge_features import EdgeFeatureEngine, get_csr_from_grape
+    from graph_preparation import PREPARED_GRAPHS_DIRECTORY, TASKS, PreparedGraph, write_prepared_graph
+    from holdout_store import load_connected_holdout
+    from negative_sampling import NegativeSampler
+    from network_characteristics import get_network_characteristics
+
+    stages = []
+    if dataset in ("sli", "string"):
+        graph = load_sli_string(directory, dataset, scale, stages)
+    else:
+        graph = load_knowledge_graph(directory, dataset, scale, stages)
+
+    def prepare():
+        path = os.path.join(PREPARED_GRAPHS_DIRECTORY, dataset)
+        write_prepared_graph(graph, path, fingerprint="benchmark")
+        prepared_graph = PreparedGraph(path)
+        prepared = prepared_graph.to_grape()
+        prepared.enable()
+        return prepared
+
+    graph = measure(stages, "prepared_graph", prepare)
+    offsets, destinations = get_csr_from_grape(graph)
+    measure(stages, "network_characteristics", get_network_characteristics, offsets, destinations)
+    task = TASKS[dataset][1]
+    holdouts_kwargs = dict(train_size=0.75)
+    if task is not None:
+        holdouts_kwargs["edge_types"] = [task.relation]
+    train, test = measure(stages, "holdout", load_connected_holdout, graph, RANDOM_STATE, **holdouts_kwargs)
+    test_edge_node_ids = test.get_directed_edge_node_ids()
+    test_edge_node_ids = test_edge_node_ids[test_edge_node_ids[:, 0] < test_edge_node_ids[:, 1]]
+    number_of_negative_samples = len(test_edge_node_ids)
+
+    for sampling, use_scale_free_distribution in (("uns", False), ("dans", True)):
+        negatives = measure(
+            stages, f"negative_sampling_{sampling}",
+            lambda: NegativeSampler(
+                offsets, destinations, use_scale_free_distribution=use_scale_free_distribution
+            ).sample(number_of_negative_samples, random_state=RANDOM_STATE),
+        )
+    negative_graph = measure(
+        stages, "negative_sampling_grape", graph.sample_negative_graph,
+        number_of_negative_samples=number_of_negative_samples,
+        random_state=RANDOM_STATE,
+        use_scale_free_distribution=True,
+    )
+
+    node_embedding = measure(
+        stages, "embedding",
+        lambda: FirstOrderLINEEnsmallen(epochs=epochs, random_state=RANDOM_STATE).fit_transform(
+            train, return_dataframe=False
+        ).get_all_node_embedding()[0],
+    )
+    measure(
+        stages, "edge_features",
+        lambda: EdgeFeatureEngine.from_grape(train).compute(np.concatenate([test_edge_node_ids, negatives])),
+    )
+    model = PerceptronEdgePrediction(
+        edge_embeddings="Hadamard",
+        number_of_edges_per_mini_batch=32,
+        number_of_epochs=epochs,
+    )
+    measure(stages, "training", model.fit, train, node_features=node_embedding)
+    auroc = measure(
+        stages, "evaluation",
+        lambda: get_auroc(
+            model.predict_proba(test, support=train, node_features=node_embedding),
+            model.predict_proba(negative_graph, support=train, node_features=node_embedding),
+        ),
+    )
+    return dict(
+        dataset=dataset,
+        number_of_nodes=graph.get_number_of_nodes(),
+        number_of_edges=graph.get_number_of_edges(),
+        number_of_test_edges=number_of_negative_samples,
+        auroc=float(auroc),
+        peak_rss_mb=max(stage["peak_rss_mb"] for stage in stages),
+        stages=stages,
+    )
+
+
+def run_benchmarks(datasets, scale, epochs):
+    """
+    Return the benchmark report of the datasets, running each one in a fresh process.
+    """
+    report = dict(
+        created=datetime.now().isoformat(timespec="seconds"),
+        platform=platform.platform(),
+        cpu_count=os.cpu_count(),
+        python_version=platform.python_version(),
+        grape_version=version("grape"),
+        numpy_version=np.__version__,
+        scale=scale,
+        epochs=epochs,
+        datasets=[],
+    )
+    for dataset in datasets:
+        with tempfile.TemporaryDirectory() as directory, ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            result = executor.submit(benchmark_dataset, dataset, scale, epochs, directory).result()
+        print(f"{dataset}: {result['number_of_nodes']} nodes, {result['number_of_edges']} edges, "
+              f"{sum(stage['wall_seconds'] for stage in result['stages']):.1f}s, "
+              f"peak RSS {result['peak_rss_mb']:.0f}MB")
+        report["datasets"].append(result)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--datasets", nargs="+", choices=DATASETS, default=list(DATASETS))
+    parser.add_argument("--scale", type=float, default=1.0, help="Fraction of the size of the real graphs")
+    parser.add_argument("--epochs", type=int, default=100, help="Epochs of the embedding and of the perceptron")
+    parser.add_argument("--output", default="benchmark.json")
+    arguments = parser.parse_args()
+    report = run_benchmarks(arguments.datasets, arguments.scale, arguments.epochs)
+    with open(arguments.output, "w") as fh:
+        json.dump(report, fh, indent=2)
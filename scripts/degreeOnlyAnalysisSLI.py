@@ -1,41 +1,8 @@
-from grape.datasets.kghub import SLDB
-from grape.datasets.string import HomoSapiens
+from edge_features import EDGE_FEATURES
+from holdout_store import RANDOM_STATE
+from result_cache import evaluate_with_result_cache
 
-from grape.embedders import FirstOrderLINEEnsmallen, SecondOrderLINEEnsmallen
-from grape.embedders import DeepWalkGloVeEnsmallen, DeepWalkCBOWEnsmallen, DeepWalkSkipGramEnsmallen
-from grape.embedders import WalkletsGloVeEnsmallen, WalkletsCBOWEnsmallen, WalkletsSkipGramEnsmallen
-from grape.embedders import HOPEEnsmallen
-
-from grape.edge_prediction import edge_prediction_evaluation
-from grape.edge_prediction import PerceptronEdgePrediction
-
-import pandas as pd
-import os
-from tqdm.auto import tqdm
-
-
-# Load and process the graphs:
-sli_graph = SLDB()
-string_graph = HomoSapiens()
-graph_root = os.environ.get("GRAPH_CACHE_DIR", "./graphs")
-
-path = f"{graph_root}/string/HomoSapiens/links.v11.5/9606.protein.info.v11.5.txt"
-data = pd.read_csv(path, sep="\t")
-remapping_string = dict(zip(data[data.columns[0]], data[data.columns[1]]))
-string_graph = string_graph     .remove_node_types()     .filter_from_names(min_edge_weight=700)     .remove_edge_weights()     .remap_from_node_names_map(remapping_string)     .set_all_node_types("Gene")     .set_all_edge_types("PPI")     .remove_disconnected_nodes()
-path = f"{graph_root}/kghub/SLDB/20220522/sldb/merged-kg_nodes.tsv"
-data = pd.read_csv(path, sep="\t")
-remapping_sli = dict(zip(data[data.columns[0]], data[data.columns[2]]))
-
-# Restrict to the largest connected component
-sli_graph = sli_graph.remap_from_node_names_map(remapping_sli).set_all_node_types("Gene").set_all_edge_types("SLI")
-composite_graph = (sli_graph | string_graph).remove_components(top_k_components=1)
-
-composite_graph.enable()
-
-subgraph = composite_graph.filter_from_names(
-    edge_type_names_to_keep=["SLI"]
-)
+from graph_preparation import load_sli_composite_graph
 
 
 # Set smoke test to True for testing:
@@ -43,41 +10,66 @@ SMOKE_TEST = False
 NUMBER_OF_HOLDOUTS = 10
 VALIDATION_UNBALANCE_RATES = (1.0, )
 TRAIN_SIZES = (0.75,)
+# Set to True to train the five perceptrons together on each holdout with the NumPy StackedPerceptron
+# (see stacked_perceptron.py) instead of GRAPE's PerceptronEdgePrediction. Its results are written
+# to their own TSV, since the model, its feature scaling and its negative sampler differ.
+STACKED_PERCEPTRON = False
+
+MODEL_PARAMETERS = [
+    dict(edge_features=edge_feature, use_scale_free_distribution=False)
+    for edge_feature in EDGE_FEATURES
+]
 
 
-results = []
+def main():
+    """
+    Load the graph, evaluate the degree-only perceptrons and write their results TSV.
+    """
+    from grape.edge_prediction import PerceptronEdgePrediction
+    # Load the SLI|STRING composite graph, restricted to the largest connected component
+    composite_graph, subgraph = load_sli_composite_graph()
+    if STACKED_PERCEPTRON:
+        from stacked_perceptron import get_stacked_perceptron_edge_prediction
+        ModelClass = get_stacked_perceptron_edge_prediction()
+        stacked_kwargs = dict(stacked_with=MODEL_PARAMETERS)
+    else:
+        ModelClass = PerceptronEdgePrediction
+        stacked_kwargs = dict()
 
-fresults = []
-train_size = 0.75
-for validation_use_scale_free in tqdm(
-    (True, False),
-    desc="Validation use scale free",
-    leave=False
-    ):
-    results.append(edge_prediction_evaluation(
+    train_size = 0.75
+    # Both validation sampling modes, computing only the holdouts and models missing from the result cache.
+    results = evaluate_with_result_cache(
+        ModelClass,
         smoke_test=SMOKE_TEST,
         holdouts_kwargs=dict(
             train_size=train_size,
             edge_types=["SLI"],
         ),
         evaluation_schema="Connected Monte Carlo",
-        graphs=composite_graph,
+        graph=composite_graph,
         models=[
-            PerceptronEdgePrediction(
-               edge_features=edge_feature,
+            ModelClass(
                 number_of_epochs=1000,
                 number_of_edges_per_mini_batch=16,
                 learning_rate=0.001,
-                use_scale_free_distribution=False
-            ) for edge_feature in("Degree","AdamicAdar","JaccardCoefficient","ResourceAllocationIndex","PreferentialAttachment") 
+                **parameters,
+                **stacked_kwargs
+            ) for parameters in MODEL_PARAMETERS
         ],
         #number_of_slurm_nodes=NUMBER_OF_HOLDOUTS,
         enable_cache=True,
+        random_state=RANDOM_STATE,
         number_of_holdouts=NUMBER_OF_HOLDOUTS,
-        use_scale_free_distribution=validation_use_scale_free,
+        validation_use_scale_free=(True, False),
         validation_unbalance_rates=VALIDATION_UNBALANCE_RATES,
         subgraph_of_interest=subgraph,
         use_subgraph_as_support=True
-    ))
-results = pd.concat(results)
-results.to_csv("degree_only_perceptron_sli.tsv",sep="\t")
+    )
+    results.to_csv(
+        "degree_only_stacked_perceptron_sli.tsv" if STACKED_PERCEPTRON else "degree_only_perceptron_sli.tsv",
+        sep="\t"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Streaming diagnostics of the degree bias of UNS and DANS negative edges.
+
+degreeBias.ipynb builds whole negative graphs with sample_negative_graph and computes their
+preferential attachment scores only to plot a 40-bin histogram. Here node pairs are streamed in
+batches (the positive edges from the CSR, the negatives from NegativeSampler.iter_batches) into
+fixed-bin histograms of two distributions:
+
+- preferential_attachment: the normalized preferential attachment d(u) d(v) / max_degree^2 of the
+  pairs, as GRAPE's get_preferential_attachment_scores(normalize=True), in log-spaced bins;
+- degree: the degrees of both endpoints of the pairs, in one bin per degree.
+
+Each sample is then compared to the positive edges by the Kolmogorov-Smirnov distance (evaluated
+at the bin edges, so exact for the degrees) and the Jensen-Shannon divergence (base 2, in [0, 1])
+of the histograms. Memory is constant in the number of negatives: only the current batch and the
+histograms are allocated.
+
+Usage:
+
+    python degree_bias.py [--number-of-negative-samples 10000000] [--output degree_bias.csv] sli string kg_idg monarch
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from negative_sampling import DEFAULT_BATCH_SIZE, NegativeSampler
+
+DISTRIBUTIONS = ("preferential_attachment", "degree")
+DEFAULT_NUMBER_OF_BINS = 1000
+
+
+class DegreeBiasHistograms:
+    """
+    Fixed-bin histograms of the preferential attachment and endpoint degrees of named samples of node pairs.
+
+    Parameters
+    ----------
+    degrees:
+        Degrees of the nodes used to score the pairs, e.g. those of the whole graph.
+    number_of_bins:
+        Number of log-spaced bins of the preferential attachment histogram.
+    """
+
+    def __init__(self, degrees, number_of_bins=DEFAULT_NUMBER_OF_BINS):
+        self.degrees = np.asarray(degrees, dtype=np.float64)
+        self.max_degree = max(1.0, self.degrees.max(initial=0.0))
+        # Scores of pairs of nodes with degree at least one are in [1 / max_degree^2, 1].
+        self.bin_edges = dict(
+            preferential_attachment=np.concatenate([[0.0], np.geomspace(1.0 / self.max_degree**2, 1.0, number_of_bins)]),
+            degree=np.arange(self.max_degree + 2) - 0.5,
+        )
+        # Sample name -> distribution -> counts, and running sums of the values for the means.
+        self.counts = {}
+        self.sums = {}
+
+    def update(self, name, pairs):
+        """
+        Add a batch of (source, destination) pairs to the histograms of the sample called name.
+        """
+        pairs = np.asarray(pairs, dtype=np.int64)
+        counts = self.counts.setdefault(name, {
+            distribution: np.zeros(len(bin_edges) - 1, dtype=np.int64)
+            for distribution, bin_edges in self.bin_edges.items()
+        })
+        source_degrees = self.degrees[pairs[:, 0]]
+        destination_degrees = self.degrees[pairs[:, 1]]
+        scores = source_degrees * destination_degrees / self.max_degree**2
+        sums = self.sums.setdefault(name, dict.fromkeys(DISTRIBUTIONS, 0.0))
+        sums["preferential_attachment"] += scores.sum()
+        sums["degree"] += source_degrees.sum() + destination_degrees.sum()
+        # Bin i holds the values in (edge i, edge i + 1], the first bin the scores of 0.
+        bins = np.searchsorted(self.bin_edges["preferential_attachment"], scores, side="left") - 1
+        counts["preferential_attachment"] += np.bincount(
+            np.maximum(bins, 0), minlength=len(counts["preferential_attachment"])
+        )
+        counts["degree"] += np.bincount(
+            np.concatenate([source_degrees, destination_degrees]).astype(np.int64),
+            minlength=len(counts["degree"]),
+        )
+
+    def get_histogram(self, name, distribution):
+        """
+        Return the (counts, bin edges) of a distribution of a sample, as np.histogram.
+        """
+        return self.counts[name][distribution], self.bin_edges[distribution]
+
+    def compare(self, reference, name):
+        """
+        Return the KS distance and the Jensen-Shannon divergence of every distribution of name to those of reference.
+        """
+        comparison = {}
+        for distribution in DISTRIBUTIONS:
+            p = self.counts[reference][distribution] / max(1, self.counts[reference][distribution].sum())
+            q = self.counts[name][distribution] / max(1, self.counts[name][distribution].sum())
+            m = (p + q) / 2
+            with np.errstate(divide="ignore", invalid="ignore"):
+                kl_p = np.where(p > 0, p * np.log2(p / m), 0.0).sum()
+                kl_q = np.where(q > 0, q * np.log2(q / m), 0.0).sum()
+            comparison[f"{distribution}_ks"] = float(np.abs(np.cumsum(p) - np.cumsum(q)).max())
+            comparison[f"{distribution}_js"] = float((kl_p + kl_q) / 2)
+        return comparison
+
+    def get_means(self, name):
+        """
+        Return the mean preferential attachment and endpoint degree of a sample.
+        """
+        return {
+            f"{distribution}_mean": float(self.sums[name][distribution] / max(1, self.counts[name][distribution].sum()))
+            for distribution in DISTRIBUTIONS
+        }
+
+
+def iter_edge_batches(offsets, destinations, directed=False, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Yield the (source, destination) edges of a CSR in batches, once per undirected edge.
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    for start in range(0, len(destinations), batch_size):
+        edge_ids = np.arange(start, min(start + batch_size, len(destinations)))
+        sources = np.searchsorted(offsets, edge_ids, side="right") - 1
+        batch_destinations = np.asarray(destinations[start:start + batch_size], dtype=np.int64)
+        pairs = np.stack([sources, batch_destinations], axis=1)
+        yield pairs if directed else pairs[sources < batch_destinations]
+
+
+def get_degree_bias(
+    offsets,
+    destinations,
+    degrees=None,
+    number_of_negative_samples=None,
+    directed=False,
+    random_state=42,
+    batch_size=DEFAULT_BATCH_SIZE,
+    number_of_bins=DEFAULT_NUMBER_OF_BINS,
+):
+    """
+    Return the summary table of the degree bias of UNS and DANS negatives, and the histograms.
+
+    The positives are the edges of the CSR (e.g. the subgraph of interest), the negatives are sampled
+    from its nodes as sample_negative_graph would, and the pairs are scored with the given degrees
+    (by default those of the CSR). By default as many negatives as positive edges are drawn.
+    """
+    degrees = np.diff(np.asarray(offsets, dtype=np.int64)) if degrees is None else degrees
+    histograms = DegreeBiasHistograms(degrees, number_of_bins=number_of_bins)
+    number_of_positives = 0
+    for pairs in iter_edge_batches(offsets, destinations, directed=directed, batch_size=batch_size):
+        histograms.update("positive", pairs)
+        number_of_positives += len(pairs)
+    number_of_negative_samples = number_of_negative_samples or number_of_positives
+    rows = [dict(sample="positive", number_of_pairs=number_of_positives, **histograms.get_means("positive"))]
+    for sampling, use_scale_free_distribution in (("UNS", False), ("DANS", True)):
+        sampler = NegativeSampler(
+            offsets, destinations, use_scale_free_distribution=use_scale_free_distribution, directed=directed
+        )
+        number_of_pairs = 0
+        for pairs in sampler.iter_batches(number_of_negative_samples, random_state=random_state, batch_size=batch_size):
+            histograms.update(sampling, pairs)
+            number_of_pairs += len(pairs)
+        rows.append(dict(
+            sample=sampling,
+            number_of_pairs=number_of_pairs,
+            **histograms.get_means(sampling),
+            **histograms.compare("positive", sampling),
+        ))
+    return pd.DataFrame(rows), histograms
+
+
+def get_task_degree_bias(dataset, **kwargs):
+    """
+    Return the degree bias table and histograms of a dataset of graph_preparation.TASKS:
+    the positives are the edges of the task (see task_views.py), scored with the degrees of the whole graph.
+    """
+    from graph_preparation import TASKS
+    from task_views import get_task_view
+    get_prepared, task = TASKS[dataset]
+    prepared_graph = get_prepared()
+    degrees = prepared_graph.get_node_degrees()
+    positives = prepared_graph if task is None else get_task_view(prepared_graph, task)
+    offsets, destinations = positives.offsets, positives.destinations
+    return get_degree_bias(offsets, destinations, degrees=degrees, directed=prepared_graph.is_directed(), **kwargs)
+
+
+if __name__ == "__main__":
+    from graph_preparation import TASKS
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("datasets", nargs="+", choices=list(TASKS))
+    parser.add_argument("--number-of-negative-samples", type=int, default=None,
+                        help="Negatives per sampling mode, by default as many as the positive edges")
+    parser.add_argument("--output", default=None, help="Path of the CSV table, printed if not given")
+    arguments = parser.parse_args()
+    table = pd.concat([
+        get_task_degree_bias(
+            dataset, number_of_negative_samples=arguments.number_of_negative_samples
+        )[0].assign(dataset=dataset)
+        for dataset in arguments.datasets
+    ], ignore_index=True)
+    if arguments.output:
+        table.to_csv(arguments.output, index=False)
+    else:
+        print(table.to_string(index=False))
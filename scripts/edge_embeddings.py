@@ -0,0 +1,311 @@
+"""
+Edge embeddings computed per mini-batch from memory-mapped node embeddings.
+
+The run scripts train PerceptronEdgePrediction(edge_embeddings="Hadamard"), which holds the
+node embeddings in memory and, on the Monarch KG, the edge embeddings of all the training, test
+and negative edges push the jobs out of memory. Here the node embeddings stay memory-mapped (as
+stored by embedding_store.py, in float32 or float16), and the edge embeddings are computed from the
+rows of the endpoints of each batch of edges only, with the element-wise operators of GRAPE
+(Hadamard, L1, L2, Add, Sub, Maximum, Minimum, Concatenate, CosineSimilarity, EuclideanDistance).
+
+StreamingPerceptron trains a perceptron (logistic regression with the Adam optimizer, as GRAPE's)
+on these batches: every epoch streams the positive edges of the CSR in mini-batches, each paired
+with as many UNS or DANS negatives drawn by NegativeSampler, and scoring also streams the pairs in
+batches. StreamingPerceptronEdgePrediction wraps it as a GRAPE edge prediction model, so that it
+can replace PerceptronEdgePrediction in the grids ("model": "StreamingPerceptron").
+Memory is bounded by a chunk of batches, whatever the number of edges. GRAPE hands the model the
+node features as returned by the embedder with return_dataframe=False, which for the embedders of
+embedding_store.py are the memory-mapped arrays in node-id order, uncopied.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from negative_sampling import NegativeSampler
+
+EDGE_EMBEDDING_METHODS = (
+    "Hadamard",
+    "L1",
+    "L2",
+    "Add",
+    "Sub",
+    "Maximum",
+    "Minimum",
+    "Concatenate",
+    "CosineSimilarity",
+    "EuclideanDistance",
+)
+# Edges whose embeddings are computed at once; the mini-batches of training are slices of a chunk.
+DEFAULT_CHUNK_SIZE = 2**16
+
+
+def get_edge_embedding(sources, destinations, method):
+    """
+    Return the float32 edge embeddings of the rows of the source and destination node embeddings.
+    """
+    if method == "Hadamard":
+        return sources * destinations
+    if method == "L1":
+        return np.abs(sources - destinations)
+    if method == "L2":
+        return (sources - destinations) ** 2
+    if method == "Add":
+        return sources + destinations
+    if method == "Sub":
+        return sources - destinations
+    if method == "Maximum":
+        return np.maximum(sources, destinations)
+    if method == "Minimum":
+        return np.minimum(sources, destinations)
+    if method == "Concatenate":
+        return np.concatenate([sources, destinations], axis=1)
+    if method == "CosineSimilarity":
+        norms = np.linalg.norm(sources, axis=1) * np.linalg.norm(destinations, axis=1)
+        dot_products = (sources * destinations).sum(axis=1)
+        return np.divide(dot_products, norms, out=np.zeros_like(dot_products), where=norms > 0)[:, None]
+    if method == "EuclideanDistance":
+        return np.linalg.norm(sources - destinations, axis=1)[:, None]
+    raise ValueError(f"Unknown edge embedding method {method}, expected one of {EDGE_EMBEDDING_METHODS}")
+
+
+def get_edge_embeddings(node_embeddings, pairs, methods):
+    """
+    Return the float32 edge embeddings of a batch of (source, destination) pairs.
+    Only the rows of the endpoints are read from the (memory-mapped) node embeddings, which may be float16.
+    """
+    pairs = np.asarray(pairs, dtype=np.int64)
+    columns = []
+    for node_embedding in node_embeddings:
+        sources = np.asarray(node_embedding[pairs[:, 0]], dtype=np.float32)
+        destinations = np.asarray(node_embedding[pairs[:, 1]], dtype=np.float32)
+        columns.extend(get_edge_embedding(sources, destinations, method) for method in methods)
+    return np.concatenate(columns, axis=1)
+
+
+def iter_edge_embeddings(node_embeddings, pairs, methods, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield the edge embeddings of the pairs, chunk_size pairs at a time.
+    """
+    for start in range(0, len(pairs), chunk_size):
+        yield get_edge_embeddings(node_embeddings, pairs[start:start + chunk_size], methods)
+
+
+def _sigmoid(values):
+    return 0.5 * (1.0 + np.tanh(0.5 * values))
+
+
+class StreamingPerceptron:
+    """
+    Perceptron trained on edge embeddings computed per chunk of edges.
+
+    Parameters
+    ----------
+    edge_embeddings:
+        Element-wise operators combining the node embeddings of the endpoints, see EDGE_EMBEDDING_METHODS.
+    number_of_epochs:
+        Passes over the positive edges.
+    number_of_edges_per_mini_batch:
+        Positive edges per mini-batch, each paired with as many negatives.
+    learning_rate, first_order_decay_factor, second_order_decay_factor:
+        Parameters of the Adam optimizer.
+    use_scale_free_distribution:
+        Whether the training negatives are sampled proportionally to the degrees (DANS) or uniformly (UNS).
+    """
+
+    def __init__(
+        self,
+        edge_embeddings=("Hadamard",),
+        number_of_epochs=100,
+        number_of_edges_per_mini_batch=4096,
+        learning_rate=0.001,
+        first_order_decay_factor=0.9,
+        second_order_decay_factor=0.999,
+        use_scale_free_distribution=True,
+        random_state=42,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+    ):
+        self.edge_embeddings = [edge_embeddings] if isinstance(edge_embeddings, str) else list(edge_embeddings)
+        self.number_of_epochs = number_of_epochs
+        self.number_of_edges_per_mini_batch = number_of_edges_per_mini_batch
+        self.learning_rate = learning_rate
+        self.first_order_decay_factor = first_order_decay_factor
+        self.second_order_decay_factor = second_order_decay_factor
+        self.use_scale_free_distribution = use_scale_free_distribution
+        self.random_state = random_state
+        # A whole number of mini-batches per chunk.
+        self.chunk_size = max(1, chunk_size // number_of_edges_per_mini_batch) * number_of_edges_per_mini_batch
+        self.weights = None
+        self.bias = 0.0
+
+    def fit(self, offsets, destinations, node_embeddings, directed=False):
+        """
+        Train on the edges of the CSR (the training graph) against negatives sampled from it.
+        """
+        offsets = np.asarray(offsets, dtype=np.int64)
+        random_state = np.random.default_rng(self.random_state)
+        sampler = NegativeSampler(
+            offsets, destinations, use_scale_free_distribution=self.use_scale_free_distribution, directed=directed
+        )
+        sources = np.repeat(np.arange(len(offsets) - 1, dtype=np.int64), np.diff(offsets))
+        edge_ids = np.flatnonzero(sources < destinations) if not directed else np.arange(len(destinations))
+        del sources
+        dimension = get_edge_embeddings(node_embeddings, np.zeros((1, 2), dtype=np.int64), self.edge_embeddings).shape[1]
+        self.weights = np.zeros(dimension, dtype=np.float32)
+        self.bias = 0.0
+        # Adam moments of the weights and the bias, stored together.
+        first_moment = np.zeros(dimension + 1, dtype=np.float64)
+        second_moment = np.zeros(dimension + 1, dtype=np.float64)
+        step = 0
+        for _ in range(self.number_of_epochs):
+            edge_ids = random_state.permutation(edge_ids)
+            for start in range(0, len(edge_ids), self.chunk_size):
+                chunk = edge_ids[start:start + self.chunk_size]
+                positives = np.stack([np.searchsorted(offsets, chunk, side="right") - 1, destinations[chunk]], axis=1)
+                # A batch of iter_batches can be shorter than requested once candidates are rejected: the
+                # generator is drained so that every positive of the chunk is paired with a negative.
+                negatives = np.concatenate(list(sampler.iter_batches(
+                    len(chunk), random_state=int(random_state.integers(2**31)), batch_size=len(chunk)
+                )))
+                assert len(negatives) == len(chunk)
+                positive_features = get_edge_embeddings(node_embeddings, positives, self.edge_embeddings)
+                negative_features = get_edge_embeddings(node_embeddings, negatives, self.edge_embeddings)
+                for batch_start in range(0, len(chunk), self.number_of_edges_per_mini_batch):
+                    batch_end = batch_start + self.number_of_edges_per_mini_batch
+                    features = np.concatenate([
+                        positive_features[batch_start:batch_end], negative_features[batch_start:batch_end]
+                    ])
+                    labels = np.zeros(len(features), dtype=np.float32)
+                    labels[:len(positive_features[batch_start:batch_end])] = 1.0
+                    errors = _sigmoid(features @ self.weights + self.bias) - labels
+                    gradient = np.append(features.T @ errors, errors.sum()) / len(features)
+                    step += 1
+                    first_moment = self.first_order_decay_factor * first_moment + (1 - self.first_order_decay_factor) * gradient
+                    second_moment = self.second_order_decay_factor * second_moment \
+                        + (1 - self.second_order_decay_factor) * gradient ** 2
+                    update = self.learning_rate * (first_moment / (1 - self.first_order_decay_factor ** step)) / (
+                        np.sqrt(second_moment / (1 - self.second_order_decay_factor ** step)) + 1e-8
+                    )
+                    self.weights -= update[:-1].astype(np.float32)
+                    self.bias -= update[-1]
+        return self
+
+    def predict_proba(self, node_embeddings, pairs):
+        """
+        Return the probability that each (source, destination) pair is an edge, scoring chunk_size pairs at a time.
+        """
+        pairs = np.asarray(pairs)
+        if len(pairs) == 0:
+            return np.empty(0, dtype=np.float32)
+        return np.concatenate([
+            _sigmoid(features @ self.weights + self.bias)
+            for features in iter_edge_embeddings(node_embeddings, pairs, self.edge_embeddings, self.chunk_size)
+        ]).astype(np.float32)
+
+
+@lru_cache(maxsize=None)
+def get_streaming_perceptron_edge_prediction():
+    """
+    Return the GRAPE model class wrapping StreamingPerceptron, created on first use so that GRAPE is only
+    imported by the processes that evaluate models.
+    """
+    from embiggen.edge_prediction.edge_prediction_model import AbstractEdgePredictionModel
+    from edge_features import get_csr_from_grape
+
+    class StreamingPerceptronEdgePrediction(AbstractEdgePredictionModel):
+        """
+        GRAPE edge prediction model training a StreamingPerceptron on the node features.
+        The parameters are those of PerceptronEdgePrediction that apply to edge embeddings.
+        """
+
+        def __init__(
+            self,
+            edge_embeddings="Hadamard",
+            number_of_epochs=100,
+            number_of_edges_per_mini_batch=4096,
+            learning_rate=0.001,
+            first_order_decay_factor=0.9,
+            second_order_decay_factor=0.999,
+            use_scale_free_distribution=True,
+            random_state=42,
+            edge_features=None,
+            verbose=False,
+        ):
+            super().__init__(random_state=random_state)
+            if edge_features:
+                raise ValueError(
+                    f"Edge features are not supported by {self.model_name()}, use edge_features.py instead."
+                )
+            self._model_kwargs = dict(
+                edge_embeddings=edge_embeddings,
+                number_of_epochs=number_of_epochs,
+                number_of_edges_per_mini_batch=number_of_edges_per_mini_batch,
+                learning_rate=learning_rate,
+                first_order_decay_factor=first_order_decay_factor,
+                second_order_decay_factor=second_order_decay_factor,
+                use_scale_free_distribution=use_scale_free_distribution,
+            )
+            self._model = StreamingPerceptron(**self._model_kwargs, random_state=random_state)
+
+        def parameters(self):
+            return dict(**super().parameters(), **self._model_kwargs)
+
+        def clone(self):
+            return type(self)(**self.parameters())
+
+        @classmethod
+        def smoke_test_parameters(cls):
+            return dict(number_of_epochs=1)
+
+        def _fit(self, graph, support=None, node_features=None, node_type_features=None,
+                 edge_type_features=None, edge_features=None):
+            self._model.fit(*get_csr_from_grape(graph), node_features, directed=graph.is_directed())
+
+        def _predict(self, graph, support=None, node_features=None, node_type_features=None,
+                     edge_type_features=None, edge_features=None):
+            return self._predict_proba(graph, support=support, node_features=node_features) > 0.5
+
+        def _predict_proba(self, graph, support=None, node_features=None, node_type_features=None,
+                           edge_type_features=None, edge_features=None):
+            # One score per directed edge, as PerceptronEdgePrediction.
+            return self._model.predict_proba(node_features, graph.get_directed_edge_node_ids())
+
+        @classmethod
+        def requires_node_types(cls):
+            return False
+
+        @classmethod
+        def can_use_node_types(cls):
+            # As PerceptronEdgePrediction, types are accepted but not used by the edge embeddings.
+            return True
+
+        @classmethod
+        def requires_edge_types(cls):
+            return False
+
+        @classmethod
+        def can_use_edge_types(cls):
+            # As PerceptronEdgePrediction, types are accepted but not used by the edge embeddings.
+            return True
+
+        @classmethod
+        def can_use_edge_weights(cls):
+            return False
+
+        @classmethod
+        def can_use_edge_type_features(cls):
+            return False
+
+        @classmethod
+        def can_use_edge_features(cls):
+            return False
+
+        @classmethod
+        def model_name(cls):
+            return "Streaming Perceptron"
+
+        @classmethod
+        def library_name(cls):
+            return "NumPy"
+
+    return StreamingPerceptronEdgePrediction
+
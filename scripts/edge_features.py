@@ -0,0 +1,159 @@
+"""
+Batched topological edge features over a CSR adjacency.
+
+The degree-only analyses use the "Degree", "AdamicAdar", "JaccardCoefficient",
+"ResourceAllocationIndex" and "PreferentialAttachment" edge features. Three of them are sums
+over the shared neighbours of the two nodes, so for every batch of (source, destination) pairs
+we intersect the neighbourhoods once: the neighbours of the lower degree endpoint are expanded
+and looked up among the sorted packed edge keys of the other endpoint, and the matches are
+aggregated per pair with np.bincount. Batches are processed by a thread pool (NumPy releases the
+GIL in these kernels), and the feature matrix of the pairs of a holdout is cached on disk, keyed
+by the hash of the graph the features are computed on and of the pairs.
+"""
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from negative_sampling import get_edge_keys
+
+EDGE_FEATURES_DIRECTORY = os.path.join(os.environ.get("EXPERIMENTS_DIR", "./experiments"), "edge_features")
+
+EDGE_FEATURES = (
+    "Degree",
+    "AdamicAdar",
+    "JaccardCoefficient",
+    "ResourceAllocationIndex",
+    "PreferentialAttachment",
+)
+DEFAULT_BATCH_SIZE = 2**16
+
+
+def get_feature_columns(features=EDGE_FEATURES):
+    """
+    Return the names of the columns of the feature matrix: the Degree feature has one column per endpoint.
+    """
+    columns = []
+    for feature in features:
+        if feature == "Degree":
+            columns.extend(["SourceDegree", "DestinationDegree"])
+        else:
+            columns.append(feature)
+    return columns
+
+
+def get_csr_from_grape(graph):
+    """
+    Return the (offsets, destinations) CSR of a GRAPE graph, whose directed edges are sorted by source and destination.
+    """
+    edge_node_ids = graph.get_directed_edge_node_ids()
+    offsets = np.zeros(graph.get_number_of_nodes() + 1, dtype=np.uint64)
+    np.cumsum(np.bincount(edge_node_ids[:, 0], minlength=graph.get_number_of_nodes()), out=offsets[1:])
+    return offsets, np.ascontiguousarray(edge_node_ids[:, 1], dtype=np.uint32)
+
+
+class EdgeFeatureEngine:
+    """
+    Computes the topological edge features of arbitrary node pairs of the graph with the given CSR.
+    The scores match GRAPE's get_*_from_node_ids methods (e.g. get_adamic_adar_index_from_node_ids).
+    """
+
+    def __init__(self, offsets, destinations, number_of_threads=None, batch_size=DEFAULT_BATCH_SIZE):
+        self.number_of_nodes = len(offsets) - 1
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.destinations = np.asarray(destinations, dtype=np.int64)
+        self.degrees = np.diff(self.offsets)
+        self.edge_keys = get_edge_keys(offsets, destinations, self.number_of_nodes)
+        with np.errstate(divide="ignore"):
+            self.inverse_degrees = np.where(self.degrees > 0, 1.0 / self.degrees, 0.0)
+            self.inverse_log_degrees = np.where(self.degrees > 1, 1.0 / np.log(self.degrees), 0.0)
+        self.number_of_threads = number_of_threads or int(os.environ.get("OMP_NUM_THREADS", os.cpu_count() or 1))
+        self.batch_size = batch_size
+
+    @classmethod
+    def from_grape(cls, graph, **kwargs):
+        return cls(*get_csr_from_grape(graph), **kwargs)
+
+    @classmethod
+    def from_prepared_graph(cls, prepared_graph, **kwargs):
+        return cls(prepared_graph.offsets, prepared_graph.destinations, **kwargs)
+
+    def get_shared_neighbours(self, sources, destinations):
+        """
+        Return the pair index and the node id of every shared neighbour of the pairs.
+        """
+        swap = self.degrees[sources] > self.degrees[destinations]
+        expanded = np.where(swap, destinations, sources)
+        other = np.where(swap, sources, destinations)
+        lengths = self.degrees[expanded]
+        pair_indices = np.repeat(np.arange(len(sources)), lengths)
+        # Position of each expanded neighbour in the CSR: start of its node plus its rank.
+        starts = np.repeat(self.offsets[expanded] - np.cumsum(lengths) + lengths, lengths)
+        neighbours = self.destinations[starts + np.arange(len(starts))]
+        keys = other[pair_indices] * self.number_of_nodes + neighbours
+        positions = np.searchsorted(self.edge_keys, keys)
+        positions[positions == len(self.edge_keys)] = 0
+        shared = self.edge_keys[positions] == keys if len(self.edge_keys) > 0 else np.zeros(len(keys), dtype=bool)
+        return pair_indices[shared], neighbours[shared]
+
+    def _compute_batch(self, pairs, features):
+        sources = np.asarray(pairs[:, 0], dtype=np.int64)
+        destinations = np.asarray(pairs[:, 1], dtype=np.int64)
+        source_degrees = self.degrees[sources].astype(np.float64)
+        destination_degrees = self.degrees[destinations].astype(np.float64)
+        pair_indices, neighbours = self.get_shared_neighbours(sources, destinations)
+        columns = []
+        for feature in features:
+            if feature == "Degree":
+                columns.extend([source_degrees, destination_degrees])
+            elif feature == "AdamicAdar":
+                columns.append(np.bincount(pair_indices, weights=self.inverse_log_degrees[neighbours], minlength=len(pairs)))
+            elif feature == "ResourceAllocationIndex":
+                columns.append(np.bincount(pair_indices, weights=self.inverse_degrees[neighbours], minlength=len(pairs)))
+            elif feature == "JaccardCoefficient":
+                intersections = np.bincount(pair_indices, minlength=len(pairs)).astype(np.float64)
+                unions = source_degrees + destination_degrees - intersections
+                columns.append(np.divide(intersections, unions, out=np.zeros_like(unions), where=unions > 0))
+            elif feature == "PreferentialAttachment":
+                columns.append(source_degrees * destination_degrees)
+            else:
+                raise ValueError(f"Unknown edge feature {feature}, expected one of {EDGE_FEATURES}")
+        return np.stack(columns, axis=1).astype(np.float32)
+
+    def compute(self, pairs, features=EDGE_FEATURES):
+        """
+        Return the (number of pairs, number of columns) float32 matrix of the features of the (source, destination) pairs.
+        """
+        pairs = np.asarray(pairs)
+        batches = [pairs[start:start + self.batch_size] for start in range(0, len(pairs), self.batch_size)]
+        if not batches:
+            return np.empty((0, len(get_feature_columns(features))), dtype=np.float32)
+        with ThreadPoolExecutor(max_workers=self.number_of_threads) as executor:
+            return np.concatenate(list(executor.map(lambda batch: self._compute_batch(batch, features), batches)))
+
+
+def get_edge_features_path(graph, pairs, features):
+    digest = hashlib.sha256()
+    digest.update(str(graph.hash()).encode("utf8"))
+    digest.update(np.ascontiguousarray(pairs, dtype=np.int64).tobytes())
+    digest.update(",".join(features).encode("utf8"))
+    return os.path.join(EDGE_FEATURES_DIRECTORY, f"{digest.hexdigest()[:24]}.npy")
+
+
+def load_edge_features(graph, pairs, features=EDGE_FEATURES, engine=None):
+    """
+    Return the feature matrix of the pairs on the GRAPE graph (e.g. the training graph of a holdout),
+    computing and caching it on first use. An engine built on the same graph can be passed to be reused.
+    """
+    path = get_edge_features_path(graph, pairs, features)
+    if os.path.exists(path):
+        return np.load(path, mmap_mode="r")
+    if engine is None:
+        engine = EdgeFeatureEngine.from_grape(graph)
+    edge_features = engine.compute(pairs, features)
+    os.makedirs(EDGE_FEATURES_DIRECTORY, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+    np.save(tmp_path, edge_features)
+    os.replace(tmp_path, path)
+    return edge_features
@@ -0,0 +1,131 @@
+"""
+On-disk store of node embeddings shared by all the evaluations of a grid.
+
+Evaluating a cell with uniform (UNS) and degree-aware (DANS) validation negatives fits the
+same embedder on the same holdout training graphs: only the negative sampling of the
+evaluation set differs. Embedders wrapped with with_embedding_store look up their node
+embeddings by the hash of the graph they are fitted on (which identifies the dataset and the
+holdout), the embedder name and its parameters (including the random state of the holdout),
+and only train when no stored embedding matches. Embeddings are saved as .npy files and
+memory-mapped when loaded, so concurrent workers share them through the page cache. GRAPE's
+evaluation asks the embedders for arrays (return_dataframe=False) and gets these memory-mapped
+arrays, in node-id order, as they are; return_dataframe=True wraps them in DataFrames, which copies them.
+They can be stored in float16 to halve their size, e.g. for the streaming perceptron of
+edge_embeddings.py, which upcasts the rows of each batch to float32.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import get_tracer
+
+EMBEDDINGS_DIRECTORY = os.path.join(os.environ.get("EXPERIMENTS_DIR", "./experiments"), "embeddings")
+
+
+def get_embedding_key(graph, embedder, dtype="float32"):
+    """
+    Return the key of the embedding of graph computed by embedder and stored as dtype.
+    """
+    parameters = {
+        key: value
+        for key, value in embedder.parameters().items()
+        if key != "verbose"
+    }
+    key = [graph.hash(), embedder.model_name(), embedder.library_name(), parameters]
+    # float32 embeddings keep the keys they had before the dtype was configurable.
+    if dtype != "float32":
+        key.append(dtype)
+    return hashlib.sha256(json.dumps(
+        key,
+        sort_keys=True,
+        default=str,
+    ).encode("utf8")).hexdigest()[:24]
+
+
+def get_embedding_path(graph, embedder, dtype="float32"):
+    return os.path.join(
+        EMBEDDINGS_DIRECTORY,
+        embedder.model_name().replace(" ", "_"),
+        get_embedding_key(graph, embedder, dtype)
+    )
+
+
+def load_node_embeddings(path):
+    """
+    Return the list of node embeddings stored at path, memory-mapped, or None if there are none.
+    """
+    metadata_path = os.path.join(path, "metadata.json")
+    if not os.path.exists(metadata_path):
+        return None
+    with open(metadata_path) as fh:
+        metadata = json.load(fh)
+    return [
+        np.load(os.path.join(path, f"node_embedding_{i}.npy"), mmap_mode="r")
+        for i in range(metadata["number_of_node_embeddings"])
+    ]
+
+
+def store_node_embeddings(path, node_embeddings, graph, embedder, dtype="float32"):
+    """
+    Save the node embeddings at path as dtype, writing under a temporary name and renaming into place.
+    """
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=parent, prefix=".tmp_")
+    for i, node_embedding in enumerate(node_embeddings):
+        if isinstance(node_embedding, pd.DataFrame):
+            node_embedding = node_embedding.to_numpy()
+        np.save(os.path.join(tmp_path, f"node_embedding_{i}.npy"), np.asarray(node_embedding, dtype=dtype))
+    with open(os.path.join(tmp_path, "metadata.json"), "w") as fh:
+        json.dump({
+            "graph_name": graph.get_name(),
+            "graph_hash": graph.hash(),
+            "model_name": embedder.model_name(),
+            "library_name": embedder.library_name(),
+            "parameters": embedder.parameters(),
+            "number_of_node_embeddings": len(node_embeddings),
+            "dtype": dtype,
+        }, fh, indent=2, default=str)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # Another worker stored the same embedding in the meantime.
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def with_embedding_store(embedder_class, dtype="float32"):
+    """
+    Return a subclass of the given GRAPE embedder class that reads and writes the embedding store.
+    The subclass keeps the model name and parameters of the embedder, so the results rows are unchanged.
+    GRAPE's own models need float32 embeddings; float16 ones are meant for the streaming perceptron.
+    """
+    from embiggen.utils.abstract_models import EmbeddingResult
+
+    class StoredEmbedder(embedder_class):
+
+        def _fit_transform(self, graph, return_dataframe=True):
+            path = get_embedding_path(graph, self, dtype)
+            with get_tracer().stage("embedding", model_name=self.model_name()):
+                node_embeddings = load_node_embeddings(path)
+                if node_embeddings is None:
+                    result = super()._fit_transform(graph, return_dataframe=False)
+                    store_node_embeddings(path, result.get_all_node_embedding(), graph, self, dtype)
+                    node_embeddings = load_node_embeddings(path)
+            if return_dataframe:
+                node_names = graph.get_node_names()
+                node_embeddings = [
+                    pd.DataFrame(node_embedding, index=node_names)
+                    for node_embedding in node_embeddings
+                ]
+            return EmbeddingResult(
+                embedding_method_name=self.model_name(),
+                node_embeddings=node_embeddings
+            )
+
+    StoredEmbedder.__name__ = embedder_class.__name__
+    return StoredEmbedder
@@ -0,0 +1,445 @@
+"""
+Declarative, resumable and parallel runner for the edge prediction experiment grids.
+
+A grid is described by a small JSON file in the grids directory (see grids/sli.json):
+the dataset, train sizes, validation sampling modes, embedders and the worker/thread budget.
+Each cell of the grid (train size x embedder x parameter set) evaluates both validation
+sampling modes (DANS and UNS) against the same node embeddings, runs on a process pool and
+is written to its own TSV as soon as it finishes. Cells whose TSV already exists are skipped,
+so a grid that was killed (crash, SLURM time limit) resumes where it stopped when the script
+is launched again. With --dry-run, the cached and missing evaluation units of the pending
+cells are reported and nothing is run.
+
+Usage:
+
+    python experiment_grid.py grids/sli.json [--dry-run]
+"""
+import argparse
+import json
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+from tqdm.auto import tqdm
+
+GRIDS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "grids")
+EXPERIMENTS_DIRECTORY = os.environ.get("EXPERIMENTS_DIR", "./experiments")
+
+DEFAULT_CONFIG = {
+    "smoke_test": False,
+    "number_of_holdouts": 10,
+    "train_sizes": [0.75],
+    "validation_use_scale_free": [True, False],
+    "validation_unbalance_rates": [1.0],
+    "use_subgraph_as_support": False,
+    "model_use_scale_free": [True, False],
+    "number_of_workers": None,
+    "threads_per_worker": None,
+    "results_store": True,
+    "chrome_trace": False,
+    # PerceptronEdgePrediction, StreamingPerceptron to compute the edge embeddings per batch (see edge_embeddings.py),
+    # or StackedPerceptron to train the models of all the model_use_scale_free modes at once (see stacked_perceptron.py).
+    "model": "PerceptronEdgePrediction",
+    # Overrides of the parameters of the edge prediction models.
+    "model_parameters": {},
+    # float16 halves the size of the stored node embeddings, for the StreamingPerceptron model only.
+    "embedding_dtype": "float32",
+    # Train the DeepWalk and Walklets embedders on a walk corpus shared by all of them (see walk_corpus.py).
+    "walk_corpus": False,
+    # Reuse the results rows already computed by any grid or script (see result_cache.py), evicting beyond the size.
+    "result_cache": True,
+    "result_cache_max_size_gb": 10.0,
+}
+
+# State of a worker process, set once by _initialize_worker.
+_worker_config = None
+_worker_task = None
+
+
+def load_grid_config(path):
+    """
+    Return the grid configuration at path, completed with the defaults.
+    """
+    with open(path) as fh:
+        config = dict(DEFAULT_CONFIG, **json.load(fh))
+    config.setdefault("output", f"{config['name']}.tsv")
+    if config["smoke_test"]:
+        config["output"] = config.get("smoke_test_output", config["output"])
+    return config
+
+
+def get_parameter_sets(embedder_name):
+    """
+    If the embedding method involves edge sampling, we train a run
+    using the scale free and one using the uniform distribution.
+    """
+    from grape import embedders
+    if "use_scale_free_distribution" in getattr(embedders, embedder_name)().parameters():
+        return [
+            dict(use_scale_free_distribution=True),
+            dict(use_scale_free_distribution=False),
+        ]
+    return [dict()]
+
+
+def get_cell_id(cell):
+    parameters = "-".join(f"{key}={value}" for key, value in sorted(cell["embedder_parameters"].items()))
+    return "-".join(filter(None, [
+        f"train_size={cell['train_size']}",
+        cell["embedder"],
+        parameters,
+    ]))
+
+
+def get_grid_cells(config):
+    """
+    Return the list of cells of the grid.
+    The validation sampling modes are not part of the cells: they are evaluated
+    within each cell, so that the embeddings are trained once for both.
+    """
+    cells = []
+    for train_size in config["train_sizes"]:
+        for embedder in config["embedders"]:
+            for embedder_parameters in get_parameter_sets(embedder):
+                cell = dict(
+                    train_size=train_size,
+                    embedder=embedder,
+                    embedder_parameters=embedder_parameters,
+                )
+                cell["cell_id"] = get_cell_id(cell)
+                cells.append(cell)
+    return cells
+
+
+def get_cells_directory(config):
+    # Smoke test cells must never be resumed by the real run.
+    name = f"{config['name']}_smoke_test" if config["smoke_test"] else config["name"]
+    return os.path.join(EXPERIMENTS_DIRECTORY, "grids", name, "cells")
+
+
+def get_cell_path(config, cell):
+    return os.path.join(get_cells_directory(config), f"{cell['cell_id']}.tsv")
+
+
+def get_trace_directory(config):
+    return os.path.join(os.path.dirname(get_cells_directory(config)), "trace")
+
+
+def write_grid_trace(config):
+    """
+    Merge the stages recorded by the workers into the Chrome trace of the grid, returning its path.
+    """
+    import glob
+    from instrumentation import write_chrome_trace
+    path = os.path.join(os.path.dirname(get_cells_directory(config)), "trace.json")
+    write_chrome_trace(sorted(glob.glob(os.path.join(get_trace_directory(config), "*.jsonl"))), path)
+    return path
+
+
+def get_worker_budget(config):
+    """
+    Return the number of worker processes and the number of threads of each worker.
+    By default the CPUs allotted by SLURM (or the machine) are split among the workers.
+    """
+    total_threads = int(os.environ.get("SLURM_CPUS_PER_TASK", os.cpu_count() or 1))
+    threads_per_worker = config["threads_per_worker"] or total_threads
+    number_of_workers = config["number_of_workers"] or max(1, total_threads // threads_per_worker)
+    return number_of_workers, threads_per_worker
+
+
+def _initialize_worker(config, threads_per_worker):
+    """
+    Limit the threads of the worker before GRAPE starts its thread pool and load the dataset once.
+    """
+    global _worker_config, _worker_task
+    for variable in ("RAYON_NUM_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[variable] = str(threads_per_worker)
+    from graph_preparation import load_task
+    from instrumentation import get_tracer
+    tracer = get_tracer()
+    if config["chrome_trace"]:
+        os.makedirs(get_trace_directory(config), exist_ok=True)
+        tracer.trace_path = os.path.join(get_trace_directory(config), f"{os.getpid()}.jsonl")
+    _worker_config = config
+    with tracer.stage("loading", dataset=config["dataset"]):
+        _worker_task = load_task(config["dataset"])
+
+
+def get_cell_evaluation(config, task, cell):
+    """
+    Return the edge prediction model class of a cell and the arguments of its evaluate_with_result_cache call.
+    """
+    from grape import embedders
+    from grape.edge_prediction import PerceptronEdgePrediction
+    from embedding_store import with_embedding_store
+    from holdout_store import RANDOM_STATE
+    graph, subgraph, edge_type = task
+    holdouts_kwargs = dict(train_size=cell["train_size"])
+    if edge_type is not None:
+        holdouts_kwargs["edge_types"] = [edge_type]
+    kwargs = dict()
+    if subgraph is not None:
+        kwargs = dict(
+            subgraph_of_interest=subgraph,
+            use_subgraph_as_support=config["use_subgraph_as_support"],
+        )
+    EmbedderClass = getattr(embedders, cell["embedder"])
+    if config["walk_corpus"]:
+        from walk_corpus import is_walk_based, with_walk_corpus
+        if is_walk_based(EmbedderClass):
+            EmbedderClass = with_walk_corpus(EmbedderClass)
+    ModelClass = with_embedding_store(EmbedderClass, dtype=config["embedding_dtype"])
+    model_defaults = dict(
+        edge_features=None,
+        edge_embeddings="Hadamard",
+        number_of_edges_per_mini_batch=32,
+    )
+    if config["model"] == "StreamingPerceptron":
+        from edge_embeddings import get_streaming_perceptron_edge_prediction
+        model_class = get_streaming_perceptron_edge_prediction()
+    elif config["model"] == "StackedPerceptron":
+        from stacked_perceptron import get_stacked_perceptron_edge_prediction
+        model_class = get_stacked_perceptron_edge_prediction()
+        model_defaults["stacked_with"] = [
+            dict(
+                edge_features=config["model_parameters"].get("edge_features"),
+                edge_embeddings=config["model_parameters"].get("edge_embeddings", "Hadamard"),
+                use_scale_free_distribution=use_scale_free_distribution,
+            )
+            for use_scale_free_distribution in config["model_use_scale_free"]
+        ]
+    else:
+        model_class = PerceptronEdgePrediction
+    return model_class, dict(
+        smoke_test=config["smoke_test"],
+        holdouts_kwargs=holdouts_kwargs,
+        evaluation_schema="Connected Monte Carlo",
+        node_features=ModelClass(**cell["embedder_parameters"]),
+        graph=graph,
+        models=[
+            model_class(**dict(
+                dict(model_defaults, use_scale_free_distribution=use_scale_free_distribution),
+                **config["model_parameters"]
+            ))
+            for use_scale_free_distribution in config["model_use_scale_free"]
+        ],
+        random_state=RANDOM_STATE,
+        number_of_holdouts=config["number_of_holdouts"],
+        validation_use_scale_free=config["validation_use_scale_free"],
+        validation_unbalance_rates=config["validation_unbalance_rates"],
+        # Settings of the grid that change the results without being parameters of the models or embedders.
+        key_parameters=dict(embedding_dtype=config["embedding_dtype"], walk_corpus=config["walk_corpus"]),
+        **kwargs
+    )
+
+
+def order_cell_results(config, results):
+    """
+    Return the results of a cell, given in holdout order, ordered by validation sampling mode and then holdout,
+    as with a single evaluation of all the holdouts. The order within a mode is kept.
+    """
+    return pd.concat([
+        results[results["use_scale_free_distribution"] == use_scale_free_distribution]
+        for use_scale_free_distribution in config["validation_use_scale_free"]
+    ])
+
+
+def evaluate_cell(config, task, cell, holdout_numbers=None, aggregate=True):
+    """
+    Run the edge prediction evaluation of a single cell of the grid, for every validation sampling mode.
+    The first mode trains and stores the node embeddings of each holdout, the following ones load them.
+    The units of the cell already in the result cache (see result_cache.py) are not computed again.
+    If holdout_numbers is given, only these holdouts are evaluated. The holdouts are evaluated one after
+    the other and, if aggregate is set, the results of each are added to the running summary of the grid
+    as soon as they are produced.
+    """
+    from instrumentation import get_stage_columns, get_tracer
+    from result_cache import evaluate_with_result_cache
+    model_class, evaluation = get_cell_evaluation(config, task, cell)
+    if holdout_numbers is None:
+        holdout_numbers = range(config["number_of_holdouts"])
+    holdout_results = []
+    for holdout_number in holdout_numbers:
+        # As in edge_prediction_evaluation, but evaluating through the holdout store.
+        results = evaluate_with_result_cache(
+            model_class,
+            holdout_numbers=[holdout_number],
+            enable_cache=not config["smoke_test"],
+            enable_result_cache=config["result_cache"],
+            max_size_gb=config["result_cache_max_size_gb"],
+            **evaluation
+        )
+        if aggregate:
+            update_aggregate(config, get_holdout_part_name(cell, holdout_number), results)
+        holdout_results.append(results)
+    results = order_cell_results(config, pd.concat(holdout_results))
+    # The dataset is loaded once per worker: its cost is reported on every row.
+    loading = [event for event in get_tracer().events if event["name"] == "loading"]
+    for column, value in get_stage_columns(loading[-1:]).items():
+        results[column] = value
+    return results
+
+
+def evaluate_grid(config, task, cell_ids=None):
+    """
+    Evaluate the cells of the grid (or those in cell_ids) one after the other in this process, without writing
+    their TSVs nor the running summary, and return their concatenated results. Used by the warm worker
+    (see worker_daemon.py), where the dataset, holdouts and embeddings stay loaded from one run to the next.
+    """
+    return pd.concat([
+        evaluate_cell(config, task, cell, aggregate=False).assign(cell_id=cell["cell_id"])
+        for cell in get_grid_cells(config)
+        if cell_ids is None or cell["cell_id"] in cell_ids
+    ])
+
+
+def write_cell_results(config, cell, results):
+    """
+    Write the results of a cell, returning the path of its TSV.
+    The TSV is written under a temporary name and renamed, so a killed job never leaves a partial cell.
+    """
+    path = get_cell_path(config, cell)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    results.to_csv(tmp_path, sep="\t")
+    os.replace(tmp_path, path)
+    if config["results_store"] and not config["smoke_test"]:
+        from results_store import append_results
+        append_results(results, config["dataset"], f"{config['name']}-{cell['cell_id']}")
+    return path
+
+
+def _run_cell(cell):
+    """
+    Evaluate a cell in a worker process and write its results, returning the path of the TSV.
+    """
+    return write_cell_results(_worker_config, cell, evaluate_cell(_worker_config, _worker_task, cell))
+
+
+def get_aggregate_path(config):
+    return os.path.join(os.path.dirname(get_cells_directory(config)), "aggregate.json")
+
+
+def get_holdout_part_name(cell, holdout_number):
+    return f"{cell['cell_id']}-holdout={holdout_number}"
+
+
+def update_aggregate(config, part_name, results):
+    """
+    Add the results of a part of the grid to its running summary (see online_aggregation.py).
+    The workers update it concurrently: the state is reloaded and saved under an exclusive lock,
+    so that no update is lost.
+    """
+    import fcntl
+    from online_aggregation import OnlineAggregator
+    path = get_aggregate_path(config)
+    with open(f"{path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        aggregator = OnlineAggregator(path)
+        aggregator.update(part_name, results)
+        aggregator.save()
+
+
+def load_aggregator(config, cells):
+    """
+    Return the running summary of the grid, updated with the holdouts of the given finished cells
+    that the workers did not add while evaluating them.
+    """
+    from online_aggregation import OnlineAggregator
+    parts = OnlineAggregator(get_aggregate_path(config)).parts
+    for cell in cells:
+        # Summaries written before the per-holdout updates counted whole cells.
+        if cell["cell_id"] in parts:
+            continue
+        holdout_numbers = [
+            holdout_number for holdout_number in range(config["number_of_holdouts"])
+            if get_holdout_part_name(cell, holdout_number) not in parts
+        ]
+        if not holdout_numbers:
+            continue
+        results = pd.read_csv(get_cell_path(config, cell), sep="\t", index_col=0)
+        for holdout_number in holdout_numbers:
+            update_aggregate(
+                config,
+                get_holdout_part_name(cell, holdout_number),
+                results[results["holdout_number"] == holdout_number],
+            )
+    return OnlineAggregator(get_aggregate_path(config))
+
+
+def merge_cells(config, cells):
+    """
+    Concatenate the TSVs of the given cells into the output TSV of the grid.
+    """
+    results = pd.concat([
+        pd.read_csv(get_cell_path(config, cell), sep="\t", index_col=0)
+        for cell in cells
+    ])
+    results.to_csv(config["output"], sep="\t")
+    return results
+
+
+def run_grid(config_path):
+    """
+    Run all the cells of the grid described at config_path that have not been computed yet.
+    """
+    config = load_grid_config(config_path)
+    cells = get_grid_cells(config)
+    os.makedirs(get_cells_directory(config), exist_ok=True)
+    pending = [cell for cell in cells if not os.path.exists(get_cell_path(config, cell))]
+    print(f"{config['name']}: {len(cells) - len(pending)} of {len(cells)} cells already computed")
+    number_of_workers, threads_per_worker = get_worker_budget(config)
+    load_aggregator(config, [cell for cell in cells if cell not in pending])
+    if pending:
+        # We spawn rather than fork: GRAPE's thread pool must be created after the thread limit is set.
+        with ProcessPoolExecutor(
+            max_workers=min(number_of_workers, len(pending)),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_initialize_worker,
+            initargs=(config, threads_per_worker),
+        ) as executor:
+            futures = {executor.submit(_run_cell, cell): cell for cell in pending}
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Grid cells"):
+                future.result()
+                print(f"Finished {futures[future]['cell_id']}")
+    if config["chrome_trace"]:
+        print(f"Chrome trace written to {write_grid_trace(config)}")
+    return merge_cells(config, cells)
+
+
+def report_grid_cache_status(config_path):
+    """
+    Print the number of evaluation units of every pending cell of the grid that are in the result cache
+    and that would be computed, without computing anything.
+    """
+    from graph_preparation import load_task
+    from result_cache import get_result_cache_status
+    config = load_grid_config(config_path)
+    cells = get_grid_cells(config)
+    pending = [cell for cell in cells if not os.path.exists(get_cell_path(config, cell))]
+    print(f"{config['name']}: {len(cells) - len(pending)} of {len(cells)} cells already computed")
+    task = load_task(config["dataset"])
+    total_hits = total_misses = 0
+    for cell in pending:
+        _, evaluation = get_cell_evaluation(config, task, cell)
+        hits, misses = get_result_cache_status(**evaluation)
+        if not config["result_cache"]:
+            hits, misses = 0, hits + misses
+        total_hits += hits
+        total_misses += misses
+        print(f"{cell['cell_id']}: {hits} cached, {misses} to compute")
+    print(f"Total: {total_hits} cached, {total_misses} to compute")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("config_path", help="JSON description of the grid")
+    parser.add_argument(
+        "--dry-run", action="store_true",
+        help="Report the result cache hits and misses of the pending cells without running them",
+    )
+    arguments = parser.parse_args()
+    if arguments.dry_run:
+        report_grid_cache_status(arguments.config_path)
+    else:
+        run_grid(arguments.config_path)
@@ -0,0 +1,538 @@
+"""
+Shared preparation of the graphs used by the run scripts and notebooks.
+
+The SLI|STRING composite graph and the filtered STRING PPI graph are expensive to
+build (dataset loading, confidence filtering, two remapping passes, composition and
+component extraction). We build them once, write the result as a compact binary
+representation (CSR offsets and destinations, node-name table, edge-type array)
+keyed by a fingerprint of the input files, and memory-map it on later runs.
+Only the CSR arrays are shared: the NumPy consumers (degree bias, network characteristics,
+negative sampling, task views) read the memory-mapped arrays, which the jobs of a node share
+through the page cache. GRAPE has no constructor over external arrays, so to_grape loads an
+edge list exported next to the arrays and every job holds its own full GRAPE copy in RAM.
+
+Usage from the scripts directory:
+
+    from graph_preparation import load_sli_composite_graph
+    composite_graph, subgraph = load_sli_composite_graph()
+"""
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from task_views import PredictionTask, get_task_view, relabel_graph_inplace
+
+GRAPH_ROOT = os.environ.get("GRAPH_CACHE_DIR", "./graphs")
+PREPARED_GRAPHS_DIRECTORY = os.path.join(GRAPH_ROOT, "prepared")
+
+STRING_INFO_PATH = f"{GRAPH_ROOT}/string/HomoSapiens/links.v11.5/9606.protein.info.v11.5.txt"
+SLDB_NODES_PATH = f"{GRAPH_ROOT}/kghub/SLDB/20220522/sldb/merged-kg_nodes.tsv"
+# Raw files downloaded by GRAPE; a change in any of them invalidates the prepared graphs.
+STRING_INPUT_PATTERNS = [f"{GRAPH_ROOT}/string/HomoSapiens/links.v11.5/9606.protein.*"]
+SLDB_INPUT_PATTERNS = [f"{GRAPH_ROOT}/kghub/SLDB/20220522/sldb/merged-kg_*.tsv"]
+KG_IDG_VERSION = "20230601"
+KG_IDG_INPUT_PATTERNS = [f"{GRAPH_ROOT}/kghub/KGIDG/{KG_IDG_VERSION}/**/*.tsv"]
+# The Monarch KG is downloaded manually in the working directory, unpacked or not (see monarch_ingestion.py).
+MONARCH_URL = "https://data.monarchinitiative.org/monarch-kg-dev/2023-09-28/monarch-kg.tar.gz"
+MONARCH_ARCHIVE_PATH = "monarch-kg.tar.gz"
+MONARCH_EDGES_PATH = "monarch-kg_edges.tsv"
+MONARCH_NODES_PATH = "monarch-kg_nodes.tsv"
+# Predicates and node categories kept when streaming the Monarch KG. None keeps everything, as the
+# analyses do; the edges are then held as compact integer arrays while the graph is built.
+MONARCH_PREDICATES = None
+MONARCH_CATEGORIES = None
+
+MIN_STRING_EDGE_WEIGHT = 700
+# Combined score thresholds of the sweeps of string_thresholds.py, prepared in one pass.
+STRING_THRESHOLDS = (400, 700, 900)
+# Separator of multi-label node types (e.g. biolink categories) in the exported node list.
+NODE_TYPES_SEPARATOR = "|"
+# Bump when the preparation chain changes in a way the input files do not capture.
+PREPARATION_VERSION = 4
+
+# Edge prediction tasks, see task_views.py. The relations of the KG-IDG and Monarch tasks of the grids
+# are set when the graphs are prepared, the others are set when the task is loaded.
+CHEMICAL_NODE_TYPES = ("biolink:ChemicalSubstance", "biolink:ChemicalEntity", "biolink:Drug")
+SLI_TASK = PredictionTask("SLI")
+KG_IDG_DRUG_PROTEIN_TASK = PredictionTask("minority_edge", CHEMICAL_NODE_TYPES, ("biolink:Protein",))
+MONARCH_PHENOTYPE_DISEASE_TASK = PredictionTask(
+    "biolink:has_phenotype", ("biolink:PhenotypicFeature",), ("biolink:Disease",)
+)
+MONARCH_DRUG_PROTEIN_TASK = PredictionTask("drug_to_protein", CHEMICAL_NODE_TYPES, ("biolink:Protein",))
+MONARCH_GENE_DISEASE_TASK = PredictionTask("gene_to_disease", ("biolink:Gene",), ("biolink:Disease",))
+
+
+def get_input_fingerprint(patterns, parameters):
+    """
+    Return a short hash of the files matching the glob patterns and the preparation parameters.
+    Returns None if no file matches yet, i.e., GRAPE has not retrieved the dataset.
+    We hash path, size and modification time rather than the content so that
+    fingerprinting the multi-GB STRING files stays instantaneous.
+    """
+    paths = sorted(path for pattern in patterns for path in glob.glob(pattern, recursive=True))
+    if len(paths) == 0:
+        return None
+    digest = hashlib.sha256()
+    digest.update(json.dumps(
+        dict(parameters, preparation_version=PREPARATION_VERSION),
+        sort_keys=True
+    ).encode("utf8"))
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{os.path.relpath(path, GRAPH_ROOT)}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf8"))
+    return digest.hexdigest()[:16]
+
+
+def _to_int_array(values, dtype):
+    """
+    Convert a GRAPE id vector that may contain None (missing types) to a NumPy array using -1 for None.
+    """
+    try:
+        return np.asarray(values, dtype=dtype)
+    except TypeError:
+        return np.fromiter((-1 if value is None else value for value in values), dtype=dtype, count=len(values))
+
+
+def write_prepared_graph(graph, path, fingerprint):
+    """
+    Write a GRAPE graph to path as CSR arrays plus node, node-type and edge-type tables.
+    """
+    node_names = np.asarray(graph.get_node_names(), dtype=str)
+    number_of_nodes = len(node_names)
+    edges = np.asarray(graph.get_directed_edge_node_ids(), dtype=np.uint32).reshape(-1, 2)
+    edge_type_ids = _to_int_array(graph.get_directed_edge_type_ids(), np.int32) \
+        if graph.has_edge_types() else np.full(len(edges), -1, dtype=np.int32)
+    edge_type_names = list(graph.get_unique_edge_type_names()) if graph.has_edge_types() else []
+    node_type_names = list(graph.get_unique_node_type_names()) if graph.has_node_types() else []
+    # Nodes may have several types (e.g. biolink categories), stored as a second CSR.
+    node_type_index = {name: i for i, name in enumerate(node_type_names)}
+    node_type_lists = graph.get_node_type_names() if graph.has_node_types() else [None] * number_of_nodes
+    node_type_counts = np.fromiter(
+        (0 if types is None else len(types) for types in node_type_lists),
+        dtype=np.uint64, count=number_of_nodes
+    )
+    node_type_offsets = np.zeros(number_of_nodes + 1, dtype=np.uint64)
+    np.cumsum(node_type_counts, out=node_type_offsets[1:])
+    node_type_ids = np.fromiter(
+        (node_type_index[name] for types in node_type_lists if types is not None for name in types),
+        dtype=np.int32, count=int(node_type_offsets[-1])
+    )
+    write_prepared_arrays(
+        path,
+        fingerprint,
+        name=graph.get_name(),
+        directed=graph.is_directed(),
+        node_names=node_names,
+        edges=edges,
+        edge_type_ids=edge_type_ids,
+        edge_type_names=edge_type_names,
+        node_type_names=node_type_names,
+        node_type_offsets=node_type_offsets,
+        node_type_ids=node_type_ids,
+    )
+
+
+def write_prepared_arrays(path, fingerprint, name, directed, node_names, edges, edge_type_ids, edge_type_names,
+                          node_type_names, node_type_offsets, node_type_ids):
+    """
+    Write the prepared graph given by its directed edges (node id pairs, both directions for undirected graphs)
+    and node and edge tables to path. The directory is written under a temporary name and renamed into place,
+    so that concurrent SLURM jobs never observe a half-written cache.
+    """
+    number_of_nodes = len(node_names)
+    # GRAPE already stores edges sorted by source, destination and edge type, we make sure of it.
+    order = np.lexsort((edge_type_ids, edges[:, 1], edges[:, 0]))
+    edges = edges[order]
+    edge_type_ids = edge_type_ids[order]
+    offsets = np.zeros(number_of_nodes + 1, dtype=np.uint64)
+    np.cumsum(np.bincount(edges[:, 0], minlength=number_of_nodes), out=offsets[1:])
+
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=parent, prefix=".tmp_")
+    np.save(os.path.join(tmp_path, "offsets.npy"), offsets)
+    np.save(os.path.join(tmp_path, "destinations.npy"), np.ascontiguousarray(edges[:, 1]))
+    np.save(os.path.join(tmp_path, "edge_type_ids.npy"), edge_type_ids)
+    np.save(os.path.join(tmp_path, "node_names.npy"), node_names)
+    np.save(os.path.join(tmp_path, "node_type_offsets.npy"), node_type_offsets)
+    np.save(os.path.join(tmp_path, "node_type_ids.npy"), node_type_ids)
+    with open(os.path.join(tmp_path, "metadata.json"), "w") as fh:
+        json.dump({
+            "name": name,
+            "fingerprint": fingerprint,
+            "directed": directed,
+            "number_of_nodes": number_of_nodes,
+            "number_of_directed_edges": len(edges),
+            "edge_type_names": edge_type_names,
+            "node_type_names": node_type_names,
+        }, fh, indent=2)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # Another job wrote the same cache in the meantime.
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+class PreparedGraph:
+    """
+    Read-only CSR view of a prepared graph, backed by memory-mapped arrays.
+    All SLURM jobs on a node share the same page-cache copy of the arrays.
+    Undirected edges are stored in both directions, as in GRAPE.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "metadata.json")) as fh:
+            self.metadata = json.load(fh)
+        self.name = self.metadata["name"]
+        self.fingerprint = self.metadata["fingerprint"]
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.destinations = np.load(os.path.join(path, "destinations.npy"), mmap_mode="r")
+        self.edge_type_ids = np.load(os.path.join(path, "edge_type_ids.npy"), mmap_mode="r")
+        self.node_type_offsets = np.load(os.path.join(path, "node_type_offsets.npy"), mmap_mode="r")
+        self.node_type_ids = np.load(os.path.join(path, "node_type_ids.npy"), mmap_mode="r")
+        self._node_names = None
+
+    def is_directed(self):
+        return self.metadata["directed"]
+
+    def get_number_of_nodes(self):
+        return self.metadata["number_of_nodes"]
+
+    def get_number_of_directed_edges(self):
+        return self.metadata["number_of_directed_edges"]
+
+    def get_node_names(self):
+        # Node names are only needed for reporting and export, we load them on first use.
+        if self._node_names is None:
+            self._node_names = np.load(os.path.join(self.path, "node_names.npy"))
+        return self._node_names
+
+    def get_edge_type_names(self):
+        return self.metadata["edge_type_names"]
+
+    def get_node_type_names(self):
+        return self.metadata["node_type_names"]
+
+    def get_edge_type_id(self, edge_type_name):
+        return self.metadata["edge_type_names"].index(edge_type_name)
+
+    def get_node_degrees(self):
+        return np.diff(self.offsets).astype(np.uint32)
+
+    def get_sources(self):
+        """
+        Return the source of every directed edge, expanded from the CSR offsets.
+        """
+        return np.repeat(
+            np.arange(self.get_number_of_nodes(), dtype=np.uint32),
+            self.get_node_degrees()
+        )
+
+    def get_neighbours(self, node_id):
+        return self.destinations[self.offsets[node_id]:self.offsets[node_id + 1]]
+
+    def get_grape_edge_list_path(self):
+        """
+        Return the paths of node and edge TSVs for GRAPE, writing them on first use.
+        """
+        node_path = os.path.join(self.path, "nodes.tsv")
+        edge_path = os.path.join(self.path, "edges.tsv")
+        if os.path.exists(edge_path):
+            return node_path, edge_path
+        node_names = self.get_node_names()
+        node_type_names = np.asarray(self.get_node_type_names(), dtype=object)
+        node_type_offsets = np.asarray(self.node_type_offsets, dtype=np.int64)
+        node_type_labels = [
+            NODE_TYPES_SEPARATOR.join(node_type_names[self.node_type_ids[start:end]])
+            for start, end in zip(node_type_offsets[:-1], node_type_offsets[1:])
+        ]
+        sources = self.get_sources()
+        destinations = np.asarray(self.destinations)
+        mask = np.ones(len(sources), dtype=bool) if self.is_directed() else sources <= destinations
+        edge_type_names = np.asarray(self.get_edge_type_names() + [""], dtype=object)
+        tmp_suffix = f".{os.getpid()}.tmp"
+        pd.DataFrame({
+            "id": node_names,
+            "category": node_type_labels,
+        }).to_csv(node_path + tmp_suffix, sep="\t", index=False)
+        pd.DataFrame({
+            "subject": node_names[sources[mask]],
+            "object": node_names[destinations[mask]],
+            "predicate": edge_type_names[self.edge_type_ids[mask]],
+        }).to_csv(edge_path + tmp_suffix, sep="\t", index=False)
+        os.replace(node_path + tmp_suffix, node_path)
+        os.replace(edge_path + tmp_suffix, edge_path)
+        return node_path, edge_path
+
+    def to_grape(self):
+        """
+        Return the prepared graph as a GRAPE graph.
+        Loading the already filtered edge list is much faster than repeating the preparation chain,
+        but the GRAPE graph is a private in-memory copy, not a view of the memory-mapped arrays.
+        """
+        from grape import Graph
+        node_path, edge_path = self.get_grape_edge_list_path()
+        return Graph.from_csv(
+            directed=self.is_directed(),
+            node_path=node_path,
+            edge_path=edge_path,
+            nodes_column="id",
+            node_list_node_types_column="category" if self.get_node_type_names() else None,
+            node_types_separator=NODE_TYPES_SEPARATOR,
+            sources_column="subject",
+            destinations_column="object",
+            edge_list_edge_types_column="predicate" if self.get_edge_type_names() else None,
+            name=self.name,
+            verbose=False,
+        )
+
+
+def get_prepared_graph(name, build_graph, input_patterns, parameters):
+    """
+    Return the PreparedGraph called name, running build_graph() only if no cache matches the inputs.
+    """
+    from instrumentation import get_tracer
+    from network_characteristics import load_network_characteristics
+    fingerprint = get_input_fingerprint(input_patterns, parameters)
+    if fingerprint is not None:
+        path = os.path.join(PREPARED_GRAPHS_DIRECTORY, f"{name}-{fingerprint}")
+        if os.path.exists(path):
+            return PreparedGraph(path)
+    with get_tracer().stage("graph_preparation", graph_name=name):
+        graph = build_graph()
+    # The first build may be the one that downloads the inputs.
+    fingerprint = get_input_fingerprint(input_patterns, parameters)
+    path = os.path.join(PREPARED_GRAPHS_DIRECTORY, f"{name}-{fingerprint}")
+    if not os.path.exists(path):
+        write_prepared_graph(graph, path, fingerprint)
+    prepared_graph = PreparedGraph(path)
+    # The approximate characteristics of every new prepared graph are cached along the way.
+    with get_tracer().stage("network_characteristics", graph_name=name):
+        load_network_characteristics(prepared_graph)
+    return prepared_graph
+
+
+def build_string_graph(min_edge_weight=MIN_STRING_EDGE_WEIGHT, remap_node_names=True):
+    """
+    Load STRING HomoSapiens and keep the PPI edges with combined score >= min_edge_weight.
+    If remap_node_names is True, ENSP identifiers are replaced by gene symbols so that
+    the graph can be composed with SLDB.
+    """
+    from grape.datasets.string import HomoSapiens
+    return filter_string_graph(
+        HomoSapiens(),
+        min_edge_weight=min_edge_weight,
+        info_path=STRING_INFO_PATH if remap_node_names else None,
+    )
+
+
+def filter_string_graph(string_graph, min_edge_weight=MIN_STRING_EDGE_WEIGHT, info_path=None):
+    """
+    Keep the PPI edges of the STRING graph with combined score >= min_edge_weight. If info_path is given,
+    ENSP identifiers are replaced by the gene symbols of that STRING protein info table.
+    """
+    from node_remapping import get_node_names_remapping
+    string_graph = string_graph \
+        .remove_node_types() \
+        .filter_from_names(min_edge_weight=min_edge_weight) \
+        .remove_edge_weights()
+    if info_path is None:
+        return string_graph.remove_disconnected_nodes()
+    remapping_string = get_node_names_remapping(string_graph, info_path, key_column=0, value_column=1)
+    return string_graph \
+        .remap_from_node_names_map(remapping_string) \
+        .set_all_node_types("Gene") \
+        .set_all_edge_types("PPI") \
+        .remove_disconnected_nodes()
+
+
+def build_sli_composite_graph(min_edge_weight=MIN_STRING_EDGE_WEIGHT):
+    """
+    Build the largest connected component of the SLI|STRING composite graph.
+    """
+    from grape.datasets.kghub import SLDB
+    from node_remapping import get_node_names_remapping
+    string_graph = build_string_graph(min_edge_weight=min_edge_weight)
+    sli_graph = SLDB()
+    remapping_sli = get_node_names_remapping(sli_graph, SLDB_NODES_PATH, key_column=0, value_column=2)
+    return compose_sli_string_graph(sli_graph.remap_from_node_names_map(remapping_sli), string_graph)
+
+
+def compose_sli_string_graph(sli_graph, string_graph):
+    """
+    Return the largest connected component of the composition of the SLI graph and the remapped STRING graph.
+    """
+    sli_graph = sli_graph.set_all_node_types("Gene").set_all_edge_types("SLI")
+    return (sli_graph | string_graph).remove_components(top_k_components=1)
+
+
+def get_prepared_string_graph(min_edge_weight=MIN_STRING_EDGE_WEIGHT, remap_node_names=True):
+    return get_prepared_graph(
+        name="string" if remap_node_names else "string-ensp",
+        build_graph=lambda: build_string_graph(min_edge_weight=min_edge_weight, remap_node_names=remap_node_names),
+        input_patterns=STRING_INPUT_PATTERNS,
+        parameters=dict(min_edge_weight=min_edge_weight, remap_node_names=remap_node_names),
+    )
+
+
+def get_prepared_sli_composite_graph(min_edge_weight=MIN_STRING_EDGE_WEIGHT):
+    return get_prepared_graph(
+        name="sli-string-composite",
+        build_graph=lambda: build_sli_composite_graph(min_edge_weight=min_edge_weight),
+        input_patterns=STRING_INPUT_PATTERNS + SLDB_INPUT_PATTERNS,
+        parameters=dict(min_edge_weight=min_edge_weight),
+    )
+
+
+def load_string_graph(min_edge_weight=MIN_STRING_EDGE_WEIGHT, remap_node_names=True):
+    """
+    Return the filtered STRING PPI graph as a GRAPE graph.
+    """
+    string_graph = get_prepared_string_graph(
+        min_edge_weight=min_edge_weight,
+        remap_node_names=remap_node_names
+    ).to_grape()
+    string_graph.enable()
+    return string_graph
+
+
+def load_sli_composite_graph(min_edge_weight=MIN_STRING_EDGE_WEIGHT):
+    """
+    Return the SLI|STRING composite graph and its SLI subgraph of interest as GRAPE graphs.
+    """
+    prepared_graph = get_prepared_sli_composite_graph(min_edge_weight=min_edge_weight)
+    composite_graph = prepared_graph.to_grape()
+    composite_graph.enable()
+    return composite_graph, get_task_view(prepared_graph, SLI_TASK).to_grape(composite_graph)
+
+
+def get_prepared_string_threshold_graph(threshold, remap_node_names=True):
+    """
+    Return the prepared STRING graph at a combined score threshold, preparing the graphs of all the
+    STRING_THRESHOLDS in one pass.
+    """
+    from string_thresholds import get_prepared_string_graphs
+    thresholds = sorted(set(STRING_THRESHOLDS) | {threshold})
+    return get_prepared_string_graphs(thresholds, remap_node_names=remap_node_names)[threshold]
+
+
+def get_prepared_sli_composite_threshold_graph(threshold):
+    """
+    Return the prepared SLI|STRING composite graph at a combined score threshold, preparing the graphs of all
+    the STRING_THRESHOLDS in one pass.
+    """
+    from string_thresholds import get_prepared_sli_composite_graphs
+    return get_prepared_sli_composite_graphs(sorted(set(STRING_THRESHOLDS) | {threshold}))[threshold]
+
+
+def build_kg_idg_graph():
+    """
+    Build the dense main component of KG-IDG with drug to protein edges relabeled as minority_edge.
+    """
+    from grape.datasets.kghub import KGIDG
+    return relabel_kg_idg_graph(KGIDG(version=KG_IDG_VERSION))
+
+
+def relabel_kg_idg_graph(graph):
+    """
+    Return the dense main component of graph with drug to protein edges relabeled as minority_edge.
+    """
+    dense_main_component = graph \
+        .remove_components(top_k_components=1) \
+        .remove_dendritic_trees()
+    return relabel_graph_inplace(dense_main_component, KG_IDG_DRUG_PROTEIN_TASK)
+
+
+def build_monarch_graph():
+    """
+    Build the dense main component of the Monarch KG with phenotype to disease edges relabeled as biolink:has_phenotype.
+    The KG is streamed from monarch-kg.tar.gz (or the unpacked TSVs).
+    """
+    from monarch_ingestion import load_monarch_graph
+    if not os.path.exists(MONARCH_ARCHIVE_PATH) and (
+        not os.path.exists(MONARCH_EDGES_PATH) or not os.path.exists(MONARCH_NODES_PATH)
+    ):
+        raise FileNotFoundError(
+            f"The Monarch KG is not in the working directory: download it with wget {MONARCH_URL}"
+        )
+    return relabel_monarch_graph(load_monarch_graph(
+        MONARCH_ARCHIVE_PATH,
+        predicates=MONARCH_PREDICATES,
+        categories=MONARCH_CATEGORIES,
+    ))
+
+
+def relabel_monarch_graph(graph):
+    """
+    Return the dense main component of graph with phenotype to disease edges relabeled as biolink:has_phenotype.
+    """
+    dense_main_component = graph \
+        .remove_components(top_k_components=1) \
+        .remove_dendritic_trees() \
+        .remove_parallel_edges()
+    return relabel_graph_inplace(dense_main_component, MONARCH_PHENOTYPE_DISEASE_TASK)
+
+
+def get_prepared_kg_idg_graph():
+    return get_prepared_graph(
+        name="kg-idg",
+        build_graph=build_kg_idg_graph,
+        input_patterns=KG_IDG_INPUT_PATTERNS,
+        parameters=dict(version=KG_IDG_VERSION),
+    )
+
+
+def get_prepared_monarch_graph():
+    return get_prepared_graph(
+        name="monarch",
+        build_graph=build_monarch_graph,
+        input_patterns=[MONARCH_ARCHIVE_PATH, MONARCH_EDGES_PATH, MONARCH_NODES_PATH],
+        parameters=dict(predicates=MONARCH_PREDICATES, categories=MONARCH_CATEGORIES),
+    )
+
+
+# Prediction task of every dataset: the prepared graph and the task (see task_views.py).
+# A task of None means that holdouts are drawn over all edges and there is no subgraph of interest.
+TASKS = {
+    "sli": (get_prepared_sli_composite_graph, SLI_TASK),
+    "string": (lambda: get_prepared_string_graph(remap_node_names=False), None),
+    "kg_idg": (get_prepared_kg_idg_graph, KG_IDG_DRUG_PROTEIN_TASK),
+    "monarch": (get_prepared_monarch_graph, MONARCH_PHENOTYPE_DISEASE_TASK),
+    "monarch_drug_protein": (get_prepared_monarch_graph, MONARCH_DRUG_PROTEIN_TASK),
+    "monarch_gene_disease": (get_prepared_monarch_graph, MONARCH_GENE_DISEASE_TASK),
+    # The STRING confidence threshold sweep, e.g. sli_400 and string_900.
+    **{
+        f"sli_{threshold}": (partial(get_prepared_sli_composite_threshold_graph, threshold), SLI_TASK)
+        for threshold in STRING_THRESHOLDS
+    },
+    **{
+        f"string_{threshold}": (
+            partial(get_prepared_string_threshold_graph, threshold, remap_node_names=False), None
+        )
+        for threshold in STRING_THRESHOLDS
+    },
+}
+
+
+def load_task(dataset):
+    """
+    Return the GRAPE graph, the subgraph of interest and the edge type of interest of a dataset in TASKS.
+    The edges of the task are relabeled in place, and the subgraph of interest is built from its view
+    over the prepared graph.
+    """
+    get_prepared, task = TASKS[dataset]
+    prepared_graph = get_prepared()
+    graph = prepared_graph.to_grape()
+    graph.enable()
+    if task is None:
+        return graph, None, None
+    relabel_graph_inplace(graph, task)
+    return graph, get_task_view(prepared_graph, task).to_grape(graph), task.relation
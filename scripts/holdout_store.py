@@ -0,0 +1,213 @@
+"""
+Materialized Connected Monte Carlo holdouts shared by every embedder, model and SLURM job.
+
+GRAPE regenerates the connected holdouts (spanning tree plus sampled test edges) in every
+edge_prediction_evaluation call, i.e. for every embedder of a grid. Here each holdout of a
+(graph, holdout parameters, random state) is computed once and its test edges are stored as a
+compact uint32 array of node id pairs. Later evaluations rebuild the identical train and test
+graphs from the stored edges by reference, which also guarantees that all the methods of a
+results table were compared on the same splits.
+
+Usage, to materialize the holdouts of a grid before launching it:
+
+    python holdout_store.py grids/sli.json
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import get_stage_columns, get_tracer
+
+HOLDOUTS_DIRECTORY = os.path.join(os.environ.get("EXPERIMENTS_DIR", "./experiments"), "holdouts")
+# Random state used by GRAPE's evaluation: holdout i uses RANDOM_STATE + i.
+RANDOM_STATE = 42
+
+# Train and test graphs kept in memory by long-lived processes (see worker_daemon.py), by holdout path.
+_resident_holdouts = OrderedDict()
+_maximum_resident_holdouts = 0
+
+
+def set_resident_holdouts(maximum_resident_holdouts):
+    """
+    Keep the train and test graphs of up to maximum_resident_holdouts holdouts in memory, the least recently used
+    being dropped first, so that later evaluations in this process do not rebuild them.
+    """
+    global _maximum_resident_holdouts
+    _maximum_resident_holdouts = maximum_resident_holdouts
+    while len(_resident_holdouts) > _maximum_resident_holdouts:
+        _resident_holdouts.popitem(last=False)
+
+
+def get_holdout_path(graph, random_state, holdouts_kwargs):
+    key = hashlib.sha256(json.dumps(
+        [graph.hash(), random_state, holdouts_kwargs],
+        sort_keys=True,
+        default=str,
+    ).encode("utf8")).hexdigest()[:24]
+    return os.path.join(HOLDOUTS_DIRECTORY, graph.get_name().replace(" ", "_"), key)
+
+
+def _get_upper_triangular_edge_node_ids(graph):
+    edge_node_ids = graph.get_directed_edge_node_ids()
+    if not graph.is_directed():
+        edge_node_ids = edge_node_ids[edge_node_ids[:, 0] <= edge_node_ids[:, 1]]
+    return np.ascontiguousarray(edge_node_ids, dtype=np.uint32)
+
+
+def rebuild_holdout(graph, test_edge_node_ids):
+    """
+    Return the train and test graphs obtained by removing or keeping the given test edges of graph.
+    """
+    test_edge_node_ids = list(map(tuple, np.asarray(test_edge_node_ids).tolist()))
+    train = graph.filter_from_ids(edge_node_ids_to_remove=test_edge_node_ids)
+    test = graph.filter_from_ids(edge_node_ids_to_keep=test_edge_node_ids)
+    train.set_name(f"{graph.get_name()} train")
+    test.set_name(f"{graph.get_name()} test")
+    return train, test
+
+
+def materialize_connected_holdout(graph, random_state, **holdouts_kwargs):
+    """
+    Compute a connected holdout of graph, store its test edges and return the train and test graphs.
+    If the graph has parallel edges, rebuilding from node ids could differ from GRAPE's split:
+    we check that the rebuilt graphs are identical and otherwise mark the holdout as not rebuildable.
+    """
+    train, test = graph.connected_holdout(
+        **holdouts_kwargs,
+        random_state=random_state,
+        verbose=False,
+    )
+    test_edge_node_ids = _get_upper_triangular_edge_node_ids(test)
+    rebuilt_train, rebuilt_test = rebuild_holdout(graph, test_edge_node_ids)
+    rebuildable = rebuilt_train.hash() == train.hash() and rebuilt_test.hash() == test.hash()
+
+    path = get_holdout_path(graph, random_state, holdouts_kwargs)
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=parent, prefix=".tmp_")
+    np.save(os.path.join(tmp_path, "test_edge_node_ids.npy"), test_edge_node_ids)
+    with open(os.path.join(tmp_path, "metadata.json"), "w") as fh:
+        json.dump({
+            "graph_name": graph.get_name(),
+            "graph_hash": graph.hash(),
+            "random_state": random_state,
+            "holdouts_kwargs": holdouts_kwargs,
+            "number_of_train_edges": train.get_number_of_edges(),
+            "number_of_test_edges": test.get_number_of_edges(),
+            "rebuildable": rebuildable,
+        }, fh, indent=2, default=str)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # Another job stored the same holdout in the meantime.
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    return train, test
+
+
+def load_connected_holdout(graph, random_state, **holdouts_kwargs):
+    """
+    Return the train and test graphs of the connected holdout, materializing it on first use.
+    """
+    path = get_holdout_path(graph, random_state, holdouts_kwargs)
+    if path in _resident_holdouts:
+        _resident_holdouts.move_to_end(path)
+        return _resident_holdouts[path]
+    holdout = _load_connected_holdout(graph, path, random_state, **holdouts_kwargs)
+    if _maximum_resident_holdouts > 0:
+        _resident_holdouts[path] = holdout
+        set_resident_holdouts(_maximum_resident_holdouts)
+    return holdout
+
+
+def _load_connected_holdout(graph, path, random_state, **holdouts_kwargs):
+    metadata_path = os.path.join(path, "metadata.json")
+    if os.path.exists(metadata_path):
+        with open(metadata_path) as fh:
+            metadata = json.load(fh)
+        if metadata["rebuildable"]:
+            return rebuild_holdout(
+                graph,
+                np.load(os.path.join(path, "test_edge_node_ids.npy"), mmap_mode="r")
+            )
+        return graph.connected_holdout(
+            **holdouts_kwargs,
+            random_state=random_state,
+            verbose=False,
+        )
+    return materialize_connected_holdout(graph, random_state, **holdouts_kwargs)
+
+
+def with_holdout_store(model_class, holdout_numbers=None):
+    """
+    Return a subclass of the given GRAPE edge prediction model class whose evaluation uses the holdout store.
+    GRAPE creates the holdouts through the split_graph_following_evaluation_schema classmethod of the class
+    whose evaluate method is called, so the evaluation must be run as with_holdout_store(Model).evaluate(...).
+    If holdout_numbers is given, the evaluation only runs these holdouts (see sharding.py).
+    """
+
+    class StoredHoldoutsModel(model_class):
+
+        @classmethod
+        def _evaluate_on_single_holdout(cls, holdout_number, **kwargs):
+            if holdout_numbers is not None and holdout_number not in holdout_numbers:
+                return pd.DataFrame()
+            tracer = get_tracer()
+            position = len(tracer.events)
+            with tracer.stage("holdout_evaluation", holdout_number=holdout_number):
+                performance = super()._evaluate_on_single_holdout(holdout_number=holdout_number, **kwargs)
+            # The stages of the holdout (holdout, embedding and the evaluation as a whole) become columns of its rows.
+            for column, value in get_stage_columns(tracer.get_events_since(position)).items():
+                performance[column] = value
+            return performance
+
+        @classmethod
+        def split_graph_following_evaluation_schema(
+            cls,
+            graph,
+            evaluation_schema,
+            random_state,
+            holdout_number,
+            number_of_holdouts,
+            **holdouts_kwargs
+        ):
+            if evaluation_schema == "Connected Monte Carlo":
+                with get_tracer().stage("holdout", holdout_number=holdout_number):
+                    return load_connected_holdout(graph, random_state + holdout_number, **holdouts_kwargs)
+            return super().split_graph_following_evaluation_schema(
+                graph=graph,
+                evaluation_schema=evaluation_schema,
+                random_state=random_state,
+                holdout_number=holdout_number,
+                number_of_holdouts=number_of_holdouts,
+                **holdouts_kwargs
+            )
+
+    StoredHoldoutsModel.__name__ = model_class.__name__
+    return StoredHoldoutsModel
+
+
+def materialize_grid_holdouts(config_path):
+    """
+    Materialize all the holdouts of the grid described at config_path.
+    """
+    from experiment_grid import load_grid_config
+    from graph_preparation import load_task
+    config = load_grid_config(config_path)
+    graph, _, edge_type = load_task(config["dataset"])
+    for train_size in config["train_sizes"]:
+        holdouts_kwargs = dict(train_size=train_size)
+        if edge_type is not None:
+            holdouts_kwargs["edge_types"] = [edge_type]
+        for holdout_number in range(config["number_of_holdouts"]):
+            load_connected_holdout(graph, RANDOM_STATE + holdout_number, **holdouts_kwargs)
+
+
+if __name__ == "__main__":
+    materialize_grid_holdouts(sys.argv[1])
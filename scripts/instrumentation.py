@@ -0,0 +1,150 @@
+"""
+Lightweight per-stage instrumentation: wall time, CPU time and peak RSS of the stages of a run.
+
+The results of GRAPE only report the training and evaluation times. Stages such as loading the
+graph, remapping, building the holdout, embedding or evaluating a holdout are wrapped in
+tracer.stage(name), which records their wall time, CPU time (of all the threads of the process)
+and peak RSS. On Linux, the peak RSS of each stage is measured by resetting the high water mark of
+the process (/proc/self/clear_refs) when the stage starts; nested stages propagate their peak to
+the enclosing stage. Elsewhere, the peak RSS of the process so far is reported.
+
+The stages recorded while a holdout is evaluated are added as columns to its results rows (see
+holdout_store.with_holdout_store), e.g. embedding_wall_seconds or holdout_evaluation_peak_rss_mb,
+and all the stages of a grid run can be exported as a Chrome trace (chrome://tracing or Perfetto).
+"""
+import json
+import os
+import resource
+import time
+from contextlib import contextmanager
+
+_CLEAR_REFS_PATH = "/proc/self/clear_refs"
+_STATUS_PATH = "/proc/self/status"
+
+
+def _reset_peak_rss():
+    """
+    Reset the peak RSS of the process, returning whether it is supported.
+    """
+    try:
+        with open(_CLEAR_REFS_PATH, "w") as fh:
+            fh.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def get_peak_rss_mb():
+    """
+    Return the peak RSS of the process since the last reset, in megabytes.
+    """
+    try:
+        with open(_STATUS_PATH) as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # On Linux ru_maxrss is in kilobytes, on macOS in bytes.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Tracer:
+    """
+    Recorder of the stages of the current process.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.trace_path = None
+        self._stack = []
+
+    @contextmanager
+    def stage(self, name, **args):
+        """
+        Record the wall time, CPU time and peak RSS of the code run within the context.
+        """
+        frame = dict(children_peak_rss_mb=0.0)
+        self._stack.append(frame)
+        _reset_peak_rss()
+        start = time.time()
+        wall_time = time.perf_counter()
+        cpu_time = time.process_time()
+        try:
+            yield
+        finally:
+            peak_rss_mb = max(get_peak_rss_mb(), frame["children_peak_rss_mb"])
+            self._stack.pop()
+            if self._stack:
+                parent = self._stack[-1]
+                parent["children_peak_rss_mb"] = max(parent["children_peak_rss_mb"], peak_rss_mb)
+            event = dict(
+                name=name,
+                start=start,
+                wall_seconds=time.perf_counter() - wall_time,
+                cpu_seconds=time.process_time() - cpu_time,
+                peak_rss_mb=peak_rss_mb,
+                pid=os.getpid(),
+                args=args,
+            )
+            self.events.append(event)
+            if self.trace_path is not None:
+                with open(self.trace_path, "a") as fh:
+                    fh.write(json.dumps(event, default=str) + "\n")
+
+    def measure(self, name, function, /, *args, **kwargs):
+        """
+        Run function within a stage called name and return its result.
+        """
+        with self.stage(name):
+            return function(*args, **kwargs)
+
+    def get_events_since(self, position):
+        return self.events[position:]
+
+
+_tracer = Tracer()
+
+
+def get_tracer():
+    """
+    Return the tracer of the current process.
+    """
+    return _tracer
+
+
+def get_stage_columns(events):
+    """
+    Return the columns of the results rows describing the given stages.
+    When a stage is recorded several times (e.g. one embedding per validation mode), the times are summed
+    and the largest peak RSS is kept.
+    """
+    columns = {}
+    for event in events:
+        name = event["name"]
+        columns[f"{name}_wall_seconds"] = columns.get(f"{name}_wall_seconds", 0.0) + event["wall_seconds"]
+        columns[f"{name}_cpu_seconds"] = columns.get(f"{name}_cpu_seconds", 0.0) + event["cpu_seconds"]
+        columns[f"{name}_peak_rss_mb"] = max(columns.get(f"{name}_peak_rss_mb", 0.0), event["peak_rss_mb"])
+    return columns
+
+
+def write_chrome_trace(event_paths, path):
+    """
+    Merge the JSONL event files written by the tracers of the processes of a run into a Chrome trace at path.
+    """
+    trace_events = []
+    for event_path in event_paths:
+        with open(event_path) as fh:
+            for line in fh:
+                event = json.loads(line)
+                trace_events.append(dict(
+                    name=event["name"],
+                    ph="X",
+                    ts=event["start"] * 1e6,
+                    dur=event["wall_seconds"] * 1e6,
+                    pid=event["pid"],
+                    tid=event["pid"],
+                    args=dict(event["args"], cpu_seconds=event["cpu_seconds"], peak_rss_mb=event["peak_rss_mb"]),
+                ))
+    with open(path, "w") as fh:
+        json.dump(dict(traceEvents=trace_events, displayTimeUnit="ms"), fh)
@@ -0,0 +1,232 @@
+"""
+Streaming ingestion of the Monarch KG straight from monarch-kg.tar.gz.
+
+The node and edge TSVs are read out of the tarball as a stream, cut into blocks of whole lines
+and parsed in parallel by worker processes, which keep only the columns we use and apply the
+predicate and category filters, so the archive does not need to be unpacked. The workers return
+the edges of a block as int32 (subject, object, predicate) ids local to the block, with exact
+duplicates already dropped, and the main process maps them to global ids: only the distinct node
+names and compact integer arrays are held in memory, never the edge list as strings. The graph is
+the same as Graph.from_csv builds from the unpacked TSVs: self-loops and parallel edges with
+different predicates are kept (they are removed after the component steps, see
+graph_preparation.relabel_monarch_graph), and only exact duplicates are dropped, as GRAPE does.
+
+The unpacked TSVs (monarch-kg_edges.tsv and monarch-kg_nodes.tsv) are read the same way when
+the tarball is not available.
+"""
+import io
+import multiprocessing
+import os
+import tarfile
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+MONARCH_ARCHIVE_PATH = "monarch-kg.tar.gz"
+MONARCH_EDGES_NAME = "monarch-kg_edges.tsv"
+MONARCH_NODES_NAME = "monarch-kg_nodes.tsv"
+DEFAULT_NODE_TYPE = "biolink:NamedThing"
+
+BLOCK_SIZE = 64 * 2**20
+
+
+def iter_line_blocks(fileobj, block_size=BLOCK_SIZE):
+    """
+    Yield the header line of a TSV stream and then blocks of roughly block_size bytes made of whole lines.
+    """
+    yield fileobj.readline()
+    while True:
+        block = fileobj.read(block_size)
+        if not block:
+            return
+        if not block.endswith(b"\n"):
+            block += fileobj.readline()
+        yield block
+
+
+def _parse_block(header, block, columns):
+    return pd.read_csv(
+        io.BytesIO(header + block),
+        sep="\t",
+        usecols=columns,
+        dtype=str,
+        keep_default_na=False,
+        quoting=3,
+    )[columns]
+
+
+def parse_node_block(header, block, categories=None):
+    """
+    Return the id and category of the nodes of a block, restricted to the given categories.
+    """
+    nodes = _parse_block(header, block, ["id", "category"])
+    nodes.loc[nodes["category"] == "", "category"] = DEFAULT_NODE_TYPE
+    if categories is not None:
+        nodes = nodes[nodes["category"].isin(categories)]
+    return nodes
+
+
+def parse_edge_block(header, block, predicates=None):
+    """
+    Return the edges of a block, restricted to the given predicates, as the distinct node names and predicates
+    of the block and an int32 array of (subject, object, predicate) ids into them. The edges are undirected:
+    each is stored with its smaller node id first, so that both directions of an edge are one exact duplicate.
+    """
+    edges = _parse_block(header, block, ["subject", "object", "predicate"])
+    if predicates is not None:
+        edges = edges[edges["predicate"].isin(predicates)]
+    node_ids, node_names = pd.factorize(pd.concat([edges["subject"], edges["object"]], ignore_index=True))
+    predicate_ids, predicate_names = pd.factorize(edges["predicate"])
+    node_ids = node_ids.astype(np.int32).reshape(2, -1)
+    encoded = np.unique(np.column_stack([
+        node_ids.min(axis=0), node_ids.max(axis=0), predicate_ids.astype(np.int32)
+    ]).reshape(-1, 3), axis=0)
+    return np.asarray(node_names, dtype=object), np.asarray(predicate_names, dtype=object), encoded
+
+
+def _iter_member_streams(archive_path):
+    """
+    Yield the (name, file object) of the node and edge TSVs, from the tarball if it exists and otherwise from disk.
+    """
+    if os.path.exists(archive_path):
+        # Streaming mode: the tarball is decompressed once, front to back, without seeking.
+        with tarfile.open(archive_path, mode="r|gz") as archive:
+            for member in archive:
+                name = os.path.basename(member.name)
+                if member.isfile() and name in (MONARCH_EDGES_NAME, MONARCH_NODES_NAME):
+                    yield name, archive.extractfile(member)
+        return
+    for name in (MONARCH_NODES_NAME, MONARCH_EDGES_NAME):
+        with open(name, "rb") as fileobj:
+            yield name, fileobj
+
+
+def _scan(executor, fileobj, parse_block, filters, number_of_workers):
+    """
+    Yield the parsed blocks of the stream, in order, parsing them on the executor with at most two blocks
+    per worker in flight.
+    """
+    blocks = iter_line_blocks(fileobj)
+    header = next(blocks)
+    pending = deque()
+    for block in blocks:
+        pending.append(executor.submit(parse_block, header, block, filters))
+        if len(pending) >= 2 * number_of_workers:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _get_global_ids(names, index):
+    """
+    Return the global ids of the names, adding the new ones to index, a dict from name to id.
+    """
+    return np.fromiter((index.setdefault(name, len(index)) for name in names), dtype=np.int64, count=len(names))
+
+
+def _merge_edge_blocks(parsed_blocks):
+    """
+    Return the node names, the predicates and the distinct (subject, object, predicate) global ids of the edges
+    of the parsed blocks. Node ids follow the order in which the nodes first appear in the edges; the smaller
+    id of an edge comes first.
+    """
+    node_index, predicate_index = {}, {}
+    edges = []
+    for node_names, predicate_names, encoded in parsed_blocks:
+        node_ids = _get_global_ids(node_names, node_index)
+        predicate_ids = _get_global_ids(predicate_names, predicate_index)
+        block_edges = np.column_stack([
+            node_ids[encoded[:, 0]], node_ids[encoded[:, 1]], predicate_ids[encoded[:, 2]]
+        ]).astype(np.int32)
+        # The block ids are in no particular order with respect to the global ones.
+        swap = block_edges[:, 0] > block_edges[:, 1]
+        block_edges[swap, :2] = block_edges[swap, 1::-1]
+        edges.append(block_edges)
+    edges = np.unique(np.concatenate(edges), axis=0) if edges else np.empty((0, 3), dtype=np.int32)
+    return np.asarray(list(node_index), dtype=object), list(predicate_index), edges
+
+
+def read_monarch_kg(archive_path=MONARCH_ARCHIVE_PATH, predicates=None, categories=None, number_of_workers=None):
+    """
+    Return the nodes dataframe (id, category) of the Monarch KG, its predicates and the int32 array of the
+    distinct (subject, object, predicate) ids of its edges, filtered by edge predicate and node category.
+    Edges whose subject or object is not among the retained nodes are dropped when filtering by category.
+    """
+    number_of_workers = number_of_workers or os.cpu_count() or 1
+    nodes = edges = None
+    with ProcessPoolExecutor(
+        max_workers=number_of_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as executor:
+        for name, fileobj in _iter_member_streams(archive_path):
+            print(f"Streaming {name}")
+            if name == MONARCH_NODES_NAME:
+                frames = list(_scan(executor, fileobj, parse_node_block, categories, number_of_workers))
+                nodes = pd.concat(frames, ignore_index=True) if frames else None
+            else:
+                node_names, predicate_names, edges = _merge_edge_blocks(
+                    _scan(executor, fileobj, parse_edge_block, predicates, number_of_workers)
+                )
+    if nodes is None or edges is None:
+        raise FileNotFoundError(f"{MONARCH_NODES_NAME} and {MONARCH_EDGES_NAME} not found in {archive_path} or on disk")
+    nodes = nodes.drop_duplicates("id")
+    # As Graph.from_csv, the nodes are in the order of the node list, followed by those only in the edges.
+    positions = pd.Index(nodes["id"]).get_indexer(node_names)
+    known = positions >= 0
+    positions = np.where(known, positions, len(nodes) + np.arange(len(node_names)))
+    order = np.argsort(positions, kind="stable")
+    ranks = np.empty(len(order), dtype=np.int32)
+    ranks[order] = np.arange(len(order))
+    edges[:, :2] = ranks[edges[:, :2]]
+    node_names, known = node_names[order], known[order]
+    if categories is not None:
+        edges = edges[known[edges[:, 0]] & known[edges[:, 1]]]
+    # Only the nodes with an edge are kept, in the same order.
+    used, inverse = np.unique(edges[:, :2], return_inverse=True)
+    edges[:, :2] = inverse.reshape(-1, 2)
+    # As Graph.from_csv, nodes that only appear in the edges get the default node type.
+    categories = nodes.set_index("id")["category"].reindex(node_names[used]).fillna(DEFAULT_NODE_TYPE)
+    return categories.rename_axis("id").reset_index(), predicate_names, edges
+
+
+def load_monarch_graph(archive_path=MONARCH_ARCHIVE_PATH, predicates=None, categories=None, number_of_workers=None):
+    """
+    Return the undirected GRAPE graph of the filtered Monarch KG.
+    Nodes without edges are not included: they would be removed with the minor components anyway.
+    The edges are handed to GRAPE as a TSV of numeric ids, so that no string edge list is built.
+    """
+    from grape import Graph
+    nodes, predicate_names, edges = read_monarch_kg(archive_path, predicates, categories, number_of_workers)
+    with tempfile.TemporaryDirectory() as directory:
+        node_path = os.path.join(directory, "nodes.tsv")
+        edge_type_path = os.path.join(directory, "edge_types.tsv")
+        edge_path = os.path.join(directory, "edges.tsv")
+        # The names are written as they were read, without the quoting of to_csv.
+        with open(node_path, "w") as fh:
+            fh.write("id\tcategory\n")
+            fh.writelines(f"{node}\t{category}\n" for node, category in zip(nodes["id"], nodes["category"]))
+        with open(edge_type_path, "w") as fh:
+            fh.write("predicate\n")
+            fh.writelines(f"{predicate}\n" for predicate in predicate_names)
+        pd.DataFrame(edges, columns=["subject", "object", "predicate"]).to_csv(edge_path, sep="\t", index=False)
+        del edges
+        return Graph.from_csv(
+            directed=False,
+            node_path=node_path,
+            nodes_column="id",
+            node_list_node_types_column="category",
+            number_of_nodes=len(nodes),
+            edge_type_path=edge_type_path,
+            edge_types_column="predicate",
+            number_of_edge_types=len(predicate_names),
+            edge_path=edge_path,
+            sources_column="subject",
+            destinations_column="object",
+            edge_list_edge_types_column="predicate",
+            edge_list_numeric_node_ids=True,
+            edge_list_numeric_edge_type_ids=True,
+            name="kg-monarch-2022-12-11",
+        )
@@ -0,0 +1,187 @@
+"""
+Vectorized uniform (UNS) and degree-aware (DANS) negative edge sampling.
+
+Node pairs are drawn in large NumPy batches: uniformly for UNS, and from an alias table
+over the node degrees for DANS (the equivalent of GRAPE's use_scale_free_distribution=True).
+Candidate pairs that are self-loops, positive edges or already sampled are rejected against
+the sorted array of packed int64 edge keys (source * number_of_nodes + destination), which the
+CSR layout of a PreparedGraph provides already sorted. Sources and destinations can be
+restricted to sets of nodes, e.g. drug -> protein or phenotype -> disease pairs.
+Sampling is deterministic for a given random state.
+"""
+import numpy as np
+
+DEFAULT_BATCH_SIZE = 2**20
+# Consecutive batches without any new pair after which the negative pairs are considered exhausted.
+MAX_STALLED_BATCHES = 8
+
+
+def build_alias_table(weights):
+    """
+    Return the (probabilities, aliases) alias table of the discrete distribution proportional to weights.
+    Vose's construction is sequential, but only needs to be done once per graph.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    number_of_elements = len(weights)
+    probabilities = weights * number_of_elements / weights.sum()
+    aliases = np.arange(number_of_elements, dtype=np.int64)
+    small = np.flatnonzero(probabilities < 1.0).tolist()
+    large = np.flatnonzero(probabilities >= 1.0).tolist()
+    while small and large:
+        less = small.pop()
+        more = large[-1]
+        aliases[less] = more
+        probabilities[more] -= 1.0 - probabilities[less]
+        if probabilities[more] < 1.0:
+            small.append(large.pop())
+    # Whatever remains is 1 up to rounding errors.
+    probabilities[small + large] = 1.0
+    return probabilities, aliases
+
+
+def sample_from_alias_table(probabilities, aliases, size, random_state):
+    """
+    Draw size indices from the alias table using the given NumPy random generator.
+    """
+    indices = random_state.integers(0, len(probabilities), size=size)
+    use_alias = random_state.random(size) >= probabilities[indices]
+    indices[use_alias] = aliases[indices[use_alias]]
+    return indices
+
+
+def get_edge_keys(offsets, destinations, number_of_nodes):
+    """
+    Return the packed int64 keys of the edges of a CSR, sorted since the CSR is sorted by source and destination.
+    """
+    sources = np.repeat(np.arange(number_of_nodes, dtype=np.int64), np.diff(offsets).astype(np.int64))
+    return sources * number_of_nodes + np.asarray(destinations, dtype=np.int64)
+
+
+class NegativeSampler:
+    """
+    Sampler of node pairs that are not edges of the graph.
+
+    Parameters
+    ----------
+    offsets, destinations:
+        CSR of the graph whose edges must be avoided. Node degrees are taken from it.
+    use_scale_free_distribution:
+        Whether to sample the nodes proportionally to their degree (DANS) rather than uniformly (UNS).
+    directed:
+        Whether (u, v) and (v, u) are distinct pairs. For undirected graphs pairs are returned with u < v,
+        also when the nodes are restricted: the lower id of a pair then comes first whichever set it was drawn from.
+    source_node_ids, destination_node_ids:
+        Optional arrays of the node ids that can be sampled as sources and destinations.
+    edge_keys:
+        Optional sorted packed keys of the edges to avoid, by default the edges of the CSR.
+    """
+
+    def __init__(
+        self,
+        offsets,
+        destinations,
+        use_scale_free_distribution=False,
+        directed=False,
+        source_node_ids=None,
+        destination_node_ids=None,
+        edge_keys=None,
+    ):
+        self.number_of_nodes = len(offsets) - 1
+        self.directed = directed
+        self.use_scale_free_distribution = use_scale_free_distribution
+        self.edge_keys = get_edge_keys(offsets, destinations, self.number_of_nodes) if edge_keys is None else edge_keys
+        degrees = np.diff(offsets).astype(np.float64)
+        self.source_node_ids = None if source_node_ids is None else np.asarray(source_node_ids, dtype=np.int64)
+        self.destination_node_ids = None if destination_node_ids is None else np.asarray(destination_node_ids, dtype=np.int64)
+        self._source_alias = self._get_alias_table(degrees, self.source_node_ids)
+        self._destination_alias = self._get_alias_table(degrees, self.destination_node_ids)
+
+    @classmethod
+    def from_prepared_graph(cls, prepared_graph, **kwargs):
+        return cls(
+            prepared_graph.offsets,
+            prepared_graph.destinations,
+            directed=prepared_graph.is_directed(),
+            **kwargs
+        )
+
+    def _get_alias_table(self, degrees, node_ids):
+        if not self.use_scale_free_distribution:
+            return None
+        weights = degrees if node_ids is None else degrees[node_ids]
+        return build_alias_table(weights)
+
+    def _sample_nodes(self, alias_table, node_ids, size, random_state):
+        if alias_table is not None:
+            indices = sample_from_alias_table(*alias_table, size, random_state)
+        else:
+            upper = self.number_of_nodes if node_ids is None else len(node_ids)
+            indices = random_state.integers(0, upper, size=size)
+        return indices if node_ids is None else node_ids[indices]
+
+    def _sample_candidate_keys(self, size, random_state):
+        sources = self._sample_nodes(self._source_alias, self.source_node_ids, size, random_state)
+        destinations = self._sample_nodes(self._destination_alias, self.destination_node_ids, size, random_state)
+        keep = sources != destinations
+        sources, destinations = sources[keep], destinations[keep]
+        if not self.directed:
+            sources, destinations = np.minimum(sources, destinations), np.maximum(sources, destinations)
+        keys = sources * self.number_of_nodes + destinations
+        # For undirected graphs both directions are stored in the CSR, so one lookup suffices.
+        positions = np.searchsorted(self.edge_keys, keys)
+        positions[positions == len(self.edge_keys)] = 0
+        is_edge = self.edge_keys[positions] == keys if len(self.edge_keys) > 0 else np.zeros(len(keys), dtype=bool)
+        return keys[~is_edge]
+
+    def iter_batches(self, number_of_negative_samples, random_state=42, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Yield arrays of (source, destination) negative pairs, in batches, until number_of_negative_samples are drawn.
+        Pairs are distinct within a batch; distinctness across batches is not tracked, so that
+        memory stays constant when streaming millions of pairs.
+        """
+        random_state = np.random.default_rng(random_state)
+        remaining = number_of_negative_samples
+        stalled_batches = 0
+        while remaining > 0:
+            size = min(batch_size, remaining)
+            keys = np.unique(self._sample_candidate_keys(int(size * 1.1) + 16, random_state))
+            stalled_batches = stalled_batches + 1 if len(keys) == 0 else 0
+            if stalled_batches == MAX_STALLED_BATCHES:
+                raise ValueError("No negative pair can be sampled: every candidate pair is an edge or a self-loop")
+            # np.unique sorts the keys: we shuffle before truncating to avoid biasing towards low node ids.
+            keys = random_state.permutation(keys)[:size]
+            remaining -= len(keys)
+            yield np.stack(np.divmod(keys, self.number_of_nodes), axis=1)
+
+    def sample(self, number_of_negative_samples, random_state=42, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Return a (number_of_negative_samples, 2) array of distinct negative (source, destination) pairs.
+        Raises ValueError when the graph has fewer distinct negative pairs than requested (dense or small
+        restricted graphs), i.e. when MAX_STALLED_BATCHES consecutive batches add no new pair.
+        """
+        random_state = np.random.default_rng(random_state)
+        keys = np.empty(0, dtype=np.int64)
+        stalled_batches = 0
+        while len(keys) < number_of_negative_samples:
+            missing = number_of_negative_samples - len(keys)
+            size = min(batch_size, int(missing * 1.1) + 16)
+            number_of_keys = len(keys)
+            keys = np.union1d(keys, self._sample_candidate_keys(size, random_state))
+            stalled_batches = stalled_batches + 1 if len(keys) == number_of_keys else 0
+            if stalled_batches == MAX_STALLED_BATCHES:
+                raise ValueError(
+                    f"Requested {number_of_negative_samples} negative pairs, but only {len(keys)} distinct "
+                    f"negative pairs could be sampled"
+                )
+        keys = random_state.permutation(keys)[:number_of_negative_samples]
+        return np.stack(np.divmod(keys, self.number_of_nodes), axis=1)
+
+
+def get_node_ids_from_node_type_names(prepared_graph, node_type_names):
+    """
+    Return the ids of the nodes of a PreparedGraph having any of the given node types.
+    """
+    node_type_ids = [prepared_graph.get_node_type_names().index(name) for name in node_type_names]
+    counts = np.diff(prepared_graph.node_type_offsets).astype(np.int64)
+    owners = np.repeat(np.arange(prepared_graph.get_number_of_nodes()), counts)
+    return np.unique(owners[np.isin(prepared_graph.node_type_ids, node_type_ids)])
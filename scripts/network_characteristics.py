@@ -0,0 +1,359 @@
+"""
+Network characteristics of the prepared graphs, exact or approximate.
+
+get_network_characteristics in SliNetwork.ipynb computes the exact diameter, clustering
+coefficient, number of triangles and transitivity of the largest component, which is fine for
+SLI but impractical for the Monarch KG. Here every characteristic is computed on the CSR of the
+largest component. In the approximate mode, which is the default:
+
+- the diameter is bounded by BFS from a sample of nodes and then from the farthest node reached by
+  each of them (double sweep): the largest eccentricity found is a lower bound and twice the
+  smallest one is an upper bound;
+- the transitivity, number of triangles and average clustering coefficient are estimated by
+  wedge sampling (Seshadhri, Pinar and Kolda, 2013): the fraction of closed wedges among wedges
+  drawn proportionally to the wedges of their centre estimates the transitivity, and one wedge per
+  uniformly drawn node estimates the clustering coefficient, with binomial confidence intervals.
+
+In the exact mode, the BFS start from every node and the triangles are counted by intersecting the
+neighbourhoods of the endpoints of every edge. BFS and wedge batches run on a thread pool, and the
+characteristics are cached in experiments/network_characteristics, keyed by the fingerprint of the
+graph and the parameters. Graphs are treated as undirected, as all the prepared graphs are.
+The transitivity (3 x triangles / wedges) and the average clustering coefficient (over all the
+nodes) follow the usual definitions, as in networkx, rather than those of GRAPE's get_transitivity
+and get_clustering_coefficient: they are computed on the simple graph, without the parallel edges
+of multigraphs such as Monarch and the STRING composite nor self-loops, which would otherwise
+count the same neighbour twice in a wedge. Tendrils are not computed.
+
+Usage:
+
+    python network_characteristics.py [--exact] [--output network_characteristics.csv] sli string kg_idg monarch
+"""
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from edge_features import EdgeFeatureEngine, get_csr_from_grape
+from negative_sampling import build_alias_table, get_edge_keys, sample_from_alias_table
+
+NETWORK_CHARACTERISTICS_DIRECTORY = os.path.join(
+    os.environ.get("EXPERIMENTS_DIR", "./experiments"), "network_characteristics"
+)
+
+# Part of the cache key, to be bumped when the characteristics of a given graph change.
+NETWORK_CHARACTERISTICS_VERSION = 2
+DEFAULT_NUMBER_OF_BFS_SOURCES = 16
+DEFAULT_NUMBER_OF_WEDGES = 2**18
+# Wedges drawn by every task of the thread pool; each batch has its own random generator,
+# so that the estimates do not depend on the number of threads.
+WEDGE_BATCH_SIZE = 2**15
+# Normal quantile of the 95% confidence intervals.
+CONFIDENCE_Z = 1.96
+
+
+def get_largest_component(offsets, destinations):
+    """
+    Return the connected components summary (number, smallest and largest size) and the CSR of the largest component.
+    """
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import connected_components
+    number_of_nodes = len(offsets) - 1
+    adjacency = csr_matrix(
+        (np.ones(len(destinations), dtype=np.int8), np.asarray(destinations), np.asarray(offsets, dtype=np.int64)),
+        shape=(number_of_nodes, number_of_nodes),
+    )
+    number_of_components, labels = connected_components(adjacency, directed=False)
+    sizes = np.bincount(labels)
+    keep = labels == np.argmax(sizes)
+    # Renumbering the kept nodes in order keeps the CSR sorted.
+    new_node_ids = np.cumsum(keep) - 1
+    degrees = np.diff(offsets).astype(np.int64)
+    kept_edges = np.repeat(keep, degrees)
+    component_offsets = np.zeros(int(keep.sum()) + 1, dtype=np.int64)
+    np.cumsum(degrees[keep], out=component_offsets[1:])
+    component_destinations = new_node_ids[np.asarray(destinations)[kept_edges]]
+    summary = dict(
+        connected_components=int(number_of_components),
+        smallest_component_size=int(sizes.min()),
+        largest_component_size=int(sizes.max()),
+    )
+    return summary, component_offsets, component_destinations
+
+
+def get_eccentricity(offsets, destinations, source):
+    """
+    Return the eccentricity of source, by a level-synchronous BFS, and the last node reached.
+    """
+    visited = np.zeros(len(offsets) - 1, dtype=bool)
+    visited[source] = True
+    frontier = np.array([source], dtype=np.int64)
+    eccentricity = 0
+    while True:
+        lengths = offsets[frontier + 1] - offsets[frontier]
+        starts = np.repeat(offsets[frontier] - np.cumsum(lengths) + lengths, lengths)
+        neighbours = destinations[starts + np.arange(len(starts))]
+        reached = np.zeros(len(visited), dtype=bool)
+        reached[neighbours] = True
+        # Marking a boolean mask is much cheaper than np.unique on the large frontiers of hub-heavy graphs.
+        reached &= ~visited
+        if not reached.any():
+            return eccentricity, int(frontier[0])
+        visited |= reached
+        frontier = np.flatnonzero(reached)
+        eccentricity += 1
+
+
+def estimate_diameter(offsets, destinations, number_of_sources, random_state, executor):
+    """
+    Return the (lower bound, upper bound) of the diameter of a connected graph by double-sweep BFS.
+    The bounds are equal, i.e. the diameter is exact, when number_of_sources is at least the number of nodes.
+    """
+    number_of_nodes = len(offsets) - 1
+    if number_of_sources >= number_of_nodes:
+        eccentricities = [eccentricity for eccentricity, _ in executor.map(
+            lambda source: get_eccentricity(offsets, destinations, source), range(number_of_nodes)
+        )]
+        return max(eccentricities), max(eccentricities)
+    sources = np.random.default_rng(random_state).choice(number_of_nodes, size=number_of_sources, replace=False)
+    sweeps = list(executor.map(lambda source: get_eccentricity(offsets, destinations, source), sources))
+    farthest = {node for _, node in sweeps} - set(sources.tolist())
+    sweeps += list(executor.map(lambda source: get_eccentricity(offsets, destinations, source), farthest))
+    eccentricities = [eccentricity for eccentricity, _ in sweeps]
+    # ecc(v) <= diameter <= 2 ecc(v) for every node v of a connected undirected graph.
+    return max(eccentricities), min(2 * min(eccentricities), number_of_nodes - 1)
+
+
+def get_simple_csr(offsets, destinations):
+    """
+    Return the CSR without parallel edges and self-loops. As the CSR is sorted by source and destination,
+    the parallel edges are consecutive, and keeping the first of each run deduplicates every neighbourhood.
+    """
+    number_of_nodes = len(offsets) - 1
+    sources = np.repeat(np.arange(number_of_nodes, dtype=np.int64), np.diff(offsets))
+    keep = sources != destinations
+    keep[1:] &= (sources[1:] != sources[:-1]) | (destinations[1:] != destinations[:-1])
+    simple_offsets = np.zeros(number_of_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources[keep], minlength=number_of_nodes), out=simple_offsets[1:])
+    return simple_offsets, destinations[keep]
+
+
+def _get_binomial_interval(successes, trials):
+    """
+    Return the estimate and the normal approximation confidence interval of a proportion.
+    """
+    if trials == 0:
+        return 0.0, 0.0, 0.0
+    estimate = successes / trials
+    margin = CONFIDENCE_Z * np.sqrt(estimate * (1.0 - estimate) / trials)
+    return estimate, max(0.0, estimate - margin), min(1.0, estimate + margin)
+
+
+def _count_closed_wedges(offsets, destinations, edge_keys, centres, random_state):
+    """
+    Return how many wedges, one per centre (of degree at least two), are closed by an edge.
+    """
+    degrees = offsets[centres + 1] - offsets[centres]
+    first = random_state.integers(0, degrees)
+    second = random_state.integers(0, degrees - 1)
+    second += second >= first
+    number_of_nodes = len(offsets) - 1
+    keys = destinations[offsets[centres] + first] * number_of_nodes + destinations[offsets[centres] + second]
+    positions = np.minimum(np.searchsorted(edge_keys, keys), len(edge_keys) - 1)
+    return int(np.count_nonzero(edge_keys[positions] == keys))
+
+
+def estimate_triangles(offsets, destinations, number_of_wedges, random_state, executor):
+    """
+    Return the (estimate, lower, upper) of the transitivity, number of triangles and average clustering coefficient
+    of the graph with the given simple CSR (see get_simple_csr).
+    """
+    number_of_nodes = len(offsets) - 1
+    degrees = np.diff(offsets)
+    wedges = degrees * (degrees - 1) / 2
+    total_wedges = wedges.sum()
+    if total_wedges == 0:
+        return dict(transitivity=(0.0, 0.0, 0.0), triangles=(0.0, 0.0, 0.0), clustering_coefficient=(0.0, 0.0, 0.0))
+    edge_keys = get_edge_keys(offsets, destinations, number_of_nodes)
+    probabilities, aliases = build_alias_table(wedges)
+    batch_sizes = [min(WEDGE_BATCH_SIZE, number_of_wedges - start) for start in range(0, number_of_wedges, WEDGE_BATCH_SIZE)]
+    seeds = np.random.SeedSequence(random_state).spawn(len(batch_sizes))
+
+    def count_batch(batch_size, seed):
+        random_state = np.random.default_rng(seed)
+        # Transitivity: centres drawn proportionally to their number of wedges.
+        centres = sample_from_alias_table(probabilities, aliases, batch_size, random_state)
+        closed = _count_closed_wedges(offsets, destinations, edge_keys, centres, random_state)
+        # Clustering coefficient: uniform nodes, those with fewer than two neighbours have a coefficient of 0.
+        nodes = random_state.integers(0, number_of_nodes, size=batch_size)
+        nodes = nodes[degrees[nodes] >= 2]
+        closed_at_nodes = _count_closed_wedges(offsets, destinations, edge_keys, nodes, random_state)
+        return closed, closed_at_nodes
+
+    counts = np.array(list(executor.map(count_batch, batch_sizes, seeds)))
+    transitivity = _get_binomial_interval(counts[:, 0].sum(), number_of_wedges)
+    return dict(
+        transitivity=transitivity,
+        # Every triangle closes three wedges.
+        triangles=tuple(value * total_wedges / 3 for value in transitivity),
+        clustering_coefficient=_get_binomial_interval(counts[:, 1].sum(), number_of_wedges),
+    )
+
+
+def count_triangles(offsets, destinations, executor):
+    """
+    Return the exact transitivity, number of triangles and average clustering coefficient, as (value, value, value),
+    of the graph with the given simple CSR (see get_simple_csr).
+    The shared neighbours of the endpoints of every edge close a triangle, which is credited to that neighbour.
+    """
+    number_of_nodes = len(offsets) - 1
+    engine = EdgeFeatureEngine(offsets, destinations)
+    sources = np.repeat(np.arange(number_of_nodes, dtype=np.int64), engine.degrees)
+    edges = np.stack([sources, engine.destinations], axis=1)
+    edges = edges[edges[:, 0] < edges[:, 1]]
+    batches = [edges[start:start + engine.batch_size] for start in range(0, len(edges), engine.batch_size)]
+    node_triangles = np.zeros(number_of_nodes, dtype=np.int64)
+    for batch_triangles in executor.map(
+        lambda batch: np.bincount(engine.get_shared_neighbours(batch[:, 0], batch[:, 1])[1], minlength=number_of_nodes),
+        batches,
+    ):
+        node_triangles += batch_triangles
+    wedges = engine.degrees * (engine.degrees - 1) / 2
+    triangles = node_triangles.sum() / 3
+    transitivity = 3 * triangles / wedges.sum() if wedges.sum() > 0 else 0.0
+    clustering_coefficient = np.divide(
+        node_triangles, wedges, out=np.zeros(number_of_nodes), where=wedges > 0
+    ).mean()
+    return dict(
+        transitivity=(transitivity,) * 3,
+        triangles=(triangles,) * 3,
+        clustering_coefficient=(clustering_coefficient,) * 3,
+    )
+
+
+def get_network_characteristics(
+    offsets,
+    destinations,
+    approximate=True,
+    number_of_bfs_sources=DEFAULT_NUMBER_OF_BFS_SOURCES,
+    number_of_wedges=DEFAULT_NUMBER_OF_WEDGES,
+    random_state=42,
+    number_of_threads=None,
+):
+    """
+    Return the characteristics of the undirected graph with the given CSR, those of SliNetwork.ipynb but the tendrils.
+    Estimated characteristics come with the bounds of their 95% confidence interval (or of the diameter),
+    which are equal to the value in the exact mode. Edges are counted once per undirected edge.
+    """
+    number_of_threads = number_of_threads or int(os.environ.get("OMP_NUM_THREADS", os.cpu_count() or 1))
+    offsets = np.asarray(offsets, dtype=np.int64)
+    destinations = np.asarray(destinations, dtype=np.int64)
+    number_of_nodes_entire_graph = len(offsets) - 1
+    number_of_directed_edges = len(destinations)
+    self_loops_entire_graph = int(np.count_nonzero(
+        np.repeat(np.arange(number_of_nodes_entire_graph, dtype=np.int64), np.diff(offsets)) == destinations
+    ))
+    characteristics, offsets, destinations = get_largest_component(offsets, destinations)
+    number_of_nodes = len(offsets) - 1
+    degrees = np.diff(offsets)
+    sources = np.repeat(np.arange(number_of_nodes, dtype=np.int64), degrees)
+    self_loops = int(np.count_nonzero(sources == destinations))
+    values, counts = np.unique(degrees, return_counts=True)
+    simple_offsets, simple_destinations = get_simple_csr(offsets, destinations)
+    with ThreadPoolExecutor(max_workers=number_of_threads) as executor:
+        if approximate:
+            diameter = estimate_diameter(offsets, destinations, number_of_bfs_sources, random_state, executor)
+            triangles = estimate_triangles(
+                simple_offsets, simple_destinations, number_of_wedges, random_state, executor
+            )
+        else:
+            diameter = estimate_diameter(offsets, destinations, number_of_nodes, random_state, executor)
+            triangles = count_triangles(simple_offsets, simple_destinations, executor)
+    characteristics.update(
+        n_nodes_entire_graph=number_of_nodes_entire_graph,
+        n_edges_entire_graph=(number_of_directed_edges + self_loops_entire_graph) // 2,
+        n_nodes=number_of_nodes,
+        n_edges=(len(destinations) + self_loops) // 2,
+        diameter_lower_bound=int(diameter[0]),
+        diameter_upper_bound=int(diameter[1]),
+        density=len(destinations) / (number_of_nodes * (number_of_nodes - 1)) if number_of_nodes > 1 else 0.0,
+        node_degree_mean=float(degrees.mean()),
+        node_degree_median=float(np.median(degrees)),
+        node_degree_mode=int(values[np.argmax(counts)]),
+        self_loops=self_loops,
+        approximate=approximate,
+    )
+    for name, (value, lower, upper) in triangles.items():
+        characteristics.update({
+            name: float(value),
+            f"{name}_lower_bound": float(lower),
+            f"{name}_upper_bound": float(upper),
+        })
+    return characteristics
+
+
+def get_network_characteristics_path(name, fingerprint, parameters):
+    digest = hashlib.sha256(
+        json.dumps([NETWORK_CHARACTERISTICS_VERSION, parameters], sort_keys=True).encode("utf8")
+    ).hexdigest()[:8]
+    return os.path.join(NETWORK_CHARACTERISTICS_DIRECTORY, f"{name}-{fingerprint}-{digest}.json")
+
+
+def load_network_characteristics(graph, **parameters):
+    """
+    Return the characteristics of a PreparedGraph or of a GRAPE graph, computing and caching them on first use.
+    Prepared graphs are keyed by their input fingerprint, GRAPE graphs by their hash.
+    The parameters are those of get_network_characteristics.
+    """
+    if hasattr(graph, "fingerprint"):
+        name, fingerprint = graph.name, graph.fingerprint
+    else:
+        name, fingerprint = graph.get_name(), graph.hash()
+    cached_parameters = {
+        key: value for key, value in parameters.items() if key != "number_of_threads"
+    }
+    path = get_network_characteristics_path(name, fingerprint, cached_parameters)
+    if os.path.exists(path):
+        with open(path) as fh:
+            return json.load(fh)
+    if hasattr(graph, "fingerprint"):
+        offsets, destinations = graph.offsets, graph.destinations
+    else:
+        offsets, destinations = get_csr_from_grape(graph)
+    characteristics = dict(name=name, **get_network_characteristics(offsets, destinations, **parameters))
+    os.makedirs(NETWORK_CHARACTERISTICS_DIRECTORY, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as fh:
+        json.dump(characteristics, fh, indent=2)
+    os.replace(tmp_path, path)
+    return characteristics
+
+
+def get_network_characteristics_table(graphs, **parameters):
+    """
+    Return the table of SliNetwork.ipynb: one row per characteristic and one column per graph of the {column: graph} dict.
+    """
+    return pd.DataFrame({
+        column: load_network_characteristics(graph, **parameters)
+        for column, graph in graphs.items()
+    })
+
+
+if __name__ == "__main__":
+    from graph_preparation import TASKS
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("datasets", nargs="+", choices=list(TASKS))
+    parser.add_argument("--exact", action="store_true", help="Compute the exact diameter and triangles")
+    parser.add_argument("--output", default=None, help="Path of the CSV table, printed if not given")
+    arguments = parser.parse_args()
+    table = get_network_characteristics_table(
+        {dataset: TASKS[dataset][0]() for dataset in arguments.datasets},
+        approximate=not arguments.exact,
+    )
+    if arguments.output:
+        table.to_csv(arguments.output)
+    else:
+        print(table.to_string())
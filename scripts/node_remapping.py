@@ -0,0 +1,104 @@
+"""
+Columnar remapping of node identifiers, e.g. STRING ENSP ids or SLDB CURIEs to gene symbols.
+
+Building a Python dict(zip(...)) over the full node table is the dominant startup cost for
+large tables. Instead, we read only the two columns we need, compile them once into a sorted
+byte-string index stored next to the prepared graphs, and look up all node names of a graph
+at once with np.searchsorted. Only the (small) dictionary restricted to the graph's own nodes
+is handed to GRAPE's remap_from_node_names_map.
+"""
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from graph_preparation import PREPARED_GRAPHS_DIRECTORY
+from instrumentation import get_tracer
+
+MAPPINGS_DIRECTORY = os.path.join(PREPARED_GRAPHS_DIRECTORY, "mappings")
+
+
+def _get_mapping_path(path, key_column, value_column):
+    stat = os.stat(path)
+    digest = hashlib.sha256(json.dumps([
+        os.path.abspath(path), stat.st_size, stat.st_mtime_ns, key_column, value_column
+    ]).encode("utf8")).hexdigest()[:16]
+    return os.path.join(MAPPINGS_DIRECTORY, f"{os.path.basename(path)}-{digest}")
+
+
+def compile_node_name_mapping(path, key_column, value_column):
+    """
+    Read the key and value columns (by position) of a TSV into sorted byte-string arrays.
+    As with dict(zip(...)), the last occurrence of a duplicated key wins.
+    """
+    data = pd.read_csv(
+        path,
+        sep="\t",
+        usecols=[key_column, value_column],
+        dtype=str,
+        keep_default_na=False,
+    )
+    # usecols keeps the columns in file order.
+    columns = sorted([key_column, value_column])
+    keys = data.iloc[:, columns.index(key_column)].str.encode("utf8").to_numpy().astype(bytes)
+    values = data.iloc[:, columns.index(value_column)].str.encode("utf8").to_numpy().astype(bytes)
+    del data
+    unique_keys, last_positions = np.unique(keys[::-1], return_index=True)
+    return unique_keys, values[len(keys) - 1 - last_positions]
+
+
+def load_node_name_mapping(path, key_column=0, value_column=1):
+    """
+    Return the (keys, values) mapping arrays of a node table, memory-mapped from the compiled cache.
+    """
+    mapping_path = _get_mapping_path(path, key_column, value_column)
+    if not os.path.exists(mapping_path):
+        keys, values = compile_node_name_mapping(path, key_column, value_column)
+        tmp_path = f"{mapping_path}.{os.getpid()}.tmp"
+        os.makedirs(tmp_path, exist_ok=True)
+        np.save(os.path.join(tmp_path, "keys.npy"), keys)
+        np.save(os.path.join(tmp_path, "values.npy"), values)
+        try:
+            os.rename(tmp_path, mapping_path)
+        except OSError:
+            # Another job compiled the same mapping in the meantime.
+            shutil.rmtree(tmp_path, ignore_errors=True)
+    return (
+        np.load(os.path.join(mapping_path, "keys.npy"), mmap_mode="r"),
+        np.load(os.path.join(mapping_path, "values.npy"), mmap_mode="r"),
+    )
+
+
+def remap_node_names(node_names, keys, values):
+    """
+    Vectorized lookup of node_names in the sorted mapping.
+    Returns the remapped names (unmapped names are kept as they are) and the boolean mask of mapped names.
+    """
+    node_names = np.asarray(node_names, dtype=str)
+    encoded = np.char.encode(node_names, "utf8")
+    positions = np.searchsorted(keys, encoded)
+    positions[positions == len(keys)] = 0
+    mapped = keys[positions] == encoded if len(keys) > 0 else np.zeros(len(encoded), dtype=bool)
+    remapped = node_names.astype(object)
+    remapped[mapped] = np.char.decode(values[positions[mapped]], "utf8")
+    return remapped, mapped
+
+
+def get_node_names_remapping(graph, path, key_column=0, value_column=1):
+    """
+    Return the node names map for graph.remap_from_node_names_map, built from the columns of the TSV at path.
+    Nodes without a mapping keep their name and are reported.
+    """
+    with get_tracer().stage("remapping", path=path):
+        keys, values = load_node_name_mapping(path, key_column=key_column, value_column=value_column)
+        node_names = graph.get_node_names()
+        remapped, mapped = remap_node_names(node_names, keys, values)
+    number_of_unmapped = int((~mapped).sum())
+    if number_of_unmapped > 0:
+        examples = ", ".join(np.asarray(node_names, dtype=str)[~mapped][:5])
+        print(f"{number_of_unmapped} of {len(node_names)} nodes of {graph.get_name()} "
+              f"have no mapping in {os.path.basename(path)} (e.g. {examples}); keeping their names")
+    return dict(zip(node_names, remapped.tolist()))
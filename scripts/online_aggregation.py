@@ -0,0 +1,95 @@
+"""
+Online aggregation of the results of a grid while it runs.
+
+get_mean_and_sd summarizes the results only once the whole grid has finished. The aggregator
+keeps, for every methods x mode x evaluation x model_neg_sampling group and every summary metric,
+the count, mean and sum of squared deviations of the values seen so far (Welford's algorithm,
+merging each batch of results with Chan's update). The grid workers feed it the results of every
+holdout of a cell as soon as it is evaluated and save its state in a small JSON file next to the
+cells, which can be queried at any time to get the table of get_mean_and_sd (the shape of
+sli_stats.csv) for the holdouts done so far:
+
+    python online_aggregation.py experiments/grids/sli/aggregate.json [sli_stats_partial.csv]
+"""
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from results_analysis import (GROUP_COLUMNS, SUMMARY_METRICS, extract_core_results, get_summary_columns,
+                              get_summary_frame)
+
+
+class OnlineAggregator:
+    """
+    Running mean and variance of the summary metrics per group, and the names of the parts already counted.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.parts = set()
+        # Group key (joined with tabs) -> metric -> [count, mean, M2].
+        self.groups = {}
+        if os.path.exists(path):
+            with open(path) as fh:
+                state = json.load(fh)
+            self.parts = set(state["parts"])
+            self.groups = state["groups"]
+
+    def update(self, part_name, results):
+        """
+        Add the raw results of a part (e.g. a holdout of a grid cell) unless it was already counted.
+        """
+        if part_name in self.parts:
+            return
+        df = get_summary_frame(extract_core_results(results))
+        for key, group in df.groupby(GROUP_COLUMNS):
+            statistics = self.groups.setdefault("\t".join(key), {})
+            for metric in SUMMARY_METRICS:
+                values = group[metric].dropna().to_numpy(dtype=np.float64)
+                if len(values) == 0:
+                    continue
+                count, mean, m2 = statistics.get(metric, (0, 0.0, 0.0))
+                batch_mean = values.mean()
+                batch_m2 = ((values - batch_mean) ** 2).sum()
+                total = count + len(values)
+                delta = batch_mean - mean
+                statistics[metric] = [
+                    total,
+                    mean + delta * len(values) / total,
+                    m2 + batch_m2 + delta ** 2 * count * len(values) / total,
+                ]
+        self.parts.add(part_name)
+
+    def save(self):
+        """
+        Write the state, under a temporary name and renaming it, so that readers never see a partial file.
+        """
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as fh:
+            json.dump(dict(parts=sorted(self.parts), groups=self.groups), fh)
+        os.replace(tmp_path, self.path)
+
+    def get_mean_and_sd(self):
+        """
+        Return the table of get_mean_and_sd for the results counted so far.
+        """
+        rows = []
+        for key, statistics in sorted(self.groups.items()):
+            row = key.split("\t")
+            for metric in SUMMARY_METRICS:
+                count, mean, m2 = statistics.get(metric, (0, np.nan, np.nan))
+                # As pandas, the standard deviation uses one degree of freedom.
+                row.extend([mean if count > 0 else np.nan, np.sqrt(m2 / (count - 1)) if count > 1 else np.nan])
+            rows.append(row + [f"{row[2]} ({row[1]})"])
+        return pd.DataFrame(rows, columns=get_summary_columns())
+
+
+if __name__ == "__main__":
+    stats = OnlineAggregator(sys.argv[1]).get_mean_and_sd()
+    if len(sys.argv) > 2:
+        stats.to_csv(sys.argv[2])
+    else:
+        print(stats.to_string(index=False))
@@ -0,0 +1,294 @@
+"""
+Content-addressed cache of the edge prediction results rows, shared by all the scripts and grids.
+
+GRAPE's enable_cache is keyed by the whole evaluate call, so adding an embedder, a train size or
+an unbalance rate to a study recomputes everything. Here the results are cached per evaluation
+unit: one model (name, library and parameters) with one node features method (an embedder and its
+parameters), on one holdout of one graph (content hash of the graph and of the subgraph of
+interest, holdout parameters and random state), for one validation sampling mode and unbalance
+rate. evaluate_with_result_cache looks up every unit of an evaluation, runs GRAPE's evaluate (through
+the holdout store) only on the holdouts, models and unbalance rates with missing units, stores the
+rows of the new units and returns the rows of all the units, in the order GRAPE returns them.
+
+Entries are pickled DataFrames in experiments/result_cache, named after the SHA-256 of their key.
+A hit refreshes the modification time of the entry, and once the cache exceeds its size bound the
+least recently used entries are evicted.
+
+Usage, to report the size of the cache or evict entries down to a size:
+
+    python result_cache.py [--max-size-gb 10]
+"""
+import argparse
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from holdout_store import with_holdout_store
+
+RESULT_CACHE_DIRECTORY = os.path.join(os.environ.get("EXPERIMENTS_DIR", "./experiments"), "result_cache")
+DEFAULT_MAX_SIZE_GB = 10.0
+# Bumped when a change of the pipeline invalidates the cached rows.
+CACHE_VERSION = 1
+# Arguments of evaluate that do not change the results rows of a unit.
+IGNORED_EVALUATE_ARGUMENTS = ("enable_cache", "enable_top_layer_cache", "number_of_holdouts", "verbose")
+
+
+def _get_parameters(model):
+    return {key: value for key, value in model.parameters().items() if key != "verbose"}
+
+
+def get_node_features_key(node_features):
+    """
+    Return the key of the node features of an evaluation: the name, library and parameters of an embedder,
+    the name of a GRAPE embedding method, or None. Other node features (matrices) cannot be cached.
+    """
+    if node_features is None or isinstance(node_features, str):
+        return node_features
+    if hasattr(node_features, "parameters"):
+        return [node_features.model_name(), node_features.library_name(), _get_parameters(node_features)]
+    raise ValueError(f"Node features of type {type(node_features)} cannot be keyed in the result cache")
+
+
+def get_unit_key(graph, model, holdout_number, use_scale_free_distribution, unbalance_rate,
+                 node_features=None, subgraph_of_interest=None, key_parameters=None, **evaluate_kwargs):
+    """
+    Return the key of the results rows of a model on a holdout, for a validation sampling mode and unbalance rate.
+    """
+    evaluate_kwargs = {
+        key: value for key, value in evaluate_kwargs.items() if key not in IGNORED_EVALUATE_ARGUMENTS
+    }
+    return hashlib.sha256(json.dumps(
+        dict(
+            version=CACHE_VERSION,
+            graph=graph.hash(),
+            subgraph_of_interest=None if subgraph_of_interest is None else subgraph_of_interest.hash(),
+            model=[model.model_name(), model.library_name(), _get_parameters(model)],
+            node_features=get_node_features_key(node_features),
+            holdout_number=holdout_number,
+            use_scale_free_distribution=use_scale_free_distribution,
+            unbalance_rate=float(unbalance_rate),
+            evaluate=evaluate_kwargs,
+            parameters=key_parameters or {},
+        ),
+        sort_keys=True,
+        default=str,
+    ).encode("utf8")).hexdigest()
+
+
+def get_entry_path(key):
+    return os.path.join(RESULT_CACHE_DIRECTORY, key[:2], f"{key}.pkl")
+
+
+def load_entry(key):
+    """
+    Return the results rows stored under key, marking them as recently used, or None.
+    """
+    path = get_entry_path(key)
+    try:
+        rows = pd.read_pickle(path)
+    except (FileNotFoundError, EOFError):
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        # Evicted in the meantime, the rows are still valid.
+        pass
+    return rows
+
+
+def store_entry(key, rows):
+    """
+    Store the results rows under key, writing under a temporary name and renaming into place.
+    """
+    path = get_entry_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    rows.to_pickle(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def get_cache_entries():
+    """
+    Return the (modification time, size, path) of every entry of the cache.
+    """
+    entries = []
+    for root, _, names in os.walk(RESULT_CACHE_DIRECTORY):
+        for name in names:
+            if name.endswith(".pkl"):
+                path = os.path.join(root, name)
+                try:
+                    status = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((status.st_mtime, status.st_size, path))
+    return entries
+
+
+def evict(max_size_gb=DEFAULT_MAX_SIZE_GB):
+    """
+    Remove the least recently used entries until the cache is at most max_size_gb, returning its size in bytes.
+    """
+    entries = sorted(get_cache_entries())
+    size = sum(entry_size for _, entry_size, _ in entries)
+    max_size = max_size_gb * 1024**3
+    for _, entry_size, path in entries:
+        if size <= max_size:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        size -= entry_size
+    return size
+
+
+def split_holdout_rows(results, holdout_number, number_of_models):
+    """
+    Return the results rows of each model on the holdout.
+    GRAPE concatenates the rows of the models of a holdout in the order of the models, and the rows
+    it reads from its own cache do not keep the types of the model parameters, so the rows are split
+    by position rather than matched against the parameters.
+    """
+    rows = results[results["holdout_number"] == holdout_number]
+    rows_per_model, remainder = divmod(len(rows), number_of_models)
+    if remainder:
+        raise ValueError(f"Holdout {holdout_number} has {len(rows)} rows for {number_of_models} models")
+    return [rows.iloc[index * rows_per_model:(index + 1) * rows_per_model] for index in range(number_of_models)]
+
+
+def get_evaluation_units(models, holdout_numbers, validation_use_scale_free, validation_unbalance_rates):
+    """
+    Return the (validation sampling mode, holdout number, model index, unbalance rate) of the units of an evaluation,
+    in the order of GRAPE's results rows.
+    """
+    return [
+        (use_scale_free_distribution, holdout_number, model_index, unbalance_rate)
+        for use_scale_free_distribution in validation_use_scale_free
+        for holdout_number in holdout_numbers
+        for model_index in range(len(models))
+        for unbalance_rate in validation_unbalance_rates
+    ]
+
+
+def get_result_cache_status(graph, models, number_of_holdouts, holdout_numbers=None,
+                            validation_use_scale_free=(True, False), validation_unbalance_rates=(1.0,),
+                            node_features=None, subgraph_of_interest=None, key_parameters=None, **evaluate_kwargs):
+    """
+    Return the number of units of the evaluation that are cached and that are missing.
+    """
+    holdout_numbers = range(number_of_holdouts) if holdout_numbers is None else holdout_numbers
+    hits = sum(
+        os.path.exists(get_entry_path(get_unit_key(
+            graph, models[model_index], holdout_number, use_scale_free_distribution, unbalance_rate,
+            node_features=node_features, subgraph_of_interest=subgraph_of_interest,
+            key_parameters=key_parameters, **evaluate_kwargs
+        )))
+        for use_scale_free_distribution, holdout_number, model_index, unbalance_rate in get_evaluation_units(
+            models, holdout_numbers, validation_use_scale_free, validation_unbalance_rates
+        )
+    )
+    total = len(validation_use_scale_free) * len(holdout_numbers) * len(models) * len(validation_unbalance_rates)
+    return hits, total - hits
+
+
+def evaluate_with_result_cache(
+    model_class,
+    models,
+    graph,
+    number_of_holdouts,
+    holdout_numbers=None,
+    validation_use_scale_free=(True, False),
+    validation_unbalance_rates=(1.0,),
+    node_features=None,
+    subgraph_of_interest=None,
+    key_parameters=None,
+    enable_result_cache=True,
+    max_size_gb=DEFAULT_MAX_SIZE_GB,
+    **evaluate_kwargs
+):
+    """
+    Return the results of model_class.evaluate of the models (instances of model_class) on the holdouts
+    (all of them by default), for every validation sampling mode, computing only the units missing from the cache.
+    key_parameters are settings of the caller that change the results but are not parameters of
+    the models or node features, e.g. the dtype of the stored embeddings.
+    """
+    holdout_numbers = list(range(number_of_holdouts) if holdout_numbers is None else holdout_numbers)
+    evaluate_kwargs = dict(evaluate_kwargs, number_of_holdouts=number_of_holdouts)
+    if subgraph_of_interest is not None:
+        evaluate_kwargs["subgraph_of_interest"] = subgraph_of_interest
+
+    def evaluate(use_scale_free_distribution, holdouts, evaluated_models, unbalance_rates, enable_top_layer_cache):
+        # GRAPE requires the models to be instances of the class whose evaluate method is called.
+        EvaluatedModel = with_holdout_store(model_class, holdouts)
+        return EvaluatedModel.evaluate(
+            models=[EvaluatedModel(**model.parameters()) for model in evaluated_models],
+            graph=graph,
+            node_features=node_features,
+            use_scale_free_distribution=use_scale_free_distribution,
+            validation_unbalance_rates=unbalance_rates,
+            **dict(evaluate_kwargs, enable_top_layer_cache=enable_top_layer_cache),
+        )
+
+    if not enable_result_cache or evaluate_kwargs.get("smoke_test"):
+        # The top layer cache does not know about holdout_numbers: it would return the results of another shard.
+        enable_top_layer_cache = evaluate_kwargs.get("enable_top_layer_cache", True) and holdout_numbers == list(
+            range(number_of_holdouts)
+        )
+        return pd.concat([
+            evaluate(
+                use_scale_free_distribution,
+                None if enable_top_layer_cache else holdout_numbers,
+                models,
+                validation_unbalance_rates,
+                enable_top_layer_cache,
+            )
+            for use_scale_free_distribution in validation_use_scale_free
+        ])
+
+    key_kwargs = dict(
+        node_features=node_features, subgraph_of_interest=subgraph_of_interest, key_parameters=key_parameters,
+        **{key: value for key, value in evaluate_kwargs.items() if key != "subgraph_of_interest"}
+    )
+    units = get_evaluation_units(models, holdout_numbers, validation_use_scale_free, validation_unbalance_rates)
+    keys = {
+        unit: get_unit_key(graph, models[unit[2]], unit[1], unit[0], unit[3], **key_kwargs)
+        for unit in units
+    }
+    rows = {unit: load_entry(key) for unit, key in keys.items()}
+    for use_scale_free_distribution in validation_use_scale_free:
+        missing = [unit for unit in units if unit[0] == use_scale_free_distribution and rows[unit] is None]
+        if not missing:
+            continue
+        # The evaluation covers every missing unit; the other units it computes are stored as well.
+        missing_holdouts = sorted({holdout_number for _, holdout_number, _, _ in missing})
+        missing_models = sorted({model_index for _, _, model_index, _ in missing})
+        missing_rates = [rate for rate in validation_unbalance_rates if any(unit[3] == rate for unit in missing)]
+        results = evaluate(
+            use_scale_free_distribution,
+            missing_holdouts,
+            [models[model_index] for model_index in missing_models],
+            missing_rates,
+            False,
+        )
+        for holdout_number in missing_holdouts:
+            holdout_rows = split_holdout_rows(results, holdout_number, len(missing_models))
+            for model_index, model_rows in zip(missing_models, holdout_rows):
+                for unbalance_rate in missing_rates:
+                    unit = (use_scale_free_distribution, holdout_number, model_index, unbalance_rate)
+                    rows[unit] = model_rows[model_rows["validation_unbalance_rate"] == unbalance_rate]
+                    store_entry(keys[unit], rows[unit])
+        evict(max_size_gb)
+    return pd.concat([rows[unit] for unit in units])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-size-gb", type=float, default=None, help="Evict entries down to this size")
+    arguments = parser.parse_args()
+    if arguments.max_size_gb is not None:
+        size = evict(arguments.max_size_gb)
+    else:
+        size = sum(entry_size for _, entry_size, _ in get_cache_entries())
+    print(f"{RESULT_CACHE_DIRECTORY}: {len(get_cache_entries())} entries, {size / 1024**3:.2f} GB")
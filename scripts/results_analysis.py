@@ -0,0 +1,103 @@
+"""
+Summaries of the edge prediction results, as in the extractingResults notebook.
+
+extract_core_results and get_mean_and_sd accept both the raw results (from the TSVs written by
+the run scripts, with tuple-string columns) and the flat columns of the results store. With the
+store, read_core_results reads only the columns that the summaries need.
+
+Usage from the scripts directory:
+
+    from results_analysis import read_core_results, get_mean_and_sd
+    sli_stats = get_mean_and_sd(read_core_results("sli"))
+"""
+import pandas as pd
+
+from results_store import get_flat_column_name, read_results
+
+MODEL_SAMPLING_COLUMN = "model_parameters.use_scale_free_distribution"
+CORE_COLUMNS = ["evaluation_mode", "features_names", "evaluation_negative_sampling_method",
+                "model_negative_sampling_method", "accuracy", "balanced_accuracy",
+                "false_discovery_rate", "matthews_correlation_coefficient",
+                "precision", "recall", "specificity", "f1_score", "auroc", "auprc"]
+# Columns of the results needed to build the core columns.
+SOURCE_COLUMNS = ["evaluation_mode", "features_names", "use_scale_free_distribution", MODEL_SAMPLING_COLUMN,
+                  "accuracy", "balanced_accuracy", "false_discovery_rate", "matthews_correlation_coefficient",
+                  "precision", "recall", "specificity", "f1_score", "auroc", "auprc"]
+# We are just interested in the following seven graph/random walk methods
+GRAPH_METHODS = {'First-order LINE', 'DeepWalk SkipGram', 'Walklets CBOW', 'HOPE',
+                 'Second-order LINE', 'DeepWalk CBOW', 'Walklets SkipGram'}
+GROUP_COLUMNS = ['methods', 'mode', 'evaluation', 'model_neg_sampling']
+# Metrics summarized by get_mean_and_sd, with their short names in the output table.
+SUMMARY_METRICS = {
+    'balanced_accuracy': "balanced_acc",
+    'false_discovery_rate': "FDR",
+    'matthews_correlation_coefficient': "MCC",
+    'f1_score': "F1",
+    'auroc': "AUROC",
+    'auprc': "AUPRC",
+}
+
+
+def get_sampling_method(use_scale_free_distribution):
+    """
+    Return DANS or UNS for a value of use_scale_free_distribution, or None when it is missing (NaN or pd.NA).
+    """
+    if pd.isna(use_scale_free_distribution):
+        return None
+    return "DANS" if use_scale_free_distribution else "UNS"
+
+
+def extract_core_results(df, extra_columns=()):
+    """
+    Recode the validation and model sampling modes as DANS or UNS and return the subset of columns used for plotting,
+    plus the extra columns (e.g. holdout_number). A missing sampling mode stays missing.
+    """
+    df = df.rename(columns=get_flat_column_name)
+    df["evaluation_negative_sampling_method"] = [get_sampling_method(use_scale_free_distribution)
+        for use_scale_free_distribution in df.use_scale_free_distribution]
+    df["model_negative_sampling_method"] = [get_sampling_method(use_scale_free_distribution)
+        for use_scale_free_distribution in df[MODEL_SAMPLING_COLUMN]]
+    return df[CORE_COLUMNS + list(extra_columns)].copy()
+
+
+def read_core_results(dataset, extra_columns=()):
+    """
+    Return the core results of a dataset, reading only the needed columns of the results store.
+    """
+    return extract_core_results(
+        read_results(columns=SOURCE_COLUMNS + list(extra_columns), dataset=dataset), extra_columns=extra_columns
+    )
+
+
+def get_summary_frame(df):
+    """
+    Return the core results of the graph methods, with the concise column names of the summaries.
+    """
+    df = df[df['features_names'].isin(GRAPH_METHODS)]
+    # Rename columns for conciseness
+    return df.rename(columns={"evaluation_negative_sampling_method": "evaluation",
+                              "evaluation_mode": "mode", "features_names": "methods",
+                              "model_negative_sampling_method": "model_neg_sampling"}, errors="raise")
+
+
+def get_summary_columns():
+    """
+    Return the names of the columns of the table returned by get_mean_and_sd.
+    """
+    return GROUP_COLUMNS + [
+        f"{name}.{statistic}" for name in SUMMARY_METRICS.values() for statistic in ("mean", "std")
+    ] + ["approach"]
+
+
+def get_mean_and_sd(df):
+    """
+    df should be one of string_results or sli_results
+    """
+    df = get_summary_frame(df)
+    # Calculate mean and standard dev
+    df2 = df.groupby(GROUP_COLUMNS).agg({metric: ['mean', 'std'] for metric in SUMMARY_METRICS}).reset_index()
+    # Make a new column for convenience in planning
+    df2["approach"] = df2["evaluation"] + " (" + df2["mode"] + ")"
+    # rename column nanes for better legibility
+    df2.columns = get_summary_columns()
+    return df2
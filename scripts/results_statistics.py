@@ -0,0 +1,217 @@
+"""
+Bootstrap confidence intervals and paired permutation tests for the summaries of the results.
+
+get_mean_and_sd reports the mean and standard deviation of every methods x mode x evaluation x
+model_neg_sampling group over its holdouts. get_statistics extends that table (the shape of
+sli_stats.csv) with percentile bootstrap confidence intervals of the means and with the p-values of
+paired permutation tests between the sampling modes, e.g. DANS and UNS evaluation, on the same holdouts.
+With grids of hundreds of groups, resampling group by group with pandas is far too slow: the rows
+are sorted by group once, every batch of resamples is a single array of random row indices drawn
+within the groups, and the means of all the groups in the batch are reduced at once, metric by
+metric, with np.add.reduceat. The permutation tests draw random sign flips of the paired differences of
+all the pairs of groups at once in the same way.
+
+Usage, with a dataset of the results store or a results TSV written by the run scripts:
+
+    python results_statistics.py sli [sli_stats.csv] [--resamples 10000] [--compare evaluation]
+"""
+import argparse
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from results_analysis import (GROUP_COLUMNS, SUMMARY_METRICS, extract_core_results, get_mean_and_sd,
+                              get_summary_frame, read_core_results)
+
+DEFAULT_RESAMPLES = 10000
+DEFAULT_CONFIDENCE = 0.95
+# Column identifying the holdouts on which the sampling modes are paired.
+PAIRING_COLUMN = "holdout_number"
+# Bound of the (resamples x rows) arrays of a batch, in bytes.
+BATCH_BYTES = 2**28
+RANDOM_STATE = 42
+
+
+def _get_batch_size(number_of_rows, number_of_resamples):
+    return int(np.clip(BATCH_BYTES // (8 * max(number_of_rows, 1)), 1, number_of_resamples))
+
+
+def _get_group_means(values, present, starts):
+    """
+    Return the means of the present values of the groups starting at starts along the last axis of values.
+    """
+    sums = np.add.reduceat(values, starts, axis=-1)
+    counts = np.add.reduceat(present, starts, axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts
+
+
+def get_group_starts(codes):
+    """
+    Return the order sorting the rows by group code and the start and size of every group in that order.
+    """
+    order = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes)
+    starts = np.zeros(len(counts), dtype=np.int64)
+    np.cumsum(counts[:-1], out=starts[1:])
+    return order, starts, counts
+
+
+def bootstrap_confidence_intervals(values, codes, number_of_resamples=DEFAULT_RESAMPLES,
+                                   confidence=DEFAULT_CONFIDENCE, random_state=RANDOM_STATE):
+    """
+    Return the lower and upper bounds (groups x metrics) of the percentile bootstrap confidence intervals of the
+    means of the columns of values (rows x metrics, NaN for missing values) in every group, given by the group
+    code of every row.
+    """
+    order, starts, counts = get_group_starts(codes)
+    # One contiguous row per metric, so that the values of a batch are gathered metric by metric.
+    values = np.ascontiguousarray(np.asarray(values, dtype=np.float64)[order].T)
+    present = ~np.isnan(values)
+    values = np.where(present, values, 0.0)
+    # Every row of a resample is drawn among the rows of its group.
+    row_starts = np.repeat(starts, counts)
+    row_counts = np.repeat(counts, counts)
+    random_state = np.random.default_rng(random_state)
+    batch_size = _get_batch_size(values.shape[1], number_of_resamples)
+    means = np.empty((number_of_resamples, len(starts), len(values)))
+    for start in range(0, number_of_resamples, batch_size):
+        size = min(batch_size, number_of_resamples - start)
+        indices = row_starts + (random_state.random((size, values.shape[1])) * row_counts).astype(np.int64)
+        for metric, (metric_values, metric_present) in enumerate(zip(values, present)):
+            if metric_present.all():
+                # Without missing values, every resample of a group has as many values as the group.
+                means[start:start + size, :, metric] = np.add.reduceat(
+                    np.take(metric_values, indices), starts, axis=-1
+                ) / counts
+            else:
+                means[start:start + size, :, metric] = _get_group_means(
+                    np.take(metric_values, indices), np.take(metric_present, indices), starts
+                )
+    alpha = (1 - confidence) / 2
+    with warnings.catch_warnings():
+        # Groups without any value of a metric have no interval.
+        warnings.simplefilter("ignore", RuntimeWarning)
+        lower, upper = np.nanquantile(means, [alpha, 1 - alpha], axis=0)
+    return lower, upper
+
+
+def paired_permutation_tests(differences, codes, number_of_resamples=DEFAULT_RESAMPLES, random_state=RANDOM_STATE):
+    """
+    Return the mean of the paired differences (pairs x metrics, NaN for missing values) of every group, given by
+    the group code of every pair, and the two-sided p-values of the permutation tests of a zero mean difference,
+    under which the sign of every difference is exchangeable.
+    """
+    order, starts, _ = get_group_starts(codes)
+    differences = np.ascontiguousarray(np.asarray(differences, dtype=np.float64)[order].T)
+    present = ~np.isnan(differences)
+    differences = np.where(present, differences, 0.0)
+    observed = _get_group_means(differences, present, starts)
+    random_state = np.random.default_rng(random_state)
+    batch_size = _get_batch_size(differences.shape[1], number_of_resamples)
+    extreme = np.zeros(observed.shape, dtype=np.int64)
+    # Ties within rounding errors of the observed statistic count as extreme.
+    threshold = np.abs(observed) - 1e-12 * np.maximum(np.abs(observed), 1.0)
+    for start in range(0, number_of_resamples, batch_size):
+        size = min(batch_size, number_of_resamples - start)
+        signs = random_state.integers(0, 2, size=(size, differences.shape[1]), dtype=np.int8) * 2 - 1
+        for metric, metric_differences in enumerate(differences):
+            permuted = _get_group_means(signs * metric_differences, present[metric], starts)
+            extreme[metric] += (np.abs(permuted) >= threshold[metric]).sum(axis=0)
+    p_values = (extreme + 1) / (number_of_resamples + 1)
+    return observed.T, np.where(np.isnan(observed), np.nan, p_values).T
+
+
+def get_paired_tests(df, compare="evaluation", number_of_resamples=DEFAULT_RESAMPLES, random_state=RANDOM_STATE):
+    """
+    Return, for every group of the other group columns, the mean difference of every summary metric between the two
+    values of compare (in sorted order, e.g. DANS - UNS) on the same holdouts and the p-value of its permutation test.
+    df is a summary frame with the pairing column (see get_statistics); the rows of a group and holdout are averaged.
+    """
+    other_columns = [column for column in GROUP_COLUMNS if column != compare]
+    paired = df.pivot_table(
+        index=other_columns + [PAIRING_COLUMN], columns=compare, values=list(SUMMARY_METRICS), aggfunc="mean"
+    )
+    modes = sorted(df[compare].unique())
+    if len(modes) != 2:
+        raise ValueError(f"Paired tests need two values of {compare}, found {modes}")
+    differences = paired.xs(modes[0], axis=1, level=compare) - paired.xs(modes[1], axis=1, level=compare)
+    differences = differences[list(SUMMARY_METRICS)].dropna(how="all")
+    groups = differences.index.droplevel(PAIRING_COLUMN)
+    codes, keys = pd.factorize(groups, sort=True)
+    mean_differences, p_values = paired_permutation_tests(
+        differences.to_numpy(), codes, number_of_resamples=number_of_resamples, random_state=random_state
+    )
+    tests = pd.DataFrame(list(keys), columns=other_columns)
+    tests["pairs"] = np.bincount(codes)
+    for index, name in enumerate(SUMMARY_METRICS.values()):
+        tests[f"{name}.mean_difference"] = mean_differences[:, index]
+        tests[f"{name}.p_value"] = p_values[:, index]
+    tests["comparison"] = f"{modes[0]} - {modes[1]}"
+    return tests
+
+
+def get_statistics(df, compare="evaluation", number_of_resamples=DEFAULT_RESAMPLES, confidence=DEFAULT_CONFIDENCE,
+                   random_state=RANDOM_STATE):
+    """
+    Return the table of get_mean_and_sd with, for every summary metric, the bounds of the bootstrap confidence
+    interval of its mean and the p-value of the paired test between the two values of compare (NaN if the results
+    have a single value of compare).
+    df should be core results with the pairing column, e.g. extract_core_results(results, [PAIRING_COLUMN]).
+    """
+    summary = get_summary_frame(df)
+    if len(summary) == 0:
+        raise ValueError("The results have no rows of the graph methods summarized by get_mean_and_sd")
+    stats = get_mean_and_sd(df)
+    codes, keys = pd.factorize(pd.MultiIndex.from_frame(summary[GROUP_COLUMNS]), sort=True)
+    lower, upper = bootstrap_confidence_intervals(
+        summary[list(SUMMARY_METRICS)].to_numpy(dtype=np.float64), codes,
+        number_of_resamples=number_of_resamples, confidence=confidence, random_state=random_state,
+    )
+    # get_mean_and_sd sorts the groups as well.
+    intervals = pd.DataFrame(list(keys), columns=GROUP_COLUMNS)
+    for index, name in enumerate(SUMMARY_METRICS.values()):
+        intervals[f"{name}.ci_low"] = lower[:, index]
+        intervals[f"{name}.ci_high"] = upper[:, index]
+    stats = stats.merge(intervals, on=GROUP_COLUMNS, how="left")
+    if summary[compare].nunique() == 2:
+        tests = get_paired_tests(summary, compare=compare, number_of_resamples=number_of_resamples,
+                                 random_state=random_state)
+        stats = stats.merge(
+            tests[[column for column in tests.columns if column.endswith(".p_value") or column in GROUP_COLUMNS]],
+            on=[column for column in GROUP_COLUMNS if column != compare], how="left",
+        )
+    else:
+        # e.g. results of models all trained with the same sampling mode.
+        for name in SUMMARY_METRICS.values():
+            stats[f"{name}.p_value"] = np.nan
+    statistic_columns = [
+        f"{name}.{statistic}" for name in SUMMARY_METRICS.values()
+        for statistic in ("mean", "std", "ci_low", "ci_high", "p_value")
+    ]
+    return stats[GROUP_COLUMNS + statistic_columns + ["approach"]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("results", help="Dataset of the results store or path of a results TSV")
+    parser.add_argument("output", nargs="?", default=None, help="Path of the statistics CSV, printed if not given")
+    parser.add_argument("--resamples", type=int, default=DEFAULT_RESAMPLES, help="Bootstrap and permutation resamples")
+    parser.add_argument("--confidence", type=float, default=DEFAULT_CONFIDENCE, help="Level of the intervals")
+    parser.add_argument("--compare", default="evaluation", choices=["evaluation", "model_neg_sampling"],
+                        help="Sampling modes compared by the paired tests")
+    arguments = parser.parse_args()
+    if os.path.exists(arguments.results):
+        core_results = extract_core_results(
+            pd.read_csv(arguments.results, sep="\t", index_col=0), extra_columns=[PAIRING_COLUMN]
+        )
+    else:
+        core_results = read_core_results(arguments.results, extra_columns=[PAIRING_COLUMN])
+    stats = get_statistics(core_results, compare=arguments.compare, number_of_resamples=arguments.resamples,
+                           confidence=arguments.confidence)
+    if arguments.output:
+        stats.to_csv(arguments.output)
+    else:
+        print(stats.to_string(index=False))
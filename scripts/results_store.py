@@ -0,0 +1,108 @@
+"""
+Columnar store of the edge prediction results, as a Parquet dataset partitioned by dataset, embedder and sampling mode.
+
+GRAPE results have one row per holdout, model and evaluation mode and more than a hundred
+columns, among which the parameters of the models and of the node features are nested under
+tuple column names, e.g. ('model_parameters', 'use_scale_free_distribution'), that become
+fragile strings once written to a TSV. Before storing, these columns are flattened to names such
+as model_parameters.use_scale_free_distribution and given proper types (booleans, numbers or
+strings). Each finished grid cell is appended as one Parquet file per partition, named after the
+cell so that a rerun replaces it rather than duplicating it, and summaries read only the columns
+they need (see results_analysis.py).
+
+The store requires pyarrow. Existing TSVs can be imported with:
+
+    python results_store.py sli results/sli_only_results_jul23.tsv
+"""
+import ast
+import os
+import sys
+
+import pandas as pd
+
+RESULTS_DIRECTORY = os.path.join(os.environ.get("EXPERIMENTS_DIR", "./experiments"), "results")
+PARTITION_COLUMNS = ["dataset", "embedder", "sampling"]
+NESTED_PREFIXES = ("model_parameters", "features_parameters")
+
+
+def get_flat_column_name(column):
+    """
+    Return the flat name of a tuple column, given as a tuple or as its string representation.
+    """
+    if isinstance(column, str) and column.startswith("(") and column.endswith(")"):
+        try:
+            column = ast.literal_eval(column)
+        except (ValueError, SyntaxError):
+            return column
+    if isinstance(column, tuple):
+        return ".".join(map(str, column))
+    return column
+
+
+def _to_typed_column(values):
+    """
+    Return the column as booleans or numbers when all its values are, and as strings otherwise.
+    A column without any value (e.g. a metric that a model does not report) is left as objects.
+    """
+    if values.dtype != object:
+        return values
+    present = values.dropna()
+    if present.empty:
+        return values
+    if present.map(lambda value: isinstance(value, bool) or value in ("True", "False")).all():
+        return values.map({True: True, False: False, "True": True, "False": False}, na_action="ignore").astype("boolean")
+    numbers = pd.to_numeric(present, errors="coerce")
+    if numbers.notna().all():
+        return pd.to_numeric(values)
+    return values.map(str, na_action="ignore")
+
+
+def normalize_results(results):
+    """
+    Return the results with flat, typed columns; the validation sampling mode is also given as DANS or UNS.
+    """
+    results = results.rename(columns=get_flat_column_name).reset_index(drop=True)
+    results = results.apply(_to_typed_column)
+    if "use_scale_free_distribution" in results.columns:
+        results["sampling"] = results["use_scale_free_distribution"].map({True: "DANS", False: "UNS"})
+    return results
+
+
+def append_results(results, dataset, part_name, directory=RESULTS_DIRECTORY):
+    """
+    Write the results of a grid cell in the store, one Parquet file per embedder and sampling mode.
+    """
+    results = normalize_results(results)
+    results["dataset"] = dataset
+    results["embedder"] = results["features_names"].astype(str)
+    for (embedder, sampling), partition in results.groupby(["embedder", "sampling"]):
+        path = os.path.join(directory, f"dataset={dataset}", f"embedder={embedder}", f"sampling={sampling}")
+        os.makedirs(path, exist_ok=True)
+        tmp_path = os.path.join(path, f".{part_name}.{os.getpid()}.tmp")
+        partition.drop(columns=PARTITION_COLUMNS).to_parquet(tmp_path, engine="pyarrow", index=False)
+        os.replace(tmp_path, os.path.join(path, f"{part_name}.parquet"))
+
+
+def read_results(columns=None, dataset=None, directory=RESULTS_DIRECTORY):
+    """
+    Return the stored results, reading only the given columns, optionally restricted to a dataset.
+    """
+    filters = None if dataset is None else [("dataset", "=", dataset)]
+    results = pd.read_parquet(directory, engine="pyarrow", columns=columns, filters=filters)
+    # Hive partitions are read back as categories.
+    for column in PARTITION_COLUMNS:
+        if column in results.columns:
+            results[column] = results[column].astype(str)
+    return results
+
+
+def import_tsv(dataset, path, directory=RESULTS_DIRECTORY):
+    """
+    Import a results TSV written by the run scripts into the store.
+    """
+    results = pd.read_csv(path, sep="\t", index_col=0)
+    append_results(results, dataset, os.path.splitext(os.path.basename(path))[0], directory=directory)
+
+
+if __name__ == "__main__":
+    import_tsv(sys.argv[1], sys.argv[2])
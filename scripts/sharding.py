@@ -0,0 +1,195 @@
+"""
+Sharded execution of the experiment grids: one work unit per (grid cell, holdout).
+
+A full grid in a single SLURM job takes up to 48 hours. Here every holdout of every cell is an
+independent work unit, whose results are written to its own shard TSV in
+experiments/grids/<name>/shards. The units can be dispatched as the tasks of a SLURM job array,
+which fit in the backfill windows of the cluster, or run on a local process pool with exactly the
+same interface. Once all the shards of a cell exist, the merge step assembles them into the cell
+TSV, so that the results store, the online aggregate and the output TSV of the grid are built as
+by experiment_grid.run_grid. Units with an existing shard are skipped, so every step can be rerun.
+
+Usage:
+
+    python sharding.py local grids/sli.json         # run all pending units on a local process pool
+    python sharding.py slurm grids/sli.json > a.sh  # write the job array script, then `sbatch a.sh`
+    python sharding.py task grids/sli.json          # run the units of this SLURM array task
+    python sharding.py merge grids/sli.json         # assemble the shards into cells and the output
+"""
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+from tqdm.auto import tqdm
+
+import experiment_grid
+from experiment_grid import (evaluate_cell, get_cell_path, get_cells_directory, get_grid_cells, get_worker_budget,
+                             load_aggregator, load_grid_config, merge_cells, order_cell_results, write_cell_results,
+                             write_grid_trace)
+
+# Default resources of a SLURM array task, overridden by the "slurm" entry of the grid configuration.
+DEFAULT_SLURM_RESOURCES = {
+    "time": "04:00:00",
+    "mem": "64GB",
+    "max_concurrent_tasks": None,
+}
+
+
+def get_work_units(config):
+    """
+    Return the list of work units of the grid, one per cell and holdout.
+    """
+    return [
+        dict(cell=cell, holdout_number=holdout_number, unit_id=f"{cell['cell_id']}-holdout={holdout_number}")
+        for cell in get_grid_cells(config)
+        for holdout_number in range(config["number_of_holdouts"])
+    ]
+
+
+def get_shards_directory(config):
+    return os.path.join(os.path.dirname(get_cells_directory(config)), "shards")
+
+
+def get_shard_path(config, unit):
+    return os.path.join(get_shards_directory(config), f"{unit['unit_id']}.tsv")
+
+
+def get_pending_units(config):
+    return [unit for unit in get_work_units(config) if not os.path.exists(get_shard_path(config, unit))]
+
+
+def run_work_unit(config, task, unit):
+    """
+    Evaluate a single holdout of a cell and write its shard, returning the path of the shard.
+    """
+    results = evaluate_cell(config, task, unit["cell"], holdout_numbers=[unit["holdout_number"]])
+    path = get_shard_path(config, unit)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    results.to_csv(tmp_path, sep="\t")
+    os.replace(tmp_path, path)
+    return path
+
+
+def _run_work_unit(unit):
+    return run_work_unit(experiment_grid._worker_config, experiment_grid._worker_task, unit)
+
+
+def run_local(config_path):
+    """
+    Run all the pending work units of the grid on a local process pool, as the tasks of a job array would.
+    """
+    config = load_grid_config(config_path)
+    os.makedirs(get_shards_directory(config), exist_ok=True)
+    pending = get_pending_units(config)
+    number_of_workers, threads_per_worker = get_worker_budget(config)
+    if pending:
+        with ProcessPoolExecutor(
+            max_workers=min(number_of_workers, len(pending)),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=experiment_grid._initialize_worker,
+            initargs=(config, threads_per_worker),
+        ) as executor:
+            futures = [executor.submit(_run_work_unit, unit) for unit in pending]
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Work units"):
+                future.result()
+    return merge_shards(config_path)
+
+
+def run_slurm_task(config_path):
+    """
+    Run the work units of the current SLURM array task: units task_id, task_id + task_count, ...
+    The units are indexed among all the units of the grid, so that a resubmitted array finds the same assignment.
+    """
+    config = load_grid_config(config_path)
+    os.makedirs(get_shards_directory(config), exist_ok=True)
+    task_id = int(os.environ["SLURM_ARRAY_TASK_ID"])
+    task_count = int(os.environ.get("SLURM_ARRAY_TASK_COUNT", 1))
+    units = [
+        unit for unit in get_work_units(config)[task_id::task_count]
+        if not os.path.exists(get_shard_path(config, unit))
+    ]
+    if not units:
+        return
+    experiment_grid._initialize_worker(config, int(os.environ.get("SLURM_CPUS_PER_TASK", os.cpu_count() or 1)))
+    for unit in units:
+        print(f"Running {unit['unit_id']}")
+        run_work_unit(config, experiment_grid._worker_task, unit)
+
+
+def get_slurm_script(config_path):
+    """
+    Return the sbatch script of the job array with one task per work unit of the grid.
+    The tasks of units whose shard already exists exit at once.
+    """
+    config = load_grid_config(config_path)
+    resources = dict(DEFAULT_SLURM_RESOURCES, **config.get("slurm", {}))
+    number_of_units = len(get_work_units(config))
+    _, threads_per_worker = get_worker_budget(config)
+    array = f"0-{number_of_units - 1}"
+    if resources["max_concurrent_tasks"]:
+        array += f"%{resources['max_concurrent_tasks']}"
+    return "\n".join([
+        "#!/bin/bash",
+        "",
+        f"#SBATCH --job-name={config['name']}-shards",
+        f"#SBATCH --output={config['name']}-shards-%a.out",
+        f"#SBATCH --error={config['name']}-shards-%a.err",
+        f"#SBATCH --array={array}",
+        "#SBATCH --nodes=1",
+        f"#SBATCH --mem={resources['mem']}",
+        f"#SBATCH --time {resources['time']}",
+        f"#SBATCH --cpus-per-task={config['threads_per_worker'] or threads_per_worker}",
+        "",
+        "#source ./venv/bin/activate",
+        "",
+        f"python sharding.py task {config_path}",
+        "",
+    ])
+
+
+def merge_shards(config_path):
+    """
+    Assemble the shards of every cell whose holdouts are all done into the cell TSV, with the rows in the
+    order of an unsharded run, and write the output TSV of the grid once all the cells are done.
+    """
+    config = load_grid_config(config_path)
+    cells = get_grid_cells(config)
+    os.makedirs(get_cells_directory(config), exist_ok=True)
+    units_by_cell = {}
+    for unit in get_work_units(config):
+        units_by_cell.setdefault(unit["cell"]["cell_id"], []).append(unit)
+    for cell in cells:
+        units = units_by_cell[cell["cell_id"]]
+        if os.path.exists(get_cell_path(config, cell)):
+            continue
+        if not all(os.path.exists(get_shard_path(config, unit)) for unit in units):
+            continue
+        # Each shard holds one holdout for every validation sampling mode: the units are in holdout order.
+        write_cell_results(config, cell, order_cell_results(config, pd.concat([
+            pd.read_csv(get_shard_path(config, unit), sep="\t", index_col=0)
+            for unit in units
+        ])))
+    finished = [cell for cell in cells if os.path.exists(get_cell_path(config, cell))]
+    load_aggregator(config, finished)
+    print(f"{config['name']}: {len(finished)} of {len(cells)} cells merged")
+    if len(finished) == len(cells):
+        if config["chrome_trace"]:
+            print(f"Chrome trace written to {write_grid_trace(config)}")
+        return merge_cells(config, cells)
+    return None
+
+
+if __name__ == "__main__":
+    command, config_path = sys.argv[1], sys.argv[2]
+    if command == "local":
+        run_local(config_path)
+    elif command == "slurm":
+        print(get_slurm_script(config_path))
+    elif command == "task":
+        run_slurm_task(config_path)
+    elif command == "merge":
+        merge_shards(config_path)
+    else:
+        raise ValueError(f"Unknown command {command}, expected one of local, slurm, task or merge")
@@ -0,0 +1,397 @@
+"""
+Several perceptrons trained in one pass over shared features.
+
+The degree-only analyses train one PerceptronEdgePrediction per edge feature and training sampling
+mode (ten in degreeBias.ipynb, 1000 epochs each), and the embedding grids two per cell (DANS and
+UNS training negatives), each as a separate pass over nearly identical data. StackedPerceptron fits
+N configurations at once: the weight vectors of the models are the columns of a matrix over the
+union of their feature columns, masked to the columns each model uses, so that every mini-batch
+is a single matrix product for all the models. The positive edges and their features are shared by
+all the models; the negatives and their features are shared by the models with the same training
+sampling mode (one NegativeSampler stream for DANS, one for UNS). Features are the topological edge
+features of edge_features.py ("Degree", "AdamicAdar", ...), standardized with the statistics of
+the first chunk of training pairs since the degree scores span orders of magnitude, and/or the edge
+embeddings of edge_embeddings.py computed from the node embeddings. Optimization is Adam, as in
+StreamingPerceptron, with the moments of all the models stacked.
+
+StackedPerceptronEdgePrediction wraps it as a GRAPE edge prediction model: every model of a sweep
+lists the configurations of the whole sweep in stacked_with, the first one fitted on a holdout
+trains all of them, and the others take their weights from that shared fit, so that the results
+tables of GRAPE's evaluate are unchanged.
+"""
+import hashlib
+from functools import lru_cache
+
+import numpy as np
+
+from edge_embeddings import DEFAULT_CHUNK_SIZE, _sigmoid, get_edge_embeddings
+from edge_features import EdgeFeatureEngine, get_feature_columns
+from negative_sampling import NegativeSampler
+
+# The fit shared by the models of the sweep being evaluated, and its predictions, keyed by the
+# fingerprint of the graphs, node features and configurations.
+_shared_fit = {}
+
+
+class StackedPerceptron:
+    """
+    Perceptrons of several configurations trained together on edge features and/or edge embeddings.
+
+    Parameters
+    ----------
+    configurations:
+        One dict per model, with the edge_features (names of EDGE_FEATURES), the edge_embeddings
+        (names of EDGE_EMBEDDING_METHODS, used when node embeddings are given) and the
+        use_scale_free_distribution of its training negatives.
+    number_of_epochs:
+        Passes over the positive edges.
+    number_of_edges_per_mini_batch:
+        Positive edges per mini-batch, each paired with as many negatives.
+    learning_rate, first_order_decay_factor, second_order_decay_factor:
+        Parameters of the Adam optimizer.
+    """
+
+    def __init__(
+        self,
+        configurations,
+        number_of_epochs=100,
+        number_of_edges_per_mini_batch=4096,
+        learning_rate=0.001,
+        first_order_decay_factor=0.9,
+        second_order_decay_factor=0.999,
+        random_state=42,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+    ):
+        self.configurations = [
+            dict(
+                edge_features=list(configuration.get("edge_features") or ()),
+                edge_embeddings=list(configuration.get("edge_embeddings") or ()),
+                use_scale_free_distribution=configuration.get("use_scale_free_distribution", True),
+            )
+            for configuration in configurations
+        ]
+        self.number_of_epochs = number_of_epochs
+        self.number_of_edges_per_mini_batch = number_of_edges_per_mini_batch
+        self.learning_rate = learning_rate
+        self.first_order_decay_factor = first_order_decay_factor
+        self.second_order_decay_factor = second_order_decay_factor
+        self.random_state = random_state
+        # A whole number of mini-batches per chunk.
+        self.chunk_size = max(1, chunk_size // number_of_edges_per_mini_batch) * number_of_edges_per_mini_batch
+        self.edge_features = sorted({
+            feature for configuration in self.configurations for feature in configuration["edge_features"]
+        })
+        self.edge_embeddings = sorted({
+            method for configuration in self.configurations for method in configuration["edge_embeddings"]
+        })
+        self.weights = None
+        self.bias = None
+        self.mask = None
+        self.mean = None
+        self.scale = None
+
+    def _get_features(self, engine, node_embeddings, pairs):
+        """
+        Return the features of the pairs over the union of the columns of the models, and the model of each column.
+        """
+        blocks = []
+        columns = []
+        if self.edge_features:
+            blocks.append(engine.compute(pairs, self.edge_features))
+            columns.extend(
+                [feature] * len(get_feature_columns([feature])) for feature in self.edge_features
+            )
+        if self.edge_embeddings and node_embeddings is not None:
+            for method in self.edge_embeddings:
+                block = get_edge_embeddings(node_embeddings, pairs, [method])
+                blocks.append(block)
+                columns.append([method] * block.shape[1])
+        if not blocks:
+            raise ValueError("None of the models has edge features, or edge embeddings with node embeddings")
+        return np.concatenate(blocks, axis=1), [name for block in columns for name in block]
+
+    def _standardize(self, features):
+        return (features - self.mean) / self.scale
+
+    def fit(self, offsets, destinations, node_embeddings=None, directed=False, engine=None):
+        """
+        Train all the models on the edges of the CSR (the training graph) against negatives sampled from it.
+        The edge features are computed by engine, by default an EdgeFeatureEngine of the CSR.
+        """
+        offsets = np.asarray(offsets, dtype=np.int64)
+        engine = engine or EdgeFeatureEngine(offsets, destinations)
+        random_state = np.random.default_rng(self.random_state)
+        streams = sorted({configuration["use_scale_free_distribution"] for configuration in self.configurations})
+        samplers = {
+            use_scale_free_distribution: NegativeSampler(
+                offsets, destinations, use_scale_free_distribution=use_scale_free_distribution, directed=directed
+            )
+            for use_scale_free_distribution in streams
+        }
+        # Models trained on the negatives of each stream.
+        models = {
+            use_scale_free_distribution: np.array([
+                index for index, configuration in enumerate(self.configurations)
+                if configuration["use_scale_free_distribution"] == use_scale_free_distribution
+            ])
+            for use_scale_free_distribution in streams
+        }
+        sources = np.repeat(np.arange(len(offsets) - 1, dtype=np.int64), np.diff(offsets))
+        edge_ids = np.flatnonzero(sources < destinations) if not directed else np.arange(len(destinations))
+        del sources
+        number_of_models = len(self.configurations)
+        self.weights = None
+        step = 0
+        for _ in range(self.number_of_epochs):
+            edge_ids = random_state.permutation(edge_ids)
+            for start in range(0, len(edge_ids), self.chunk_size):
+                chunk = edge_ids[start:start + self.chunk_size]
+                positives = np.stack([np.searchsorted(offsets, chunk, side="right") - 1, destinations[chunk]], axis=1)
+                positive_features, columns = self._get_features(engine, node_embeddings, positives)
+                negative_features = {
+                    use_scale_free_distribution: self._get_features(engine, node_embeddings, next(sampler.iter_batches(
+                        len(chunk), random_state=int(random_state.integers(2**31)), batch_size=len(chunk)
+                    )))[0]
+                    for use_scale_free_distribution, sampler in samplers.items()
+                }
+                if self.weights is None:
+                    dimension = len(columns)
+                    self.mask = np.array([
+                        [
+                            column in configuration["edge_features"] or column in configuration["edge_embeddings"]
+                            for configuration in self.configurations
+                        ]
+                        for column in columns
+                    ], dtype=np.float32)
+                    # Edge features are standardized, edge embeddings are used as they are.
+                    is_edge_feature = np.isin(columns, self.edge_features)
+                    sample = np.concatenate([positive_features, *negative_features.values()])
+                    self.mean = np.where(is_edge_feature, sample.mean(axis=0), 0.0).astype(np.float32)
+                    scale = sample.std(axis=0)
+                    self.scale = np.where(is_edge_feature & (scale > 0), scale, 1.0).astype(np.float32)
+                    self.weights = np.zeros((dimension, number_of_models), dtype=np.float32)
+                    self.bias = np.zeros(number_of_models, dtype=np.float32)
+                    # Adam moments of the weights and the biases, stored together.
+                    first_moment = np.zeros((dimension + 1, number_of_models), dtype=np.float64)
+                    second_moment = np.zeros((dimension + 1, number_of_models), dtype=np.float64)
+                positive_features = self._standardize(positive_features)
+                negative_features = {
+                    stream: self._standardize(features) for stream, features in negative_features.items()
+                }
+                for batch_start in range(0, len(chunk), self.number_of_edges_per_mini_batch):
+                    batch_end = batch_start + self.number_of_edges_per_mini_batch
+                    gradient = np.zeros((len(columns) + 1, number_of_models), dtype=np.float64)
+                    for stream, model_indices in models.items():
+                        features = np.concatenate([
+                            positive_features[batch_start:batch_end], negative_features[stream][batch_start:batch_end]
+                        ])
+                        labels = np.zeros(len(features), dtype=np.float32)
+                        labels[:len(positive_features[batch_start:batch_end])] = 1.0
+                        weights = self.weights[:, model_indices] * self.mask[:, model_indices]
+                        errors = _sigmoid(features @ weights + self.bias[model_indices]) - labels[:, None]
+                        gradient[:-1, model_indices] = (features.T @ errors) * self.mask[:, model_indices] / len(features)
+                        gradient[-1, model_indices] = errors.sum(axis=0) / len(features)
+                    step += 1
+                    first_moment = self.first_order_decay_factor * first_moment + (1 - self.first_order_decay_factor) * gradient
+                    second_moment = self.second_order_decay_factor * second_moment \
+                        + (1 - self.second_order_decay_factor) * gradient ** 2
+                    update = self.learning_rate * (first_moment / (1 - self.first_order_decay_factor ** step)) / (
+                        np.sqrt(second_moment / (1 - self.second_order_decay_factor ** step)) + 1e-8
+                    )
+                    self.weights -= update[:-1].astype(np.float32)
+                    self.bias -= update[-1].astype(np.float32)
+        return self
+
+    def predict_proba(self, pairs, node_embeddings=None, engine=None):
+        """
+        Return the (number of pairs, number of models) probabilities that the (source, destination) pairs are edges,
+        computing the features of chunk_size pairs at a time with engine (an EdgeFeatureEngine of the support graph).
+        """
+        pairs = np.asarray(pairs)
+        if len(pairs) == 0:
+            return np.empty((0, len(self.configurations)), dtype=np.float32)
+        weights = self.weights * self.mask
+        return np.concatenate([
+            _sigmoid(self._standardize(self._get_features(engine, node_embeddings, pairs[start:start + self.chunk_size])[0])
+                     @ weights + self.bias)
+            for start in range(0, len(pairs), self.chunk_size)
+        ]).astype(np.float32)
+
+
+def _get_fingerprint(*graphs, node_features=None, parameters=None):
+    """
+    Return a fingerprint of the graphs, of a sample of the rows of the node features and of the parameters.
+    """
+    digest = hashlib.sha256()
+    for graph in graphs:
+        digest.update(str(graph.hash()).encode("utf8"))
+    for node_feature in node_features or ():
+        node_feature = np.asarray(node_feature)
+        digest.update(str(node_feature.shape).encode("utf8"))
+        digest.update(np.ascontiguousarray(node_feature[::max(1, len(node_feature) // 1024)]).tobytes())
+    digest.update(repr(parameters).encode("utf8"))
+    return digest.hexdigest()
+
+
+def _get_configuration(edge_features=None, edge_embeddings="Hadamard", use_scale_free_distribution=True):
+    """
+    Return the configuration of a model of StackedPerceptronEdgePrediction, with the defaults of its parameters.
+    """
+    return dict(
+        edge_features=[edge_features] if isinstance(edge_features, str) else list(edge_features or ()),
+        edge_embeddings=[edge_embeddings] if isinstance(edge_embeddings, str) else list(edge_embeddings or ()),
+        use_scale_free_distribution=use_scale_free_distribution,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_stacked_perceptron_edge_prediction():
+    """
+    Return the GRAPE model class wrapping StackedPerceptron, created on first use so that GRAPE is only
+    imported by the processes that evaluate models.
+    """
+    from embiggen.edge_prediction.edge_prediction_model import AbstractEdgePredictionModel
+    from edge_features import get_csr_from_grape
+
+    class StackedPerceptronEdgePrediction(AbstractEdgePredictionModel):
+        """
+        GRAPE edge prediction model whose weights come from a StackedPerceptron trained for all the
+        configurations of stacked_with, shared by the models of the sweep fitted on the same graph.
+        The other parameters are those of PerceptronEdgePrediction, and must be the same for the whole sweep.
+        """
+
+        def __init__(
+            self,
+            edge_features=None,
+            edge_embeddings="Hadamard",
+            number_of_epochs=100,
+            number_of_edges_per_mini_batch=4096,
+            learning_rate=0.001,
+            first_order_decay_factor=0.9,
+            second_order_decay_factor=0.999,
+            use_scale_free_distribution=True,
+            stacked_with=None,
+            random_state=42,
+            verbose=False,
+        ):
+            super().__init__(random_state=random_state)
+            configuration = _get_configuration(edge_features, edge_embeddings, use_scale_free_distribution)
+            stacked_with = [_get_configuration(**other) for other in stacked_with or [configuration]]
+            if configuration not in stacked_with:
+                raise ValueError(f"The configuration {configuration} of the model is not among stacked_with")
+            self._model_index = stacked_with.index(configuration)
+            self._model_kwargs = dict(
+                edge_features=configuration["edge_features"],
+                edge_embeddings=configuration["edge_embeddings"],
+                number_of_epochs=number_of_epochs,
+                number_of_edges_per_mini_batch=number_of_edges_per_mini_batch,
+                learning_rate=learning_rate,
+                first_order_decay_factor=first_order_decay_factor,
+                second_order_decay_factor=second_order_decay_factor,
+                use_scale_free_distribution=use_scale_free_distribution,
+                stacked_with=stacked_with,
+            )
+            self._fit_key = None
+
+        def parameters(self):
+            return dict(**super().parameters(), **self._model_kwargs)
+
+        def clone(self):
+            return type(self)(**self.parameters())
+
+        @classmethod
+        def smoke_test_parameters(cls):
+            return dict(number_of_epochs=1)
+
+        def _get_model(self):
+            stacked_with = self._model_kwargs["stacked_with"]
+            return StackedPerceptron(
+                stacked_with,
+                random_state=self._random_state,
+                **{
+                    key: value for key, value in self._model_kwargs.items()
+                    if key not in ("edge_features", "edge_embeddings", "use_scale_free_distribution", "stacked_with")
+                },
+            )
+
+        def _fit(self, graph, support=None, node_features=None, node_type_features=None,
+                 edge_type_features=None, edge_features=None):
+            support = graph if support is None else support
+            # GRAPE passes an empty list when there are no node features.
+            node_features = node_features or None
+            # The parameters of the sweep, the same for all its models.
+            parameters = {
+                key: value for key, value in self.parameters().items()
+                if key not in ("edge_features", "edge_embeddings", "use_scale_free_distribution")
+            }
+            self._fit_key = _get_fingerprint(
+                graph, support, node_features=node_features, parameters=(parameters, self._random_state)
+            )
+            if self._fit_key not in _shared_fit:
+                # Only the sweep being evaluated is kept.
+                _shared_fit.clear()
+                offsets, destinations = get_csr_from_grape(graph)
+                model = self._get_model().fit(
+                    offsets, destinations, node_features,
+                    directed=graph.is_directed(), engine=EdgeFeatureEngine.from_grape(support),
+                )
+                _shared_fit[self._fit_key] = dict(model=model, predictions={})
+
+        def _predict(self, graph, support=None, node_features=None, node_type_features=None,
+                     edge_type_features=None, edge_features=None):
+            return self._predict_proba(graph, support=support, node_features=node_features) > 0.5
+
+        def _predict_proba(self, graph, support=None, node_features=None, node_type_features=None,
+                           edge_type_features=None, edge_features=None):
+            shared = _shared_fit.get(self._fit_key)
+            if shared is None:
+                raise ValueError(f"The shared fit of {self.model_name()} is gone: fit the model again")
+            support = graph if support is None else support
+            node_features = node_features or None
+            key = (graph.hash(), support.hash())
+            if key not in shared["predictions"]:
+                # One score per directed edge, as PerceptronEdgePrediction, for all the models at once.
+                shared["predictions"][key] = shared["model"].predict_proba(
+                    graph.get_directed_edge_node_ids(), node_features, engine=EdgeFeatureEngine.from_grape(support)
+                )
+            return shared["predictions"][key][:, self._model_index]
+
+        @classmethod
+        def requires_node_types(cls):
+            return False
+
+        @classmethod
+        def can_use_node_types(cls):
+            # As PerceptronEdgePrediction, types are accepted but not used by the features.
+            return True
+
+        @classmethod
+        def requires_edge_types(cls):
+            return False
+
+        @classmethod
+        def can_use_edge_types(cls):
+            # As PerceptronEdgePrediction, types are accepted but not used by the features.
+            return True
+
+        @classmethod
+        def can_use_edge_weights(cls):
+            return False
+
+        @classmethod
+        def can_use_edge_type_features(cls):
+            return False
+
+        @classmethod
+        def can_use_edge_features(cls):
+            return False
+
+        @classmethod
+        def model_name(cls):
+            return "Stacked Perceptron"
+
+        @classmethod
+        def library_name(cls):
+            return "NumPy"
+
+    return StackedPerceptronEdgePrediction
@@ -0,0 +1,372 @@
+"""
+Single-pass preparation of the STRING and SLI|STRING graphs over a sweep of confidence thresholds.
+
+Every prepared STRING graph filters HomoSapiens at one combined score (filter_from_names with
+min_edge_weight, then remove_edge_weights), so studying the sensitivity to the cutoff meant a full
+preparation, remapping and composition per threshold. Here the STRING edges are prepared once,
+with their scores, sorted by decreasing combined score and with the node names already remapped
+to gene symbols (the scored STRING graph), so that the edges at any threshold are a prefix of the
+arrays. The SLI|STRING composites of a sweep are then computed in one pass from the highest
+threshold down: the connected components of the composite are merged incrementally with the edges
+each lower threshold adds, and the largest component at every threshold is written as a prepared
+graph with the nodes and edges get_prepared_sli_composite_graph(min_edge_weight=threshold) would build.
+GRAPE's remapping leaves the nodes of those graphs in an arbitrary order, so the graphs of a sweep
+are cached under their own names (string-sweep, string-ensp-sweep and sli-string-composite-sweep).
+
+The thresholds of graph_preparation.STRING_THRESHOLDS are datasets of graph_preparation.TASKS
+(e.g. sli_400, sli_900); the first of them to be loaded prepares the whole sweep.
+
+Usage, to prepare the graphs of a sweep:
+
+    python string_thresholds.py [--thresholds 400 700 900] {sli,string}
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from graph_preparation import (
+    PREPARED_GRAPHS_DIRECTORY,
+    SLDB_INPUT_PATTERNS,
+    SLDB_NODES_PATH,
+    STRING_INFO_PATH,
+    STRING_INPUT_PATTERNS,
+    STRING_THRESHOLDS,
+    PreparedGraph,
+    get_input_fingerprint,
+    write_prepared_arrays,
+)
+from instrumentation import get_tracer
+from network_characteristics import load_network_characteristics
+
+
+def write_scored_string_graph(string_graph, path, fingerprint, node_names):
+    """
+    Write the weighted undirected STRING graph to path as its edges sorted by decreasing score, with the given
+    node names. The directory is written under a temporary name and renamed into place.
+    """
+    edges = np.asarray(string_graph.get_directed_edge_node_ids(), dtype=np.uint32).reshape(-1, 2)
+    scores = np.asarray(string_graph.get_directed_edge_weights(), dtype=np.float32)
+    # Every undirected edge once.
+    mask = edges[:, 0] <= edges[:, 1]
+    edges, scores = edges[mask], scores[mask]
+    order = np.argsort(-scores, kind="stable")
+
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=parent, prefix=".tmp_")
+    np.save(os.path.join(tmp_path, "node_names.npy"), np.asarray(node_names, dtype=str))
+    np.save(os.path.join(tmp_path, "sources.npy"), np.ascontiguousarray(edges[order, 0]))
+    np.save(os.path.join(tmp_path, "destinations.npy"), np.ascontiguousarray(edges[order, 1]))
+    np.save(os.path.join(tmp_path, "scores.npy"), scores[order])
+    with open(os.path.join(tmp_path, "metadata.json"), "w") as fh:
+        json.dump({
+            "name": string_graph.get_name(),
+            "fingerprint": fingerprint,
+            "number_of_nodes": len(node_names),
+            "number_of_edges": len(order),
+        }, fh, indent=2)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # Another job wrote the same graph in the meantime.
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+class ScoredStringGraph:
+    """
+    Undirected STRING edges sorted by decreasing combined score, backed by memory-mapped arrays.
+    The edges with a score of at least a threshold are a prefix of the arrays.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "metadata.json")) as fh:
+            self.metadata = json.load(fh)
+        self.name = self.metadata["name"]
+        self.fingerprint = self.metadata["fingerprint"]
+        self.sources = np.load(os.path.join(path, "sources.npy"), mmap_mode="r")
+        self.destinations = np.load(os.path.join(path, "destinations.npy"), mmap_mode="r")
+        self.scores = np.load(os.path.join(path, "scores.npy"), mmap_mode="r")
+        self._node_names = None
+
+    def get_node_names(self):
+        if self._node_names is None:
+            self._node_names = np.load(os.path.join(self.path, "node_names.npy"))
+        return self._node_names
+
+    def get_number_of_edges(self, threshold):
+        """
+        Return the number of edges with a score of at least threshold, as filter_from_names(min_edge_weight) keeps.
+        """
+        return int(np.searchsorted(-np.asarray(self.scores), -np.float32(threshold), side="right"))
+
+
+def get_prepared_scored_string_graph(remap_node_names=True):
+    """
+    Return the ScoredStringGraph of STRING HomoSapiens, building it only if no cache matches the inputs.
+    If remap_node_names is True, ENSP identifiers are replaced by gene symbols as in build_string_graph.
+    """
+    name = "string-scored" if remap_node_names else "string-ensp-scored"
+    parameters = dict(remap_node_names=remap_node_names, scored=True)
+    fingerprint = get_input_fingerprint(STRING_INPUT_PATTERNS, parameters)
+    if fingerprint is not None:
+        path = os.path.join(PREPARED_GRAPHS_DIRECTORY, f"{name}-{fingerprint}")
+        if os.path.exists(path):
+            return ScoredStringGraph(path)
+    from grape.datasets.string import HomoSapiens
+    with get_tracer().stage("graph_preparation", graph_name=name):
+        string_graph = HomoSapiens().remove_node_types()
+        node_names = get_string_node_names(string_graph, STRING_INFO_PATH if remap_node_names else None)
+    fingerprint = get_input_fingerprint(STRING_INPUT_PATTERNS, parameters)
+    path = os.path.join(PREPARED_GRAPHS_DIRECTORY, f"{name}-{fingerprint}")
+    if not os.path.exists(path):
+        write_scored_string_graph(string_graph, path, fingerprint, node_names)
+    return ScoredStringGraph(path)
+
+
+def get_string_node_names(string_graph, info_path=None):
+    """
+    Return the node names of the STRING graph, replaced by the gene symbols of the STRING protein info table
+    at info_path if given, as in graph_preparation.filter_string_graph. Several nodes may get the same symbol.
+    """
+    node_names = string_graph.get_node_names()
+    if info_path is None:
+        return node_names
+    from node_remapping import get_node_names_remapping
+    # The remapping is in the order of the node names.
+    return list(get_node_names_remapping(string_graph, info_path, key_column=0, value_column=1).values())
+
+
+def _get_undirected_edges(sources, destinations, edge_type_ids):
+    """
+    Return the directed edges and edge types of the distinct undirected edges, in both directions but for self-loops.
+    """
+    edges = np.unique(np.column_stack([
+        edge_type_ids, np.minimum(sources, destinations), np.maximum(sources, destinations)
+    ]).astype(np.int64), axis=0)
+    reverse = edges[edges[:, 1] != edges[:, 2]]
+    edge_type_ids = np.concatenate([edges[:, 0], reverse[:, 0]]).astype(np.int32)
+    directed_edges = np.concatenate([edges[:, 1:], reverse[:, [2, 1]]]).astype(np.uint32)
+    return directed_edges, edge_type_ids
+
+
+def iter_string_graphs(scored_graph, thresholds, typed=True):
+    """
+    Yield the threshold, node names, directed edges and edge types of the STRING graph at each threshold,
+    i.e. the edges with a score of at least the threshold and the nodes with at least one of them, in the
+    order of the scored graph. If typed, the edges are of type PPI (0), as in build_string_graph. Nodes with
+    the same name (ENSP identifiers with the same gene symbol) are merged, as GRAPE's remapping merges them;
+    GRAPE leaves the nodes in an arbitrary order, here they keep the order of their first occurrence in STRING.
+    """
+    node_names, first_positions, merged_node_ids = np.unique(
+        np.asarray(scored_graph.get_node_names(), dtype=str), return_index=True, return_inverse=True
+    )
+    order = np.argsort(first_positions)
+    ranks = np.empty(len(order), dtype=np.int64)
+    ranks[order] = np.arange(len(order))
+    node_names, merged_node_ids = node_names[order], ranks[merged_node_ids.reshape(-1)]
+    for threshold in sorted(thresholds, reverse=True):
+        number_of_edges = scored_graph.get_number_of_edges(threshold)
+        sources = merged_node_ids[np.asarray(scored_graph.sources[:number_of_edges])]
+        destinations = merged_node_ids[np.asarray(scored_graph.destinations[:number_of_edges])]
+        keep = np.zeros(len(node_names), dtype=bool)
+        keep[sources] = True
+        keep[destinations] = True
+        node_ids = np.cumsum(keep) - 1
+        edges, edge_type_ids = _get_undirected_edges(
+            node_ids[sources], node_ids[destinations], np.zeros(number_of_edges, dtype=np.int32)
+        )
+        yield threshold, node_names[keep], edges, edge_type_ids if typed else np.full(len(edges), -1, dtype=np.int32)
+
+
+def iter_sli_composite_graphs(scored_graph, sli_node_names, sli_sources, sli_destinations, thresholds):
+    """
+    Yield the threshold, node names, directed edges and edge types (PPI 0, SLI 1) of the largest connected
+    component of the composition of the SLI graph and of the STRING graph at each threshold, from the highest
+    threshold down, as compose_sli_string_graph returns it. The node names of the scored graph must be remapped
+    to gene symbols, the SLI graph is given by its node names and the node ids of its edges.
+    """
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+    string_node_names = np.asarray(scored_graph.get_node_names(), dtype=str)
+    sli_node_names = np.asarray(sli_node_names, dtype=str)
+    # GRAPE's composition sorts the node names; singletons never belong to the largest component.
+    node_names = np.unique(np.concatenate([string_node_names, sli_node_names]))
+    string_node_ids = np.searchsorted(node_names, string_node_names)
+    sli_node_ids = np.searchsorted(node_names, sli_node_names)
+    sli_sources = sli_node_ids[np.asarray(sli_sources)]
+    sli_destinations = sli_node_ids[np.asarray(sli_destinations)]
+    number_of_nodes = len(node_names)
+
+    def merge_components(labels, sources, destinations):
+        # The components of the new edges over the current components.
+        number_of_components = int(labels.max()) + 1
+        adjacency = coo_matrix(
+            (np.ones(len(sources), dtype=np.int8), (labels[sources], labels[destinations])),
+            shape=(number_of_components, number_of_components),
+        )
+        return connected_components(adjacency, directed=False)[1][labels]
+
+    labels = merge_components(np.arange(number_of_nodes), sli_sources, sli_destinations)
+    number_of_edges = 0
+    for threshold in sorted(thresholds, reverse=True):
+        start, number_of_edges = number_of_edges, scored_graph.get_number_of_edges(threshold)
+        labels = merge_components(
+            labels,
+            string_node_ids[np.asarray(scored_graph.sources[start:number_of_edges])],
+            string_node_ids[np.asarray(scored_graph.destinations[start:number_of_edges])],
+        )
+        keep = labels == np.argmax(np.bincount(labels))
+        node_ids = np.cumsum(keep) - 1
+        sources = np.concatenate([
+            string_node_ids[np.asarray(scored_graph.sources[:number_of_edges])], sli_sources
+        ])
+        destinations = np.concatenate([
+            string_node_ids[np.asarray(scored_graph.destinations[:number_of_edges])], sli_destinations
+        ])
+        edge_type_ids = np.concatenate([
+            np.zeros(number_of_edges, dtype=np.int32), np.ones(len(sli_sources), dtype=np.int32)
+        ])
+        # Both ends of an edge are in the same component.
+        mask = keep[sources]
+        edges, edge_type_ids = _get_undirected_edges(
+            node_ids[sources[mask]], node_ids[destinations[mask]], edge_type_ids[mask]
+        )
+        yield threshold, node_names[keep], edges, edge_type_ids
+
+
+def write_threshold_graph(path, fingerprint, name, node_names, edges, edge_type_ids, edge_type_names, typed):
+    """
+    Write an undirected graph of the sweep as a prepared graph, with every node of type Gene if typed.
+    """
+    number_of_nodes = len(node_names)
+    write_prepared_arrays(
+        path,
+        fingerprint,
+        name=name,
+        directed=False,
+        node_names=node_names,
+        edges=edges,
+        edge_type_ids=edge_type_ids,
+        edge_type_names=edge_type_names,
+        node_type_names=["Gene"] if typed else [],
+        node_type_offsets=np.arange(number_of_nodes + 1, dtype=np.uint64) if typed
+        else np.zeros(number_of_nodes + 1, dtype=np.uint64),
+        node_type_ids=np.zeros(number_of_nodes if typed else 0, dtype=np.int32),
+    )
+
+
+def _get_prepared_graphs(name, input_patterns, get_parameters, thresholds, write_graphs):
+    """
+    Return the PreparedGraph called name of every threshold, running write_graphs(get_locations) only if some
+    are missing, where get_locations() returns the (path, fingerprint) of every threshold once the inputs exist.
+    """
+    def get_locations():
+        locations = {}
+        for threshold in thresholds:
+            fingerprint = get_input_fingerprint(input_patterns, get_parameters(threshold))
+            path = None if fingerprint is None else os.path.join(PREPARED_GRAPHS_DIRECTORY, f"{name}-{fingerprint}")
+            locations[threshold] = (path, fingerprint)
+        return locations
+
+    locations = get_locations()
+    missing = [threshold for threshold, (path, _) in locations.items() if path is None or not os.path.exists(path)]
+    if missing:
+        with get_tracer().stage("graph_preparation", graph_name=name, thresholds=list(thresholds)):
+            write_graphs(get_locations)
+        # The first preparation may be the one that downloads the inputs.
+        locations = get_locations()
+        for threshold in missing:
+            # The approximate characteristics of every new prepared graph are cached along the way.
+            with get_tracer().stage("network_characteristics", graph_name=name, threshold=threshold):
+                load_network_characteristics(PreparedGraph(locations[threshold][0]))
+    return {threshold: PreparedGraph(path) for threshold, (path, _) in locations.items()}
+
+
+def get_prepared_string_graphs(thresholds=STRING_THRESHOLDS, remap_node_names=True):
+    """
+    Return the prepared STRING graph of every threshold, with the nodes and edges of
+    get_prepared_string_graph(min_edge_weight=threshold), preparing the missing ones in one pass over the
+    scored STRING graph.
+    """
+    def write_graphs(get_locations):
+        scored_graph = get_prepared_scored_string_graph(remap_node_names=remap_node_names)
+        locations = get_locations()
+        for threshold, node_names, edges, edge_type_ids in iter_string_graphs(
+            scored_graph, thresholds, typed=remap_node_names
+        ):
+            path, fingerprint = locations[threshold]
+            if not os.path.exists(path):
+                write_threshold_graph(
+                    path, fingerprint, scored_graph.name, node_names, edges, edge_type_ids,
+                    ["PPI"] if remap_node_names else [], typed=remap_node_names,
+                )
+
+    return _get_prepared_graphs(
+        "string-sweep" if remap_node_names else "string-ensp-sweep",
+        STRING_INPUT_PATTERNS,
+        lambda threshold: dict(min_edge_weight=threshold, remap_node_names=remap_node_names),
+        thresholds,
+        write_graphs,
+    )
+
+
+def get_sli_edges(sli_graph):
+    """
+    Return the node names and the sources and destinations of the edges of the SLI graph.
+    """
+    edges = np.asarray(sli_graph.get_directed_edge_node_ids(), dtype=np.uint32).reshape(-1, 2)
+    return sli_graph.get_node_names(), edges[:, 0], edges[:, 1]
+
+
+def get_prepared_sli_composite_graphs(thresholds=STRING_THRESHOLDS):
+    """
+    Return the prepared SLI|STRING composite graph of every threshold, with the nodes and edges of
+    get_prepared_sli_composite_graph(min_edge_weight=threshold), preparing the missing ones in one pass over
+    the scored STRING graph.
+    """
+    def write_graphs(get_locations):
+        from grape.datasets.kghub import SLDB
+        from node_remapping import get_node_names_remapping
+        scored_graph = get_prepared_scored_string_graph()
+        sli_graph = SLDB()
+        sli_graph = sli_graph.remap_from_node_names_map(
+            get_node_names_remapping(sli_graph, SLDB_NODES_PATH, key_column=0, value_column=2)
+        )
+        name = f"({sli_graph.get_name()} | {scored_graph.name})"
+        locations = get_locations()
+        for threshold, node_names, edges, edge_type_ids in iter_sli_composite_graphs(
+            scored_graph, *get_sli_edges(sli_graph), thresholds
+        ):
+            path, fingerprint = locations[threshold]
+            if not os.path.exists(path):
+                write_threshold_graph(
+                    path, fingerprint, name, node_names, edges, edge_type_ids, ["PPI", "SLI"], typed=True
+                )
+
+    return _get_prepared_graphs(
+        "sli-string-composite-sweep",
+        STRING_INPUT_PATTERNS + SLDB_INPUT_PATTERNS,
+        lambda threshold: dict(min_edge_weight=threshold),
+        thresholds,
+        write_graphs,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dataset", choices=["sli", "string"], help="Graphs to prepare")
+    parser.add_argument("--thresholds", type=int, nargs="+", default=list(STRING_THRESHOLDS),
+                        help="Combined score thresholds")
+    arguments = parser.parse_args()
+    if arguments.dataset == "sli":
+        prepared_graphs = get_prepared_sli_composite_graphs(arguments.thresholds)
+    else:
+        prepared_graphs = get_prepared_string_graphs(arguments.thresholds)
+    for threshold, prepared_graph in sorted(prepared_graphs.items()):
+        print(f"{threshold}: {prepared_graph.get_number_of_nodes()} nodes, "
+              f"{prepared_graph.get_number_of_directed_edges()} directed edges, {prepared_graph.path}")
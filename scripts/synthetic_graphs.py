@@ -0,0 +1,132 @@
+"""
+Synthetic scale-free graphs with the sizes of the datasets of the paper, for benchmarks.
+
+Edges are drawn from a Chung-Lu model with power-law expected degrees, which reproduces the
+heavy-tailed degree distributions (and hence the hubs that drive degree-aware sampling) of
+SLI, STRING and Monarch without needing the real files.
+
+The knowledge graphs also have node types and edge predicates, so that the relabeling of the
+drug to protein (minority_edge) and phenotype to disease (biolink:has_phenotype) edges is
+exercised, and the SLI and STRING graphs come with ENSP identifiers and a gene symbol table,
+so that the remapping and composition of the SLI|STRING graph are exercised too.
+"""
+import numpy as np
+import pandas as pd
+
+# Approximate (number of nodes, number of undirected edges) of the prepared graphs.
+DATASET_SIZES = {
+    "sli": (17_000, 270_000),
+    "string": (17_000, 230_000),
+    "kg_idg": (240_000, 2_000_000),
+    "monarch": (500_000, 8_000_000),
+}
+# Approximate (number of nodes, number of undirected edges) of the SLDB synthetic lethality graph.
+SLDB_SIZE = (10_000, 20_000)
+
+# Share of the nodes of every node type and edge predicates of the synthetic knowledge graphs.
+KNOWLEDGE_GRAPH_SCHEMAS = {
+    "kg_idg": (
+        {"biolink:Protein": 0.5, "biolink:Drug": 0.04, "biolink:ChemicalSubstance": 0.03,
+         "biolink:ChemicalEntity": 0.03, "biolink:Disease": 0.1, "biolink:NamedThing": 0.3},
+        ["biolink:interacts_with", "biolink:related_to"],
+    ),
+    "monarch": (
+        {"biolink:Gene": 0.4, "biolink:PhenotypicFeature": 0.3, "biolink:Disease": 0.1, "biolink:NamedThing": 0.2},
+        ["biolink:has_phenotype", "biolink:interacts_with", "biolink:subclass_of"],
+    ),
+}
+
+
+def generate_scale_free_edges(number_of_nodes, number_of_edges, exponent=2.5, random_state=42):
+    """
+    Return the (sources, destinations) arrays of an undirected Chung-Lu graph, with sources < destinations.
+    Self-loops and parallel edges are dropped, so slightly fewer than number_of_edges edges are returned.
+    """
+    random_state = np.random.default_rng(random_state)
+    weights = np.arange(1, number_of_nodes + 1, dtype=np.float64) ** (-1.0 / (exponent - 1.0))
+    weights /= weights.sum()
+    # Shuffle the node ids, so that the hubs are not all at the start of the CSR.
+    weights = weights[random_state.permutation(number_of_nodes)]
+    sources = random_state.choice(number_of_nodes, size=number_of_edges, p=weights)
+    destinations = random_state.choice(number_of_nodes, size=number_of_edges, p=weights)
+    keep = sources != destinations
+    sources, destinations = sources[keep], destinations[keep]
+    keys = np.unique(np.minimum(sources, destinations) * number_of_nodes + np.maximum(sources, destinations))
+    return np.divmod(keys, number_of_nodes)
+
+
+def edges_to_csr(number_of_nodes, sources, destinations, directed=False):
+    """
+    Return the (offsets, destinations) CSR of the edges, with both directions for undirected graphs.
+    """
+    if not directed:
+        sources, destinations = np.concatenate([sources, destinations]), np.concatenate([destinations, sources])
+    order = np.lexsort((destinations, sources))
+    offsets = np.zeros(number_of_nodes + 1, dtype=np.uint64)
+    np.cumsum(np.bincount(sources, minlength=number_of_nodes), out=offsets[1:])
+    return offsets, destinations[order].astype(np.uint32)
+
+
+def edges_to_grape(number_of_nodes, sources, destinations, directed=False, name="Synthetic"):
+    """
+    Return the GRAPE graph of the edges, whose node ids match the synthetic ids.
+    """
+    from grape import Graph
+    return Graph.from_pd(
+        directed=directed,
+        edges_df=pd.DataFrame({"subject": sources.astype(str), "object": destinations.astype(str)}),
+        nodes_df=pd.DataFrame({"name": np.arange(number_of_nodes).astype(str)}),
+        node_name_column="name",
+        edge_src_column="subject",
+        edge_dst_column="object",
+        name=name,
+    )
+
+
+def _scale_size(size, scale):
+    return max(10, int(size[0] * scale)), max(10, int(size[1] * scale))
+
+
+def generate_knowledge_graph(dataset, scale=1.0, random_state=42):
+    """
+    Return the (nodes, edges) dataframes of a synthetic knowledge graph with the size and schema of the dataset,
+    in the format of the KG-Hub and Monarch TSVs: id and category columns, subject, predicate and object columns.
+    """
+    node_types, predicates = KNOWLEDGE_GRAPH_SCHEMAS[dataset]
+    number_of_nodes, number_of_edges = _scale_size(DATASET_SIZES[dataset], scale)
+    sources, destinations = generate_scale_free_edges(number_of_nodes, number_of_edges, random_state=random_state)
+    random_state = np.random.default_rng(random_state)
+    names = np.char.add(f"{dataset.upper()}:", np.arange(number_of_nodes).astype(str))
+    nodes = pd.DataFrame({
+        "id": names,
+        "category": random_state.choice(list(node_types), size=number_of_nodes, p=list(node_types.values())),
+    })
+    edges = pd.DataFrame({
+        "subject": names[sources],
+        "predicate": random_state.choice(predicates, size=len(sources)),
+        "object": names[destinations],
+    })
+    return nodes, edges
+
+
+def generate_sli_string_graphs(scale=1.0, random_state=42):
+    """
+    Return the STRING edges (ENSP identifiers), the STRING protein info table (ENSP to gene symbol)
+    and the SLDB edges (gene symbols) of a synthetic SLI|STRING dataset.
+    SLDB genes are a subset of the STRING proteins, plus a few genes that are not in STRING.
+    """
+    number_of_nodes, number_of_edges = _scale_size(DATASET_SIZES["string"], scale)
+    sources, destinations = generate_scale_free_edges(number_of_nodes, number_of_edges, random_state=random_state)
+    proteins = np.char.add("9606.ENSP", np.char.zfill(np.arange(number_of_nodes).astype(str), 11))
+    symbols = np.char.add("GENE", np.arange(number_of_nodes).astype(str))
+    string_edges = pd.DataFrame({"protein1": proteins[sources], "protein2": proteins[destinations]})
+    info = pd.DataFrame({"string_protein_id": proteins, "preferred_name": symbols})
+    number_of_sli_nodes, number_of_sli_edges = _scale_size(SLDB_SIZE, scale)
+    sli_sources, sli_destinations = generate_scale_free_edges(
+        number_of_sli_nodes, number_of_sli_edges, random_state=random_state + 1
+    )
+    # The last tenth of the SLDB genes are not STRING proteins.
+    first_sli_gene = max(0, number_of_nodes - int(number_of_sli_nodes * 0.9))
+    sli_symbols = np.char.add("GENE", (np.arange(number_of_sli_nodes) + first_sli_gene).astype(str))
+    sli_edges = pd.DataFrame({"subject": sli_symbols[sli_sources], "object": sli_symbols[sli_destinations]})
+    return string_edges, info, sli_edges
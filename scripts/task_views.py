@@ -0,0 +1,243 @@
+"""
+Edge prediction tasks defined over the prepared graphs, and their subgraphs of interest as views.
+
+A task is a relation plus, optionally, the node types of its sources and destinations, like
+GRAPE's replace_edge_type_name_from_edge_node_type_names_inplace: drug to protein, phenotype to
+disease or gene to disease edges of the Monarch KG. Rather than relabeling and filtering a copy of
+the whole graph for every task, the node types of a prepared graph are stored once as one bitmask
+per node type, and its edges once sorted by edge type (the edge-type index), in a task_index
+directory next to the prepared arrays. The edges of a task are then a vectorized mask over the
+source and destination node types, together with the range of the edge-type index of the relation
+if the graph already has it (as filter_from_names keeps after relabeling), or only that range for
+untyped tasks such as SLI. The subgraph of interest is a SubgraphView: the sorted ids of the task
+edges over the memory-mapped arrays of the parent graph, with the same interface as PreparedGraph.
+Only its to_grape method builds a GRAPE graph, the one GRAPE's evaluation needs.
+
+Usage from the scripts directory:
+
+    from task_views import PredictionTask, get_task_view
+    view = get_task_view(prepared_graph, PredictionTask("gene_to_disease", ["biolink:Gene"], ["biolink:Disease"]))
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+
+import numpy as np
+
+# The edges of a task are the edges from a node of any of source_node_types to a node of any of
+# destination_node_types (in either direction if undirected) and the edges of type relation.
+PredictionTask = namedtuple(
+    "PredictionTask",
+    ["relation", "source_node_types", "destination_node_types"],
+    defaults=[None, None],
+)
+
+# Task indices and views of the prepared graphs loaded by this process, by path.
+_task_indices = {}
+_task_views = {}
+
+
+def write_task_index(prepared_graph, path):
+    """
+    Write the node type bitmasks and the edge-type index of the prepared graph to path.
+    The directory is written under a temporary name and renamed into place.
+    """
+    number_of_nodes = prepared_graph.get_number_of_nodes()
+    node_type_offsets = np.asarray(prepared_graph.node_type_offsets, dtype=np.int64)
+    node_ids = np.repeat(np.arange(number_of_nodes), np.diff(node_type_offsets))
+    node_types = np.zeros((len(prepared_graph.get_node_type_names()), number_of_nodes), dtype=bool)
+    node_types[np.asarray(prepared_graph.node_type_ids), node_ids] = True
+    # Untyped edges (-1) come first, then the edges of every edge type, each in CSR order.
+    edge_type_ids = np.asarray(prepared_graph.edge_type_ids, dtype=np.int64) + 1
+    edge_type_order = np.argsort(edge_type_ids, kind="stable").astype(
+        np.uint32 if len(edge_type_ids) < 2**32 else np.uint64
+    )
+    edge_type_offsets = np.zeros(len(prepared_graph.get_edge_type_names()) + 2, dtype=np.uint64)
+    np.cumsum(np.bincount(edge_type_ids, minlength=len(edge_type_offsets) - 1), out=edge_type_offsets[1:])
+
+    parent = os.path.dirname(os.path.abspath(path))
+    tmp_path = tempfile.mkdtemp(dir=parent, prefix=".tmp_")
+    np.save(os.path.join(tmp_path, "node_type_bitmasks.npy"), np.packbits(node_types, axis=1))
+    np.save(os.path.join(tmp_path, "edge_type_order.npy"), edge_type_order)
+    np.save(os.path.join(tmp_path, "edge_type_offsets.npy"), edge_type_offsets)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # Another job wrote the same index in the meantime.
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+class TaskIndex:
+    """
+    Node type bitmasks and edge-type index of a prepared graph, memory-mapped from its task_index directory.
+    """
+
+    def __init__(self, prepared_graph):
+        self.prepared_graph = prepared_graph
+        path = os.path.join(prepared_graph.path, "task_index")
+        if not os.path.exists(path):
+            write_task_index(prepared_graph, path)
+        self.node_type_bitmasks = np.load(os.path.join(path, "node_type_bitmasks.npy"), mmap_mode="r")
+        self.edge_type_order = np.load(os.path.join(path, "edge_type_order.npy"), mmap_mode="r")
+        self.edge_type_offsets = np.load(os.path.join(path, "edge_type_offsets.npy"), mmap_mode="r")
+
+    def get_node_type_mask(self, node_type_names):
+        """
+        Return the mask of the nodes having any of the node types.
+        """
+        node_type_names_list = self.prepared_graph.get_node_type_names()
+        bitmask = np.zeros(self.node_type_bitmasks.shape[1], dtype=np.uint8)
+        for node_type_name in node_type_names:
+            if node_type_name in node_type_names_list:
+                bitmask |= self.node_type_bitmasks[node_type_names_list.index(node_type_name)]
+        return np.unpackbits(bitmask, count=self.prepared_graph.get_number_of_nodes()).astype(bool)
+
+    def get_edge_type_edge_ids(self, edge_type_name):
+        """
+        Return the sorted ids of the directed edges of the edge type.
+        """
+        edge_type_id = self.prepared_graph.get_edge_type_id(edge_type_name) + 1
+        start, end = self.edge_type_offsets[edge_type_id], self.edge_type_offsets[edge_type_id + 1]
+        # Each range of the index is already in CSR order.
+        return np.asarray(self.edge_type_order[start:end])
+
+    def get_task_edge_ids(self, task):
+        """
+        Return the sorted ids of the directed edges of the task.
+        """
+        if task.source_node_types is None or task.destination_node_types is None:
+            if task.relation not in self.prepared_graph.get_edge_type_names():
+                raise ValueError(f"The graph has no edge type {task.relation} and the task has no node types")
+            return self.get_edge_type_edge_ids(task.relation)
+        source_mask = self.get_node_type_mask(task.source_node_types)
+        destination_mask = self.get_node_type_mask(task.destination_node_types)
+        sources = self.prepared_graph.get_sources()
+        destinations = np.asarray(self.prepared_graph.destinations)
+        mask = source_mask[sources] & destination_mask[destinations]
+        if not self.prepared_graph.is_directed():
+            mask |= source_mask[destinations] & destination_mask[sources]
+        edge_ids = np.flatnonzero(mask)
+        # After relabeling, the edges that already had the relation as edge type (e.g. gene to phenotype
+        # biolink:has_phenotype edges in Monarch) are edges of the task too, as in the holdouts.
+        if task.relation in self.prepared_graph.get_edge_type_names():
+            edge_ids = np.union1d(edge_ids, self.get_edge_type_edge_ids(task.relation))
+        return edge_ids
+
+
+class SubgraphView:
+    """
+    Read-only CSR view of the edges of a task over the arrays of its parent prepared graph, with the interface
+    of PreparedGraph. The nodes, node names and node types are those of the parent; only the CSR offsets are
+    computed, and the destinations and edge types of the view are gathered on first use.
+    """
+
+    def __init__(self, parent, task, edge_ids):
+        self.parent = parent
+        self.task = task
+        self.edge_ids = edge_ids
+        self.name = f"{parent.name} {task.relation}"
+        self.fingerprint = "-".join([parent.fingerprint, hashlib.sha256(
+            json.dumps(list(task), default=str).encode("utf8")
+        ).hexdigest()[:8]])
+        # The edge ids are sorted, so the edges of node i are those between the offsets of i in the parent.
+        self.offsets = np.searchsorted(edge_ids, np.asarray(parent.offsets)).astype(np.uint64)
+        self.node_type_offsets = parent.node_type_offsets
+        self.node_type_ids = parent.node_type_ids
+        self._destinations = None
+
+    @property
+    def destinations(self):
+        if self._destinations is None:
+            self._destinations = np.asarray(self.parent.destinations)[self.edge_ids]
+        return self._destinations
+
+    @property
+    def edge_type_ids(self):
+        return np.asarray(self.parent.edge_type_ids)[self.edge_ids]
+
+    def is_directed(self):
+        return self.parent.is_directed()
+
+    def get_number_of_nodes(self):
+        return self.parent.get_number_of_nodes()
+
+    def get_number_of_directed_edges(self):
+        return len(self.edge_ids)
+
+    def get_node_names(self):
+        return self.parent.get_node_names()
+
+    def get_edge_type_names(self):
+        return self.parent.get_edge_type_names()
+
+    def get_node_type_names(self):
+        return self.parent.get_node_type_names()
+
+    def get_edge_type_id(self, edge_type_name):
+        return self.parent.get_edge_type_id(edge_type_name)
+
+    def get_node_degrees(self):
+        return np.diff(self.offsets).astype(np.uint32)
+
+    def get_sources(self):
+        return np.repeat(
+            np.arange(self.get_number_of_nodes(), dtype=np.uint32),
+            self.get_node_degrees()
+        )
+
+    def get_neighbours(self, node_id):
+        return self.parent.destinations[self.edge_ids[self.offsets[node_id]:self.offsets[node_id + 1]]]
+
+    def to_grape(self, graph):
+        """
+        Return the subgraph of interest of graph, the GRAPE graph of the parent, keeping all its nodes.
+        """
+        sources = self.get_sources()
+        destinations = self.destinations
+        mask = slice(None) if self.is_directed() else sources <= destinations
+        return graph.filter_from_ids(
+            edge_node_ids_to_keep=list(zip(sources[mask].tolist(), destinations[mask].tolist()))
+        )
+
+
+def get_task_index(prepared_graph):
+    """
+    Return the TaskIndex of the prepared graph, loading or writing it once per process.
+    """
+    if prepared_graph.path not in _task_indices:
+        _task_indices[prepared_graph.path] = TaskIndex(prepared_graph)
+    return _task_indices[prepared_graph.path]
+
+
+def get_task_view(prepared_graph, task):
+    """
+    Return the SubgraphView of the edges of the task in the prepared graph.
+    """
+    key = (prepared_graph.path, json.dumps(list(task)))
+    if key not in _task_views:
+        _task_views[key] = SubgraphView(
+            prepared_graph, task, get_task_index(prepared_graph).get_task_edge_ids(task)
+        )
+    return _task_views[key]
+
+
+def relabel_graph_inplace(graph, task):
+    """
+    Set the edge type of the edges of the task in the GRAPE graph to its relation. The relation may already be
+    an edge type of the graph (biolink:has_phenotype in Monarch): the edges between the node types of the task
+    are relabeled all the same. Untyped tasks are left as they are.
+    """
+    if task.source_node_types is None or task.destination_node_types is None:
+        if not graph.has_edge_types() or not graph.has_edge_type_name(task.relation):
+            raise ValueError(f"The graph has no edge type {task.relation} and the task has no node types")
+        return graph
+    # As in TaskIndex.get_node_type_mask, node types missing from the graph are ignored rather than rejected.
+    graph.replace_edge_type_name_from_edge_node_type_names_inplace(
+        edge_type_name=task.relation,
+        source_node_type_names=[name for name in task.source_node_types if graph.has_node_type_name(name)],
+        destination_node_type_names=[name for name in task.destination_node_types if graph.has_node_type_name(name)],
+    )
+    return graph
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# The caches of the pipeline are created at import time: they go to a temporary directory.
+_CACHE_DIRECTORY = tempfile.mkdtemp(prefix="negative-example-selection-tests-")
+os.environ.setdefault("GRAPH_CACHE_DIR", os.path.join(_CACHE_DIRECTORY, "graphs"))
+os.environ.setdefault("EXPERIMENTS_DIR", os.path.join(_CACHE_DIRECTORY, "experiments"))
+# The scripts import each other as top-level modules.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from negative_sampling import NegativeSampler, get_edge_keys
+
+
+def get_toy_csr():
+    """
+    Return the (offsets, destinations) CSR of an undirected path 0 - 1 - ... - 9, storing both directions.
+    """
+    sources = np.arange(9)
+    pairs = np.concatenate([np.stack([sources, sources + 1], axis=1), np.stack([sources + 1, sources], axis=1)])
+    pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+    offsets = np.zeros(11, dtype=np.uint64)
+    np.cumsum(np.bincount(pairs[:, 0], minlength=10), out=offsets[1:])
+    return offsets, pairs[:, 1].astype(np.uint32)
+
+
+@pytest.mark.parametrize("use_scale_free_distribution", [False, True])
+def test_restricted_undirected_pairs_are_canonical(use_scale_free_distribution):
+    offsets, destinations = get_toy_csr()
+    # The sources have higher ids than the destinations, so every drawn pair must be swapped.
+    sampler = NegativeSampler(
+        offsets,
+        destinations,
+        use_scale_free_distribution=use_scale_free_distribution,
+        source_node_ids=np.arange(5, 10),
+        destination_node_ids=np.arange(0, 5),
+    )
+    edge_keys = get_edge_keys(offsets, destinations, 10)
+    batches = [sampler.sample(15, random_state=1)] + list(sampler.iter_batches(30, random_state=2, batch_size=8))
+    for pairs in batches:
+        assert (pairs[:, 0] < pairs[:, 1]).all()
+        assert (pairs[:, 0] < 5).all() and (pairs[:, 1] >= 5).all()
+        assert not np.isin(pairs[:, 0] * 10 + pairs[:, 1], edge_keys).any()
+    # (4, 5) is the only edge between the two sets, so 24 distinct negative pairs remain.
+    assert len(np.unique(batches[0], axis=0)) == 15
+    with pytest.raises(ValueError):
+        sampler.sample(25, random_state=1)
+
+
+def test_restricted_directed_pairs_keep_their_sets():
+    offsets, destinations = get_toy_csr()
+    sampler = NegativeSampler(
+        offsets, destinations, directed=True, source_node_ids=np.arange(5, 10), destination_node_ids=np.arange(0, 5)
+    )
+    pairs = sampler.sample(20, random_state=1)
+    assert (pairs[:, 0] >= 5).all() and (pairs[:, 1] < 5).all()
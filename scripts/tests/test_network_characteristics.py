@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from network_characteristics import get_network_characteristics
+
+
+def get_toy_multigraph_csr():
+    """
+    Return the CSR of the triangle 0 - 1 - 2 with the pendant node 3 attached to 2,
+    where the edge 0 - 1 is doubled (as edges of two types) and node 3 has a self-loop.
+    """
+    edges = np.array([[0, 1], [0, 1], [1, 2], [0, 2], [2, 3]])
+    pairs = np.concatenate([edges, edges[:, ::-1], [[3, 3]]])
+    pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+    offsets = np.zeros(5, dtype=np.int64)
+    np.cumsum(np.bincount(pairs[:, 0], minlength=4), out=offsets[1:])
+    return offsets, pairs[:, 1]
+
+
+@pytest.mark.parametrize("approximate", [False, True])
+def test_triangles_ignore_parallel_edges_and_self_loops(approximate):
+    characteristics = get_network_characteristics(
+        *get_toy_multigraph_csr(), approximate=approximate, number_of_wedges=2**16, number_of_threads=1
+    )
+    # One triangle among the 5 wedges of the simple graph; the clustering coefficients are 1, 1, 1/3 and 0.
+    tolerance = 0.02 if approximate else 1e-9
+    assert characteristics["transitivity"] == pytest.approx(0.6, abs=tolerance)
+    assert characteristics["triangles"] == pytest.approx(1.0, abs=5 * tolerance / 3)
+    assert characteristics["clustering_coefficient"] == pytest.approx(7 / 12, abs=tolerance)
+    assert characteristics["self_loops"] == 1
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from results_analysis import (MODEL_SAMPLING_COLUMN, SOURCE_COLUMNS, SUMMARY_METRICS, extract_core_results,
+                              get_mean_and_sd)
+from results_store import append_results, normalize_results, read_results
+
+
+def get_toy_results(number_of_holdouts=3):
+    """
+    Return raw results of a model that reports no AUPRC and has no use_scale_free_distribution parameter,
+    with the column names of the TSVs written by the run scripts.
+    """
+    results = pd.DataFrame({
+        "evaluation_mode": ["test"] * number_of_holdouts,
+        "features_names": ["HOPE"] * number_of_holdouts,
+        "use_scale_free_distribution": [True] * number_of_holdouts,
+        "('model_parameters', 'use_scale_free_distribution')": [None] * number_of_holdouts,
+        "holdout_number": np.arange(number_of_holdouts),
+    })
+    for metric in ["accuracy", "precision", "recall", "specificity"] + list(SUMMARY_METRICS):
+        results[metric] = np.linspace(0.5, 0.7, number_of_holdouts)
+    results["auprc"] = pd.Series([None] * number_of_holdouts, dtype=object)
+    return results
+
+
+def test_all_missing_columns_stay_missing():
+    results = normalize_results(get_toy_results())
+    assert results["auprc"].dtype == object and results["auprc"].isna().all()
+    assert results[MODEL_SAMPLING_COLUMN].dtype == object
+    core = extract_core_results(results)
+    assert (core["evaluation_negative_sampling_method"] == "DANS").all()
+    assert core["model_negative_sampling_method"].isna().all()
+
+
+def test_summary_with_a_missing_metric(tmp_path):
+    results = get_toy_results()
+    results["('model_parameters', 'use_scale_free_distribution')"] = [False, True, False]
+    append_results(results, "toy", "cell", directory=str(tmp_path))
+    stats = get_mean_and_sd(extract_core_results(read_results(columns=SOURCE_COLUMNS, directory=str(tmp_path))))
+    assert len(stats) == 2
+    assert stats["AUPRC.mean"].isna().all()
+    assert np.allclose(stats.loc[stats["model_neg_sampling"] == "UNS", "AUROC.mean"], 0.6)
@@ -0,0 +1,42 @@
+import json
+import os
+
+import pandas as pd
+
+import experiment_grid
+import sharding
+
+CELL = dict(cell_id="train_size=0.75-HOPE", train_size=0.75, embedder="HOPE", embedder_parameters={})
+
+
+def evaluate_toy_cell(config, task, cell, holdout_numbers=None, aggregate=True):
+    """
+    Return results shaped as those of evaluate_cell: for every holdout, one row per validation sampling mode
+    and model, ordered by validation sampling mode and then holdout.
+    """
+    results = pd.DataFrame([
+        dict(holdout_number=holdout_number, use_scale_free_distribution=validation, model=model)
+        for holdout_number in holdout_numbers
+        for validation in (False, True)
+        for model in ("DANS", "UNS")
+    ])
+    return experiment_grid.order_cell_results(config, results)
+
+
+def test_merged_shards_keep_the_unsharded_order(tmp_path, monkeypatch):
+    config_path = tmp_path / "toy.json"
+    config_path.write_text(json.dumps(dict(
+        name="toy", number_of_holdouts=3, results_store=False, output=str(tmp_path / "toy.tsv")
+    )))
+    monkeypatch.setattr(experiment_grid, "EXPERIMENTS_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(sharding, "get_grid_cells", lambda config: [CELL])
+    monkeypatch.setattr(sharding, "evaluate_cell", evaluate_toy_cell)
+    monkeypatch.setattr(sharding, "load_aggregator", lambda config, cells: None)
+    config = sharding.load_grid_config(str(config_path))
+    os.makedirs(sharding.get_shards_directory(config))
+    for unit in sharding.get_work_units(config):
+        sharding.run_work_unit(config, None, unit)
+    merged = sharding.merge_shards(str(config_path))
+    unsharded = evaluate_toy_cell(config, None, CELL, holdout_numbers=range(3))
+    assert merged.reset_index(drop=True).equals(unsharded.reset_index(drop=True))
+    assert merged["use_scale_free_distribution"].tolist() == [True] * 6 + [False] * 6
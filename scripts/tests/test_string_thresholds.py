@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+from grape import Graph
+
+from graph_preparation import PreparedGraph, filter_string_graph, write_prepared_graph
+from string_thresholds import (ScoredStringGraph, get_string_node_names, iter_string_graphs,
+                               write_scored_string_graph, write_threshold_graph)
+
+THRESHOLD = 700
+
+
+def get_toy_string_graph():
+    edges = pd.DataFrame({
+        "protein1": ["9606.E3", "9606.E1", "9606.E2", "9606.E4", "9606.E5", "9606.E6"],
+        "protein2": ["9606.E1", "9606.E2", "9606.E4", "9606.E5", "9606.E3", "9606.E7"],
+        "combined_score": [900.0, 500.0, 700.0, 300.0, 800.0, 950.0],
+    })
+    nodes = pd.DataFrame({"name": [f"9606.E{i}" for i in range(1, 9)], "category": "protein"})
+    return Graph.from_pd(
+        directed=False,
+        edges_df=edges,
+        nodes_df=nodes,
+        node_name_column="name",
+        node_type_column="category",
+        edge_src_column="protein1",
+        edge_dst_column="protein2",
+        edge_weight_column="combined_score",
+        name="ToyString",
+    )
+
+
+def write_toy_info(tmp_path):
+    # E1 and E3 have the same gene symbol, as happens in the STRING protein info table.
+    path = str(tmp_path / "protein.info.txt")
+    pd.DataFrame({
+        "#string_protein_id": [f"9606.E{i}" for i in range(1, 9)],
+        "preferred_name": ["A", "B", "A", "C", "D", "E", "F", "G"],
+    }).to_csv(path, sep="\t", index=False)
+    return path
+
+
+def prepare_both(tmp_path, info_path):
+    """
+    Return the prepared graphs at THRESHOLD of the single graph chain and of the sweep.
+    """
+    string_graph = get_toy_string_graph()
+    path = str(tmp_path / "single")
+    write_prepared_graph(filter_string_graph(string_graph, THRESHOLD, info_path=info_path), path, "toy")
+    scored_path = str(tmp_path / "scored")
+    write_scored_string_graph(
+        string_graph.remove_node_types(), scored_path, "toy", get_string_node_names(string_graph, info_path)
+    )
+    typed = info_path is not None
+    (_, node_names, edges, edge_type_ids), = iter_string_graphs(ScoredStringGraph(scored_path), [THRESHOLD], typed)
+    sweep_path = str(tmp_path / "sweep")
+    write_threshold_graph(
+        sweep_path, "toy", "ToyString", node_names, edges, edge_type_ids, ["PPI"] if typed else [], typed
+    )
+    return PreparedGraph(path), PreparedGraph(sweep_path)
+
+
+def get_named_edges(prepared_graph):
+    node_names = np.asarray(prepared_graph.get_node_names())
+    return sorted(set(zip(
+        node_names[prepared_graph.get_sources()].tolist(),
+        node_names[np.asarray(prepared_graph.destinations)].tolist(),
+    )))
+
+
+def test_sweep_matches_the_ensp_string_graph(tmp_path):
+    single, sweep = prepare_both(tmp_path, info_path=None)
+    assert list(sweep.get_node_names()) == list(single.get_node_names())
+    for array in ("offsets", "destinations", "edge_type_ids"):
+        np.testing.assert_array_equal(getattr(sweep, array), getattr(single, array))
+
+
+def test_sweep_merges_nodes_with_the_same_gene_symbol(tmp_path):
+    single, sweep = prepare_both(tmp_path, info_path=write_toy_info(tmp_path))
+    assert sorted(sweep.get_node_names()) == sorted(single.get_node_names())
+    assert get_named_edges(sweep) == get_named_edges(single)
+    assert ("A", "A") in get_named_edges(sweep)
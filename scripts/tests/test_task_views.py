@@ -0,0 +1,52 @@
+import pandas as pd
+from grape import Graph
+
+from graph_preparation import PreparedGraph, write_prepared_graph
+from task_views import PredictionTask, get_task_view, relabel_graph_inplace
+
+PHENOTYPE_DISEASE_TASK = PredictionTask("biolink:has_phenotype", ("biolink:PhenotypicFeature",), ("biolink:Disease",))
+
+
+def get_toy_monarch_graph():
+    """
+    Return a toy Monarch graph, where phenotype to disease edges have another predicate than
+    the gene to phenotype biolink:has_phenotype edges.
+    """
+    nodes = pd.DataFrame({
+        "id": ["P1", "P2", "D1", "D2", "G1", "G2"],
+        "category": ["biolink:PhenotypicFeature"] * 2 + ["biolink:Disease"] * 2 + ["biolink:Gene"] * 2,
+    })
+    edges = pd.DataFrame({
+        "subject": ["P1", "P2", "G1", "G2", "G1", "D1"],
+        "object": ["D1", "D2", "P1", "P2", "G2", "D2"],
+        "predicate": ["biolink:related_to", "biolink:related_to", "biolink:has_phenotype", "biolink:has_phenotype",
+                      "biolink:interacts_with", "biolink:subclass_of"],
+    })
+    return Graph.from_pd(
+        directed=False,
+        edges_df=edges,
+        nodes_df=nodes,
+        node_name_column="id",
+        node_type_column="category",
+        edge_src_column="subject",
+        edge_dst_column="object",
+        edge_type_column="predicate",
+        name="ToyMonarch",
+    )
+
+
+def get_edge_names(graph):
+    return sorted(tuple(sorted(edge)) for edge in graph.get_edge_node_names(directed=False))
+
+
+def test_task_view_keeps_the_edges_of_an_existing_relation(tmp_path):
+    graph = get_toy_monarch_graph()
+    path = str(tmp_path / "toy_monarch")
+    write_prepared_graph(graph, path, fingerprint="toy")
+    prepared_graph = PreparedGraph(path)
+    # As the baseline: relabel, then keep every edge of the relation.
+    relabel_graph_inplace(graph, PHENOTYPE_DISEASE_TASK)
+    expected = graph.filter_from_names(edge_type_names_to_keep=[PHENOTYPE_DISEASE_TASK.relation])
+    view = get_task_view(prepared_graph, PHENOTYPE_DISEASE_TASK)
+    assert get_edge_names(view.to_grape(graph)) == get_edge_names(expected)
+    assert get_edge_names(expected) == [("D1", "P1"), ("D2", "P2"), ("G1", "P1"), ("G2", "P2")]
@@ -0,0 +1,337 @@
+"""
+Random walk corpus shared by the walk-based embedders of a holdout.
+
+The grids train DeepWalk CBOW, DeepWalk SkipGram, Walklets CBOW and Walklets SkipGram on the
+same holdout training graph, and each of GRAPE's Rust models generates its own random walks.
+Here the walks are generated once per (training graph, walk length, walks per node, walk
+parameters, random state) with graph.complete_walks, one walk per node at a time, and stored in
+experiments/walks as an int32 .npy file that is memory-mapped when loaded, so that all the
+embedders and concurrent workers read the same corpus through the page cache.
+
+GRAPE's models cannot be trained on an external corpus, so the corpus is consumed by the NumPy
+word2vec trainers below (SkipGram and CBOW with negative sampling, streaming mini-batches of walks
+from the memory-mapped corpus). with_walk_corpus wraps a GRAPE walk-based embedder class so that it
+keeps its model name and parameters but is trained from the shared corpus: DeepWalk uses the
+context nodes within window_size steps, Walklets one model of embedding_size // window_size
+dimensions per scale k = 1, ..., window_size trained on the nodes exactly k steps apart, as GRAPE's.
+The library name of the wrapped embedders is NumPy, so their stored embeddings and results rows
+are distinct from those of the Rust models. Negatives are drawn from the node frequencies in the
+corpus raised to 3/4 with use_scale_free_distribution, uniformly otherwise.
+
+Usage:
+
+    python walk_corpus.py [--walk-length 128] [--iterations 10] sli string kg_idg monarch
+"""
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from instrumentation import get_tracer
+from negative_sampling import build_alias_table, sample_from_alias_table
+
+WALK_CORPUS_DIRECTORY = os.path.join(os.environ.get("EXPERIMENTS_DIR", "./experiments"), "walks")
+# Parameters of the embedders that determine the walks, with the defaults of GRAPE.
+WALK_PARAMETERS = {
+    "walk_length": 128,
+    "iterations": 10,
+    "return_weight": 1.0,
+    "explore_weight": 1.0,
+    "max_neighbours": 100,
+    "normalize_by_degree": False,
+    "random_state": 42,
+}
+# Walks of a mini-batch of the trainers.
+DEFAULT_NUMBER_OF_WALKS_PER_BATCH = 64
+
+
+def get_walk_corpus_path(graph, **walk_parameters):
+    """
+    Return the path of the corpus of the walks of graph with the given walk parameters.
+    """
+    walk_parameters = dict(WALK_PARAMETERS, **walk_parameters)
+    key = hashlib.sha256(json.dumps(
+        [graph.hash(), walk_parameters],
+        sort_keys=True,
+        default=str,
+    ).encode("utf8")).hexdigest()[:24]
+    return os.path.join(WALK_CORPUS_DIRECTORY, f"{key}.npy")
+
+
+def write_walk_corpus(graph, path, **walk_parameters):
+    """
+    Generate the walks of graph into an int32 .npy file at path, writing under a temporary name and renaming into place.
+    The walks of each iteration (one per node) are generated and written separately, so that only one
+    iteration is held in memory.
+    """
+    walk_parameters = dict(WALK_PARAMETERS, **walk_parameters)
+    iterations = walk_parameters.pop("iterations")
+    random_state = walk_parameters.pop("random_state")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    corpus = None
+    for iteration in range(iterations):
+        walks = graph.complete_walks(iterations=1, random_state=random_state + iteration, **walk_parameters)
+        if corpus is None:
+            corpus = np.lib.format.open_memmap(
+                tmp_path, mode="w+", dtype=np.int32, shape=(iterations * len(walks), walks.shape[1])
+            )
+        corpus[iteration * len(walks):(iteration + 1) * len(walks)] = walks
+    corpus.flush()
+    del corpus
+    os.replace(tmp_path, path)
+
+
+def load_walk_corpus(graph, **walk_parameters):
+    """
+    Return the memory-mapped (number of walks, walk length) int32 corpus of the walks of graph,
+    generating it on first use.
+    """
+    path = get_walk_corpus_path(graph, **walk_parameters)
+    if not os.path.exists(path):
+        with get_tracer().stage("walk_corpus", graph_name=graph.get_name()):
+            write_walk_corpus(graph, path, **walk_parameters)
+    return np.load(path, mmap_mode="r")
+
+
+def _sigmoid(values):
+    return 0.5 * (1.0 + np.tanh(0.5 * values))
+
+
+def _add_rows(matrix, rows, values):
+    """
+    Add the rows of values to the rows of matrix, summing the values of repeated rows.
+    The sums are a sparse product, much faster than np.add.at.
+    """
+    from scipy.sparse import csr_matrix
+    unique_rows, inverse = np.unique(rows, return_inverse=True)
+    summation = csr_matrix(
+        (np.ones(len(rows), dtype=values.dtype), (inverse, np.arange(len(rows)))),
+        shape=(len(unique_rows), len(rows)),
+    )
+    matrix[unique_rows] += summation @ values
+
+
+def _get_pair_slices(distance):
+    """
+    Return the slices of the walk positions of the nodes and of their contexts at the given distance, before and after.
+    """
+    return (
+        (slice(None, -distance), slice(distance, None)),
+        (slice(distance, None), slice(None, -distance)),
+    )
+
+
+def _skipgram_step(central, contextual, walks, distances, negative_node_ids, learning_rate, clipping_value):
+    """
+    Update the embeddings with the (node, context node) pairs of a batch of walks.
+    The rows of the nodes of the walks are gathered once, and the pairs at each distance are slices of them.
+    The pairs of a walk share its negatives, so the negative terms of a node are the same for all its
+    contexts and are computed once, weighted by its number of contexts.
+    """
+    sources = central[walks]
+    destinations = contextual[walks]
+    negative_embeddings = contextual[negative_node_ids]
+    source_gradients = np.zeros_like(sources)
+    destination_gradients = np.zeros_like(destinations)
+    number_of_contexts = np.zeros(walks.shape, dtype=np.float32)
+    for distance in distances:
+        for source_slice, destination_slice in _get_pair_slices(distance):
+            scores = np.clip(
+                np.einsum("bld,bld->bl", sources[:, source_slice], destinations[:, destination_slice]),
+                -clipping_value, clipping_value,
+            )
+            # Gradient of the log-likelihood of the positive pairs.
+            gradients = ((1.0 - _sigmoid(scores)) * learning_rate)[:, :, None]
+            source_gradients[:, source_slice] += gradients * destinations[:, destination_slice]
+            destination_gradients[:, destination_slice] += gradients * sources[:, source_slice]
+            number_of_contexts[:, source_slice] += 1
+    negative_scores = np.clip(
+        np.matmul(sources, negative_embeddings.transpose(0, 2, 1)), -clipping_value, clipping_value
+    )
+    negative_gradients = -_sigmoid(negative_scores) * learning_rate * number_of_contexts[:, :, None]
+    source_gradients += np.matmul(negative_gradients, negative_embeddings)
+    embedding_size = central.shape[1]
+    _add_rows(central, walks.ravel(), source_gradients.reshape(-1, embedding_size))
+    _add_rows(
+        contextual,
+        np.concatenate([walks.ravel(), negative_node_ids.ravel()]),
+        np.concatenate([
+            destination_gradients.reshape(-1, embedding_size),
+            np.matmul(negative_gradients.transpose(0, 2, 1), sources).reshape(-1, embedding_size),
+        ]),
+    )
+
+
+def _cbow_step(central, contextual, walks, distances, negative_node_ids, learning_rate, clipping_value):
+    """
+    Update the embeddings with the mean of the context nodes of every node of a batch of walks, predicting the node.
+    central holds the embeddings of the context nodes and contextual those of the predicted nodes.
+    The nodes of a walk share its negatives.
+    """
+    contexts = central[walks]
+    targets = contextual[walks]
+    negative_embeddings = contextual[negative_node_ids]
+    hidden = np.zeros_like(contexts)
+    number_of_contexts = np.zeros(walks.shape, dtype=np.float32)
+    for distance in distances:
+        for target_slice, context_slice in _get_pair_slices(distance):
+            hidden[:, target_slice] += contexts[:, context_slice]
+            number_of_contexts[:, target_slice] += 1
+    hidden /= np.maximum(number_of_contexts, 1)[:, :, None]
+    scores = np.clip(np.einsum("bld,bld->bl", hidden, targets), -clipping_value, clipping_value)
+    gradients = ((1.0 - _sigmoid(scores)) * learning_rate)[:, :, None]
+    negative_scores = np.clip(
+        np.matmul(hidden, negative_embeddings.transpose(0, 2, 1)), -clipping_value, clipping_value
+    )
+    negative_gradients = -_sigmoid(negative_scores) * learning_rate
+    hidden_gradients = gradients * targets + np.matmul(negative_gradients, negative_embeddings)
+    # As word2vec, the gradient of the mean is added to every context node.
+    context_gradients = np.zeros_like(contexts)
+    for distance in distances:
+        for target_slice, context_slice in _get_pair_slices(distance):
+            context_gradients[:, context_slice] += hidden_gradients[:, target_slice]
+    embedding_size = central.shape[1]
+    _add_rows(central, walks.ravel(), context_gradients.reshape(-1, embedding_size))
+    _add_rows(
+        contextual,
+        np.concatenate([walks.ravel(), negative_node_ids.ravel()]),
+        np.concatenate([
+            (gradients * hidden).reshape(-1, embedding_size),
+            np.matmul(negative_gradients.transpose(0, 2, 1), hidden).reshape(-1, embedding_size),
+        ]),
+    )
+
+
+def train_word2vec(
+    corpus,
+    number_of_nodes,
+    model="SkipGram",
+    distances=(1, 2, 3, 4, 5),
+    embedding_size=100,
+    epochs=30,
+    number_of_negative_samples=10,
+    clipping_value=6.0,
+    learning_rate=0.01,
+    learning_rate_decay=0.9,
+    use_scale_free_distribution=True,
+    random_state=42,
+    number_of_walks_per_batch=DEFAULT_NUMBER_OF_WALKS_PER_BATCH,
+):
+    """
+    Return the float32 (central, contextual) node embeddings of a SkipGram or CBOW model trained on the walks of corpus.
+    The context of a node are the nodes at the given distances from it along the walk, before and after it.
+    Every epoch streams the walks in a shuffled order of mini-batches, with the learning rate decayed once per epoch.
+    """
+    if model not in ("SkipGram", "CBOW"):
+        raise ValueError(f"Unknown model {model}, expected SkipGram or CBOW")
+    random_state = np.random.default_rng(random_state)
+    central = ((random_state.random((number_of_nodes, embedding_size)) - 0.5) / embedding_size).astype(np.float32)
+    contextual = np.zeros((number_of_nodes, embedding_size), dtype=np.float32)
+    weights = np.ones(number_of_nodes)
+    if use_scale_free_distribution:
+        frequencies = np.zeros(number_of_nodes, dtype=np.int64)
+        for start in range(0, len(corpus), 2**16):
+            frequencies += np.bincount(np.asarray(corpus[start:start + 2**16]).ravel(), minlength=number_of_nodes)
+        weights = frequencies**0.75
+    probabilities, aliases = build_alias_table(weights)
+
+    step = _skipgram_step if model == "SkipGram" else _cbow_step
+    starts = np.arange(0, len(corpus), number_of_walks_per_batch)
+    for epoch in range(epochs):
+        for start in random_state.permutation(starts):
+            walks = np.asarray(corpus[start:start + number_of_walks_per_batch], dtype=np.int64)
+            negative_node_ids = sample_from_alias_table(
+                probabilities, aliases, (len(walks), number_of_negative_samples), random_state
+            )
+            step(central, contextual, walks, distances, negative_node_ids, learning_rate, clipping_value)
+        learning_rate *= learning_rate_decay
+    return central, contextual
+
+
+def with_walk_corpus(embedder_class):
+    """
+    Return a subclass of the given GRAPE walk-based embedder class (DeepWalk or Walklets, CBOW or SkipGram)
+    trained by train_word2vec on the shared walk corpus of the graph.
+    The subclass keeps the model name and parameters of the embedder, its library name is NumPy.
+    The parameters stochastic_downsample_by_degree, normalize_learning_rate_by_degree, dtype and the
+    embedding paths of the Rust models are not used.
+    """
+    from embiggen.utils.abstract_models import EmbeddingResult
+    import pandas as pd
+
+    class CorpusEmbedder(embedder_class):
+
+        @classmethod
+        def library_name(cls):
+            return "NumPy"
+
+        def _fit_transform(self, graph, return_dataframe=True):
+            parameters = self.parameters()
+            corpus = load_walk_corpus(graph, **{
+                name: parameters.get(name, default)
+                for name, default in WALK_PARAMETERS.items()
+            })
+            kwargs = dict(
+                model="CBOW" if "CBOW" in self.model_name() else "SkipGram",
+                epochs=parameters["epochs"],
+                number_of_negative_samples=parameters["number_of_negative_samples"],
+                clipping_value=parameters["clipping_value"],
+                learning_rate=parameters["learning_rate"],
+                learning_rate_decay=parameters["learning_rate_decay"],
+                use_scale_free_distribution=parameters["use_scale_free_distribution"],
+                random_state=parameters["random_state"],
+            )
+            window_size = parameters["window_size"]
+            with get_tracer().stage("walk_corpus_training", model_name=self.model_name()):
+                if self.model_name().startswith("Walklets"):
+                    node_embeddings = [
+                        node_embedding
+                        for distance in range(1, window_size + 1)
+                        for node_embedding in train_word2vec(
+                            corpus, graph.get_number_of_nodes(), distances=(distance,),
+                            embedding_size=parameters["embedding_size"] // window_size, **kwargs
+                        )
+                    ]
+                else:
+                    node_embeddings = list(train_word2vec(
+                        corpus, graph.get_number_of_nodes(), distances=tuple(range(1, window_size + 1)),
+                        embedding_size=parameters["embedding_size"], **kwargs
+                    ))
+            if return_dataframe:
+                node_names = graph.get_node_names()
+                node_embeddings = [
+                    pd.DataFrame(node_embedding, index=node_names)
+                    for node_embedding in node_embeddings
+                ]
+            return EmbeddingResult(
+                embedding_method_name=self.model_name(),
+                node_embeddings=node_embeddings
+            )
+
+    CorpusEmbedder.__name__ = embedder_class.__name__
+    return CorpusEmbedder
+
+
+def is_walk_based(embedder_class):
+    """
+    Return whether the GRAPE embedder class is one of the walk-based embedders that with_walk_corpus supports.
+    """
+    return embedder_class.model_name() in (
+        "DeepWalk CBOW", "DeepWalk SkipGram", "Walklets CBOW", "Walklets SkipGram"
+    )
+
+
+if __name__ == "__main__":
+    from graph_preparation import TASKS
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("datasets", nargs="+", choices=list(TASKS))
+    parser.add_argument("--walk-length", type=int, default=WALK_PARAMETERS["walk_length"])
+    parser.add_argument("--iterations", type=int, default=WALK_PARAMETERS["iterations"], help="Walks per node")
+    arguments = parser.parse_args()
+    for dataset in arguments.datasets:
+        graph = TASKS[dataset][0]().to_grape()
+        corpus = load_walk_corpus(graph, walk_length=arguments.walk_length, iterations=arguments.iterations)
+        print(f"{dataset}: {corpus.shape[0]} walks of length {corpus.shape[1]} in {corpus.filename}")
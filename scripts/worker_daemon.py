@@ -0,0 +1,196 @@
+"""
+Warm local worker that keeps the datasets, holdouts and embeddings of the experiments resident.
+
+Every script and smoke test starts by importing GRAPE and loading its dataset (the prepared GRAPE
+graph and its subgraph of interest), which takes minutes for the knowledge graphs, before the few
+seconds of an iteration on the model settings. The worker is a long-lived process that imports GRAPE
+once, keeps the tasks of graph_preparation.TASKS loaded after their first job and the rebuilt
+holdouts in memory (see holdout_store.set_resident_holdouts); the stored embeddings it uses stay in
+the page cache. It runs the jobs sent by the clients one after the other over a Unix socket in
+experiments/worker_daemon, authenticated with a random key only readable by the user.
+
+A job is the name of a function ("module:function"), called in the worker with the given
+arguments, where every TaskArgument(dataset) is replaced by the resident task of the dataset,
+i.e. the (graph, subgraph of interest, edge type) tuple of graph_preparation.load_task.
+run_grid_on_worker evaluates the cells of a grid this way (see experiment_grid.evaluate_grid).
+
+Usage:
+
+    python worker_daemon.py serve [--preload sli] [--resident-holdouts 32] [--threads 8] &
+    python worker_daemon.py run grids/sli.json [--smoke-test] [--output results.tsv]
+    python worker_daemon.py stop
+
+and from a notebook or script:
+
+    from worker_daemon import run_grid_on_worker
+    results = run_grid_on_worker("grids/sli.json", smoke_test=True)
+"""
+import argparse
+import importlib
+import os
+import traceback
+from collections import namedtuple
+
+WORKER_DIRECTORY = os.path.join(os.environ.get("EXPERIMENTS_DIR", "./experiments"), "worker_daemon")
+SOCKET_PATH = os.path.join(WORKER_DIRECTORY, "worker.sock")
+AUTHKEY_PATH = os.path.join(WORKER_DIRECTORY, "authkey")
+DEFAULT_RESIDENT_HOLDOUTS = 32
+
+# Placeholder of the resident task of a dataset among the arguments of a job.
+TaskArgument = namedtuple("TaskArgument", ["dataset"])
+
+# Tasks loaded by the worker, by dataset.
+_resident_tasks = {}
+
+
+def get_resident_task(dataset):
+    """
+    Return the task of the dataset, loading it on first use.
+    """
+    if dataset not in _resident_tasks:
+        from graph_preparation import load_task
+        from instrumentation import get_tracer
+        with get_tracer().stage("loading", dataset=dataset):
+            _resident_tasks[dataset] = load_task(dataset)
+    return _resident_tasks[dataset]
+
+
+def _resolve(argument):
+    return get_resident_task(argument.dataset) if isinstance(argument, TaskArgument) else argument
+
+
+def run_job(job):
+    """
+    Run a job in the worker, returning the result of its function.
+    """
+    module_name, function_name = job["function"].split(":")
+    function = getattr(importlib.import_module(module_name), function_name)
+    return function(
+        *[_resolve(argument) for argument in job["args"]],
+        **{key: _resolve(argument) for key, argument in job["kwargs"].items()}
+    )
+
+
+def _get_authkey(create=False):
+    if create:
+        os.makedirs(WORKER_DIRECTORY, exist_ok=True)
+        fd = os.open(AUTHKEY_PATH, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(os.urandom(32))
+    with open(AUTHKEY_PATH, "rb") as fh:
+        return fh.read()
+
+
+def is_worker_running():
+    """
+    Return whether a worker is listening on the socket.
+    """
+    from multiprocessing import AuthenticationError
+    from multiprocessing.connection import Client
+    try:
+        Client(SOCKET_PATH, family="AF_UNIX", authkey=_get_authkey()).close()
+    except (OSError, EOFError, AuthenticationError):
+        return False
+    return True
+
+
+def serve(preload=(), resident_holdouts=DEFAULT_RESIDENT_HOLDOUTS, threads=None):
+    """
+    Run the worker until it receives a stop job.
+    """
+    from multiprocessing.connection import Listener
+    if threads is not None:
+        # The thread limits must be set before GRAPE starts its thread pool.
+        for variable in ("RAYON_NUM_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+            os.environ[variable] = str(threads)
+    if os.path.exists(SOCKET_PATH):
+        if os.path.exists(AUTHKEY_PATH) and is_worker_running():
+            raise RuntimeError(f"A worker is already listening on {SOCKET_PATH}")
+        # Left behind by a worker that was killed.
+        os.remove(SOCKET_PATH)
+    import grape  # noqa: F401, imported once for all the jobs
+    from holdout_store import set_resident_holdouts
+    set_resident_holdouts(resident_holdouts)
+    for dataset in preload:
+        get_resident_task(dataset)
+    with Listener(SOCKET_PATH, family="AF_UNIX", authkey=_get_authkey(create=True)) as listener:
+        print(f"Worker listening on {SOCKET_PATH}")
+        while True:
+            try:
+                connection = listener.accept()
+            except Exception:
+                # A client with a wrong key or that disconnected during the handshake.
+                continue
+            with connection:
+                try:
+                    job = connection.recv()
+                except EOFError:
+                    continue
+                if job is None:
+                    connection.send(dict(result=None))
+                    break
+                try:
+                    response = dict(result=run_job(job))
+                except Exception:
+                    response = dict(error=traceback.format_exc())
+                connection.send(response)
+
+
+def submit(function, *args, **kwargs):
+    """
+    Run function ("module:function") with the arguments in the worker and return its result.
+    Raises RuntimeError with the traceback of the worker if the function raised an exception.
+    """
+    from multiprocessing.connection import Client
+    with Client(SOCKET_PATH, family="AF_UNIX", authkey=_get_authkey()) as connection:
+        connection.send(dict(function=function, args=args, kwargs=kwargs))
+        response = connection.recv()
+    if "error" in response:
+        raise RuntimeError(f"The job {function} failed in the worker:\n{response['error']}")
+    return response["result"]
+
+
+def stop_worker():
+    from multiprocessing.connection import Client
+    with Client(SOCKET_PATH, family="AF_UNIX", authkey=_get_authkey()) as connection:
+        connection.send(None)
+        connection.recv()
+
+
+def run_grid_on_worker(config_path, cell_ids=None, **overrides):
+    """
+    Return the results of the cells of the grid described at config_path (all of them by default), evaluated by
+    the worker with the given overrides of the configuration, e.g. smoke_test=True or model_parameters.
+    """
+    from experiment_grid import load_grid_config
+    config = dict(load_grid_config(config_path), **overrides)
+    return submit("experiment_grid:evaluate_grid", config, TaskArgument(config["dataset"]), cell_ids=cell_ids)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve", help="Run the worker")
+    serve_parser.add_argument("--preload", nargs="*", default=[], help="Datasets to load before the first job")
+    serve_parser.add_argument("--resident-holdouts", type=int, default=DEFAULT_RESIDENT_HOLDOUTS,
+                              help="Holdouts kept in memory")
+    serve_parser.add_argument("--threads", type=int, default=None, help="Threads of GRAPE and the BLAS")
+    run_parser = subparsers.add_parser("run", help="Evaluate the cells of a grid in the worker")
+    run_parser.add_argument("config_path", help="JSON description of the grid")
+    run_parser.add_argument("--smoke-test", action="store_true", help="Run the smoke test of the grid")
+    run_parser.add_argument("--output", default=None, help="Path of the results TSV, summarized if not given")
+    subparsers.add_parser("stop", help="Stop the worker")
+    arguments = parser.parse_args()
+    # Jobs must refer to worker_daemon.TaskArgument rather than __main__.TaskArgument, whichever side runs as a script.
+    from worker_daemon import run_grid_on_worker, serve, stop_worker
+    if arguments.command == "serve":
+        serve(arguments.preload, arguments.resident_holdouts, arguments.threads)
+    elif arguments.command == "run":
+        overrides = dict(smoke_test=True) if arguments.smoke_test else {}
+        results = run_grid_on_worker(arguments.config_path, **overrides)
+        if arguments.output:
+            results.to_csv(arguments.output, sep="\t")
+        else:
+            print(results.groupby(["cell_id", "evaluation_mode", "use_scale_free_distribution"])["auroc"].mean())
+    else:
+        stop_worker()